@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import logging
+import sys
 from pathlib import Path
+from typing import Callable
+import numpy as np
 import pandas as pd
 import json
 
@@ -9,16 +12,28 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(me
 
 # Paths
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation import impute, nations, small_areas, star  # noqa: E402
+from src.harmonisation.lad_codes import LadDictionary  # noqa: E402
+from src.memory import owned  # noqa: E402
+
 CANONICAL_DIR = ROOT / "data" / "processed" / "canonical"
 
 DESNZ_FILE = CANONICAL_DIR / "desnz_la_year.csv"
 DFT_FILE = CANONICAL_DIR / "dft_la_year.csv"
+DFT_VEHICLE_FILE = CANONICAL_DIR / "dft_vehicle_la_year.csv"
 ONS_FILE = CANONICAL_DIR / "ons_la_year.csv"
 IMD_FILE = CANONICAL_DIR / "imd_la.csv"
 
 OUT_FILE = CANONICAL_DIR / "jtis_base_la_year.csv"
+IMPUTED_FILE = CANONICAL_DIR / "jtis_imputed_cells.csv"
 DIAG_FILE = ROOT / "outputs" / "diagnostics" / "composer_report.json"
 
+# (lad_id, year) keys are packed as lad_id * YEAR_SPAN + year
+YEAR_SPAN = 10_000
+
 
 def load_dataset(path: Path) -> pd.DataFrame:
     if not path.exists():
@@ -27,94 +42,181 @@ def load_dataset(path: Path) -> pd.DataFrame:
     return pd.read_csv(path)
 
 
-def filter_england(df: pd.DataFrame) -> pd.DataFrame:
-    """Ensure lad_code is string, drop nulls, keep only England LADs."""
-    df = df.copy()
-    df["lad_code"] = df["lad_code"].astype(str)
-    df = df[df["lad_code"].notna()]
-    df = df[~df["lad_code"].isin(["nan", "NaN", "None"])]
-    df = df[df["lad_code"].str.startswith("E")]
+def filter_nations(df: pd.DataFrame, prefixes: tuple[str, ...]) -> pd.DataFrame:
+    """Ensure lad_code is string, drop nulls, keep only LADs of the nations
+    in config/nations.yaml (code prefixes)."""
+    codes = df["lad_code"].astype(str)
+    keep = codes.notna() & ~codes.isin(["nan", "NaN", "None"]) & codes.str.startswith(prefixes)
+    df = owned(df[keep.to_numpy()])
+    df["lad_code"] = codes[keep]
     return df
 
 
-def check_missing_combinations(df_list: list[pd.DataFrame]) -> dict:
-    lad_year_sets = [set(zip(df["lad_code"], df["year"])) for df in df_list]
-    all_keys = set.union(*lad_year_sets)
+def check_missing_combinations(df_list: list[pd.DataFrame], lad: LadDictionary) -> dict:
+    # (lad_id, year) packed into one int64 per row; set operations on integers
+    lad_year_sets = [
+        np.unique(df["lad_id"].to_numpy(dtype=np.int64) * YEAR_SPAN + df["year"].to_numpy(dtype=np.int64))
+        for df in df_list
+    ]
+    all_keys = lad_year_sets[0]
+    for keys in lad_year_sets[1:]:
+        all_keys = np.union1d(all_keys, keys)
 
     labels = ["desnz", "dft", "ons"]
     reports = {}
 
     for name, df, keyset in zip(labels, df_list, lad_year_sets):
-        missing = sorted(all_keys - keyset)
+        missing = np.setdiff1d(all_keys, keyset, assume_unique=True)
+        examples = sorted(
+            zip(lad.decode(missing // YEAR_SPAN).tolist(), (missing % YEAR_SPAN).tolist())
+        )[:20]
         reports[name] = {
-            "missing_count": len(missing),
-            "missing_examples": missing[:20],
+            "missing_count": int(missing.size),
+            "missing_examples": examples,
         }
 
     return reports
 
 
-def compose():
-    logging.info("=== ComposerAgent: start composition ===")
-
-    # Load annual datasets (England only)
-    desnz = filter_england(load_dataset(DESNZ_FILE))
-    dft = filter_england(load_dataset(DFT_FILE))
-    ons = filter_england(load_dataset(ONS_FILE))
-
-    # Load IMD (no year dimension)
-    imd = load_dataset(IMD_FILE)
-    imd["lad_code"] = imd["lad_code"].astype(str)
-
-    # Standardise year dtype
-    for df in [desnz, dft, ons]:
-        df["year"] = df["year"].astype(int)
+def compose_facts(
+    desnz: pd.DataFrame,
+    dft: pd.DataFrame,
+    ons: pd.DataFrame,
+    imd: pd.DataFrame,
+    lad: LadDictionary,
+    vehicle: pd.DataFrame | None = None,
+) -> tuple[dict[str, pd.DataFrame], dict]:
+    """Star-schema fact tables from the canonical tables (no I/O).
+
+    LADs of the nations in config/nations.yaml only. `lad` is updated with
+    any new LADs, their attributes, area and vintage; DESNZ goes first so
+    its names and regions win. The input frames are not modified.
+    """
+    sources = {"desnz": desnz, "dft": dft, "ons": ons, "imd": imd}
+    if vehicle is not None:
+        sources["dft_vehicle"] = vehicle
+    prefixes = nations.prefixes()
+    sources = {name: filter_nations(df, prefixes) for name, df in sources.items()}
+    for df in sources.values():
+        lad.update(df)
+    sources = {name: lad.encode(df) for name, df in sources.items()}
 
     # Diagnostics
-    diagnostics = check_missing_combinations([desnz, dft, ons])
+    diagnostics = check_missing_combinations([sources[n] for n in ("desnz", "dft", "ons")], lad)
     logging.info(f"Diagnostics: {diagnostics}")
 
-    # Merge DESNZ + DfT
-    logging.info("Merging DESNZ + DfT...")
-    merged = pd.merge(
-        desnz,
-        dft,
-        on=["lad_code", "year"],
-        how="inner",
-        suffixes=("", "_dft"),
-    )
-
-    # Merge ONS
-    logging.info("Merging with ONS population...")
-    merged = pd.merge(
-        merged,
-        ons[["lad_code", "year", "population"]],
-        on=["lad_code", "year"],
-        how="inner",
-    )
+    return star.build_facts(sources), diagnostics
+
+
+def compose_frames(
+    desnz: pd.DataFrame,
+    dft: pd.DataFrame,
+    ons: pd.DataFrame,
+    imd: pd.DataFrame,
+    lad: LadDictionary | None = None,
+    vehicle: pd.DataFrame | None = None,
+) -> tuple[pd.DataFrame, dict]:
+    """The JTIS base table: the base measures gathered from the facts, gaps
+    imputed (no I/O)."""
+    lad = lad if lad is not None else LadDictionary()
+    facts, diagnostics = compose_facts(desnz, dft, ons, imd, lad, vehicle)
+    base, _, diagnostics["imputation"] = impute.gather_filled(star.BASE_MEASURES, facts, lad)
+    return base, diagnostics
+
+
+def record_lineage(frames: dict[str, pd.DataFrame], merged: pd.DataFrame, level: str = "lad") -> None:
+    """Map each base row to its row in every canonical table (small-area
+    rows to the rows of their LAD)."""
+    from src import lineage
+
+    files = {"desnz": DESNZ_FILE, "dft": DFT_FILE, "ons": ONS_FILE, "imd": IMD_FILE}
+    measures = {
+        f.source: [m for m in f.measures if m in star.BASE_MEASURES]
+        for f in star.FACTS.values() if f.source in files
+    }
+    measures["desnz"] = measures.get("desnz", []) + ["area_km2"]
+    maps = {}
+    for name, df in frames.items():
+        keys = ["lad_code", "year"] if "year" in df.columns else ["lad_code"]
+        maps[name] = lineage.RowMap.lookup([df[k] for k in keys], [merged[k] for k in keys])
+    lineage.Record(
+        "compose",
+        {
+            "inputs": {name: lineage.fingerprint(path) for name, path in files.items()},
+            "output": lineage.fingerprint(OUT_FILE),
+            "aggregation": "outer join on (lad_code, year) of the LADs in config/nations.yaml, "
+                           "deprivation on lad_code, "
+                           "gaps imputed (jtis_imputed_cells.csv); area_km2 from the latest DESNZ year"
+                           + ("" if level == "lad" else
+                              f"; apportioned to {level} areas by population share (config/granularity.yaml)"),
+            "measures": measures,
+        },
+        keys={
+            **({"area_code": merged["area_code"]} if "area_code" in merged.columns else {}),
+            "lad_code": merged["lad_code"],
+            "year": merged["year"],
+        },
+        maps=maps,
+    ).save()
+
+
+def compose(loader: Callable[[Path], pd.DataFrame] = load_dataset):
+    """Build the star schema from the canonical tables and gather the JTIS
+    base table from it.
+
+    `loader` reads one canonical CSV; callers holding parsed tables in memory
+    (watch mode) pass a cached reader instead of load_dataset.
+    """
+    logging.info("=== ComposerAgent: start composition ===")
 
-    # Merge IMD (no year)
-    logging.info("Merging IMD deprivation (LAD-level)...")
-    merged = pd.merge(
-        merged,
-        imd[["lad_code", "imd_rank_avg"]],
-        on="lad_code",
-        how="inner",
+    lad = LadDictionary.load()
+    vehicle = loader(DFT_VEHICLE_FILE) if DFT_VEHICLE_FILE.exists() else None
+    frames = {
+        "desnz": loader(DESNZ_FILE), "dft": loader(DFT_FILE), "ons": loader(ONS_FILE), "imd": loader(IMD_FILE)
+    }
+    facts, diagnostics = compose_facts(*frames.values(), lad, vehicle)
+    if lad.changed:
+        lad.save()
+    star.write_facts(facts)
+
+    logging.info("Gathering base measures from the fact tables and imputing gaps...")
+    merged, imputed, diagnostics["imputation"] = impute.gather_filled(star.BASE_MEASURES, facts, lad)
+    report = diagnostics["imputation"]
+    logging.info(
+        f"Base rows: {report['rows']} ({report['lads']} LADs) vs {report['rows_all_sources']} "
+        f"({report['lads_all_sources']} LADs) reported by every source; "
+        f"{report['imputed_rows']} rows with imputed cells → {IMPUTED_FILE}"
     )
-
-    # Clean LAD-name
-    name_cols = [c for c in merged.columns if "lad_name" in c]
-    if len(name_cols) > 1:
-        merged = merged.rename(columns={name_cols[0]: "lad_name"})
-        merged = merged.drop(columns=[c for c in name_cols[1:]], errors="ignore")
-
-    merged = merged.sort_values(["lad_code", "year"]).reset_index(drop=True)
+    if report["years"] != report["years_all_sources"]:
+        logging.warning(
+            f"Base years {report['years']} differ from the years every source reports "
+            f"{report['years_all_sources']} (min_sources in {impute.CONFIG_FILE.name})"
+        )
+    imputed.to_csv(IMPUTED_FILE, index=False)
+
+    granularity = small_areas.load_config()
+    if granularity.areal:
+        if not small_areas.OUT_FILE.exists():
+            raise FileNotFoundError(
+                f"Small-area table not found: {small_areas.OUT_FILE}. "
+                f"Run src/harmonisation/small_areas.py first (level {granularity.level})."
+            )
+        logging.info(f"Apportioning LA–years to {granularity.level} areas by population share...")
+        merged, diagnostics["small_areas"] = small_areas.apportion(
+            merged, loader(small_areas.OUT_FILE), granularity.apportion, lad
+        )
+        report = diagnostics["small_areas"]
+        logging.info(
+            f"{report['areas']} areas ({report['lads_as_one_area']} LADs without estimates kept whole, "
+            f"{report['areas_outside_base']} areas of LADs outside the base table dropped)"
+        )
 
     logging.info(f"Final JTIS base table shape: {merged.shape}")
     logging.info(f"Writing JTIS base table → {OUT_FILE}")
 
     OUT_FILE.parent.mkdir(parents=True, exist_ok=True)
     merged.to_csv(OUT_FILE, index=False)
+    record_lineage(frames, merged, granularity.level)
 
     # Write diagnostics
     DIAG_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,69 @@
+"""
+JTIS – agent messages
+Typed messages exchanged between agents through the coordinator.
+
+Agents subscribe to message classes; the coordinator routes each published
+message to every agent subscribed to its type. ScoutReport (from
+scout_agent) is published as-is.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+@dataclass(frozen=True)
+class Start:
+    """Kick-off message published by the coordinator."""
+
+    requested_by: str = "cli"
+
+
+@dataclass(frozen=True)
+class StageReady:
+    """A stage ahead of composition ran, or its existing output is reused
+    (rerouted)."""
+
+    stage: str
+    output: Path
+    rerouted: bool = False
+    note: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class StageBlocked:
+    """Scout findings, a stage error or a blocked upstream stage stopped a
+    stage that has no earlier output to fall back on."""
+
+    stage: str
+    reason: str
+
+
+@dataclass(frozen=True)
+class ComposedTable:
+    """Handle to the composed JTIS base table."""
+
+    path: Path
+    rows: int
+    lads: int
+    years: tuple
+
+
+@dataclass(frozen=True)
+class ScoringResult:
+    path: Path
+    release: Optional[str]
+    diagnostics: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class SnapshotWritten:
+    path: Path
+
+
+@dataclass(frozen=True)
+class StageFailed:
+    agent: str
+    error: str
@@ -0,0 +1,395 @@
+"""
+JTIS – agent runtime
+Message-passing coordinator that runs Scout, ingestion, Composer and scoring
+agents as one pipeline.
+
+- Each agent subscribes to message types (src/agents/messages.py) and owns a
+  bounded inbox; publishing blocks when an inbox is full (backpressure)
+- The stages ahead of composition come from the stage graph
+  (src/pipeline/stages.py): one agent per stage compose reads from,
+  directly or through other stages, each starting once the stages it reads
+  from are resolved
+- Blocking stage work runs in a worker pool, at most `concurrency` at a time,
+  so independent stages (the four sources) run concurrently
+- ScoutAgent findings gate the stages that read a dataset: a dataset that
+  fails its checks is not re-ingested; a stage that does not run (or fails,
+  or has a blocked upstream stage) is rerouted to its output from an earlier
+  run if there is one, otherwise it is blocked and composition is skipped
+- Every message is logged to outputs/diagnostics/runtime_report.json
+
+Run with: python src/agents/runtime.py
+"""
+
+from __future__ import annotations
+
+import abc
+import argparse
+import asyncio
+import datetime as dt
+import json
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.agents.messages import (  # noqa: E402
+    ComposedTable,
+    ScoringResult,
+    SnapshotWritten,
+    StageBlocked,
+    StageFailed,
+    StageReady,
+    Start,
+)
+from src.agents.scout_agent import ScoutAgent, ScoutReport  # noqa: E402
+from src.pipeline import stages  # noqa: E402
+
+DIAG_FILE = ROOT / "outputs" / "diagnostics" / "runtime_report.json"
+
+
+def composition_plan() -> List[stages.Stage]:
+    """Stages compose reads from, directly or through other stages, in run
+    order (the scout runs first on its own)."""
+    names = set(stages.upstream(["compose"])) - {"compose", "scout"}
+    return [s for s in stages.STAGES if s.name in names]
+
+
+# -------------------------------------------------------
+# Worker-side stage functions (must be importable by name)
+# -------------------------------------------------------
+
+def _init_worker() -> None:
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+
+def run_stage(name: str) -> None:
+    """Run one stage of the graph (in a worker, with its own table cache)."""
+    stage = stages.STAGE_BY_NAME[name]
+    stage.run(stages.TableCache())
+
+
+def run_scout() -> ScoutReport:
+    agent = ScoutAgent()
+    report = agent.run()
+    agent.save(report)
+    return report
+
+
+def run_compose() -> Dict[str, Any]:
+    from src.agents.composer_agent import OUT_FILE, compose
+
+    df = compose()
+    return {
+        "path": str(OUT_FILE),
+        "rows": int(len(df)),
+        "lads": int(df["lad_code"].nunique()),
+        "years": (int(df["year"].min()), int(df["year"].max())),
+    }
+
+
+def run_scoring() -> Dict[str, Any]:
+    from src.scoring import anomalies, jti_scoring
+
+    anomalies.main()
+    jti_scoring.main()
+    with jti_scoring.DIAG_FILE.open("r", encoding="utf-8") as f:
+        diagnostics = json.load(f)
+    return {"path": str(jti_scoring.OUT_FILE), "diagnostics": diagnostics}
+
+
+def run_snapshot() -> str:
+    from src.analysis import jtis_snapshot_2023
+
+    jtis_snapshot_2023.main()
+    return str(jtis_snapshot_2023.OUT)
+
+
+# -------------------------------------------------------
+# Coordinator
+# -------------------------------------------------------
+
+class Agent(abc.ABC):
+    name: str = "agent"
+    subscribes: Tuple[type, ...] = ()
+
+    @abc.abstractmethod
+    async def handle(self, msg: Any, ctx: "Coordinator") -> None:
+        """React to one message of a subscribed type, publishing any results on ctx."""
+
+
+class Coordinator:
+    def __init__(
+        self,
+        agents: Sequence[Agent],
+        concurrency: int = 4,
+        queue_size: int = 8,
+        executor: str = "process",
+    ):
+        self.agents = list(agents)
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.executor_kind = executor
+        self.log: List[Dict[str, Any]] = []
+        self._pending = 0
+
+    # ----------------------------
+    # Messaging
+    # ----------------------------
+    async def publish(self, msg: Any, sender: str) -> None:
+        self.log.append(
+            {
+                "t": round(time.perf_counter() - self._t0, 3),
+                "sender": sender,
+                "type": type(msg).__name__,
+                "payload": _summarise(msg),
+            }
+        )
+        for agent in self.agents:
+            if isinstance(msg, agent.subscribes):
+                self._pending += 1
+                self._idle.clear()
+                await self._inboxes[agent.name].put(msg)
+
+    async def call(self, func: Any, *args: Any) -> Any:
+        """Run blocking stage work in the pool, at most `concurrency` at once."""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, func, *args)
+
+    async def _worker(self, agent: Agent) -> None:
+        inbox = self._inboxes[agent.name]
+        while True:
+            msg = await inbox.get()
+            try:
+                await agent.handle(msg, self)
+            except Exception as exc:  # report, keep the runtime alive
+                await self.publish(StageFailed(agent.name, repr(exc)), agent.name)
+            finally:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._idle.set()
+
+    # ----------------------------
+    # Run
+    # ----------------------------
+    async def run(self, initial: Sequence[Any] = (Start(),)) -> List[Dict[str, Any]]:
+        self._t0 = time.perf_counter()
+        self._idle = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._inboxes = {a.name: asyncio.Queue(self.queue_size) for a in self.agents}
+        self._pool: Executor
+        if self.executor_kind == "process":
+            self._pool = ProcessPoolExecutor(self.concurrency, initializer=_init_worker)
+        else:
+            self._pool = ThreadPoolExecutor(self.concurrency)
+
+        workers = [asyncio.create_task(self._worker(a)) for a in self.agents]
+        try:
+            for msg in initial:
+                await self.publish(msg, "coordinator")
+            await self._idle.wait()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._pool.shutdown()
+        return self.log
+
+
+def _summarise(msg: Any) -> Any:
+    if isinstance(msg, ScoutReport):
+        return {
+            "all_ok": msg.all_ok,
+            "datasets": {
+                d.dataset_key: {"exists": d.exists, "readable": d.readable, "schema_ok": d.schema_ok}
+                for d in msg.datasets
+            },
+        }
+    if is_dataclass(msg):
+        return {k: (str(v) if isinstance(v, Path) else v) for k, v in asdict(msg).items()}
+    return repr(msg)
+
+
+# -------------------------------------------------------
+# Agents
+# -------------------------------------------------------
+
+class ScoutRunner(Agent):
+    name = "scout"
+    subscribes = (Start,)
+
+    async def handle(self, msg: Start, ctx: Coordinator) -> None:
+        report = await ctx.call(run_scout)
+        await ctx.publish(report, self.name)
+
+
+class StageRunner(Agent):
+    """Runs one stage ahead of composition once the scout has reported and
+    every stage it reads from is resolved, gated by the scout's findings on
+    the datasets it reads."""
+
+    subscribes = (ScoutReport, StageReady, StageBlocked)
+
+    def __init__(self, stage: stages.Stage, upstream: Sequence[str]):
+        self.stage = stage
+        self.name = f"stage:{stage.name}"
+        self.upstream = set(upstream)
+        self.output = ROOT / stage.outputs[0]
+        self.report: Optional[ScoutReport] = None
+        self.resolved: Dict[str, Any] = {}
+        self.started = False
+
+    async def handle(self, msg: Any, ctx: Coordinator) -> None:
+        if isinstance(msg, ScoutReport):
+            self.report = msg
+        elif msg.stage in self.upstream:
+            self.resolved[msg.stage] = msg
+        if self.started or self.report is None or not self.upstream <= set(self.resolved):
+            return
+        self.started = True
+
+        problem = self._problem()
+        if problem is None:
+            try:
+                await ctx.call(run_stage, self.stage.name)
+                await ctx.publish(StageReady(self.stage.name, self.output), self.name)
+                return
+            except Exception as exc:
+                problem = f"stage failed: {exc!r}"
+
+        if self.output.exists():
+            await ctx.publish(
+                StageReady(
+                    self.stage.name,
+                    self.output,
+                    rerouted=True,
+                    note=f"{problem}; reusing existing {self.output.name}",
+                ),
+                self.name,
+            )
+        else:
+            await ctx.publish(StageBlocked(self.stage.name, problem), self.name)
+
+    def _problem(self) -> Optional[str]:
+        """Why the stage must not run: a blocked upstream stage or failed
+        scout checks on a dataset it reads. None if it can run."""
+        blocked = sorted(n for n, m in self.resolved.items() if isinstance(m, StageBlocked))
+        if blocked:
+            return f"upstream stages blocked: {blocked}"
+        problems = []
+        for check in self.report.datasets:
+            path = Path(check.path)
+            rel = path.relative_to(ROOT).as_posix() if path.is_relative_to(ROOT) else path.as_posix()
+            if self.stage.reads(rel) and not (check.exists and check.readable and check.schema_ok is not False):
+                problems.append(
+                    f"{check.dataset_key}: {'; '.join(check.errors + check.missing_columns) or 'scout checks failed'}"
+                )
+        return "; ".join(problems) or None
+
+
+class ComposerRunner(Agent):
+    name = "composer"
+    subscribes = (StageReady, StageBlocked)
+
+    def __init__(self, required: Sequence[str]):
+        self.required = set(required)
+        self.resolved: Dict[str, Any] = {}
+
+    async def handle(self, msg: Any, ctx: Coordinator) -> None:
+        self.resolved[msg.stage] = msg
+        if not self.required <= set(self.resolved):
+            return
+        blocked = [k for k, m in self.resolved.items() if isinstance(m, StageBlocked)]
+        if blocked:
+            await ctx.publish(
+                StageFailed(self.name, f"composition skipped; blocked stages: {blocked}"),
+                self.name,
+            )
+            return
+        info = await ctx.call(run_compose)
+        await ctx.publish(
+            ComposedTable(Path(info["path"]), info["rows"], info["lads"], tuple(info["years"])),
+            self.name,
+        )
+
+
+class ScoringRunner(Agent):
+    name = "scoring"
+    subscribes = (ComposedTable,)
+
+    async def handle(self, msg: ComposedTable, ctx: Coordinator) -> None:
+        info = await ctx.call(run_scoring)
+        diagnostics = info["diagnostics"]
+        await ctx.publish(
+            ScoringResult(Path(info["path"]), diagnostics.get("release"), diagnostics),
+            self.name,
+        )
+
+
+class SnapshotRunner(Agent):
+    name = "snapshot"
+    subscribes = (ScoringResult,)
+
+    async def handle(self, msg: ScoringResult, ctx: Coordinator) -> None:
+        path = await ctx.call(run_snapshot)
+        await ctx.publish(SnapshotWritten(Path(path)), self.name)
+
+
+def default_agents() -> List[Agent]:
+    plan = composition_plan()
+    runners = [
+        StageRunner(s, [u.name for u in plan if u is not s and stages.depends_on(s, u)])
+        for s in plan
+    ]
+    return [
+        ScoutRunner(),
+        *runners,
+        ComposerRunner(required=[s.name for s in plan]),
+        ScoringRunner(),
+        SnapshotRunner(),
+    ]
+
+
+# -------------------------------------------------------
+# CLI entrypoint
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the JTIS agent pipeline.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    args = parser.parse_args(argv)
+
+    coordinator = Coordinator(
+        default_agents(), concurrency=args.concurrency, executor=args.executor
+    )
+    log = asyncio.run(coordinator.run())
+
+    DIAG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with DIAG_FILE.open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "timestamp_utc": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+                "messages": log,
+            },
+            f,
+            indent=2,
+            default=str,
+        )
+
+    print("=== Agent runtime summary ===")
+    for entry in log:
+        print(f"[{entry['t']:>7.2f}s] {entry['sender']:<28} → {entry['type']}")
+    failed = [e for e in log if e["type"] in ("StageFailed", "DatasetBlocked")]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,33 +6,68 @@ This agent:
 - Reads dataset registry from config/datasets.yaml
 - Loads each dataset according to loader/sheet/skiprows settings
 - Applies validation schemas for required columns, numeric columns, year ranges, etc.
-- Guesses LAD/year columns heuristically
+- Resolves required columns and the LAD/year columns with the column rules
+  compiled from the schemas (src/harmonisation/columns.py); ambiguous matches
+  are reported with their candidates
 - Produces a diagnostics JSON report in outputs/diagnostics
-- Prints a summary to stdout
+- Prints a summary to stdout, or with --ndjson streams one JSON line per
+  dataset as soon as its check finishes (--workers N checks in parallel)
+
+Fast mode (--fast) only stats each file and checks CSV header rows against the
+schemas with the csv module. It imports only the standard library: pandas is
+not imported at all, the process pool only with --workers, and yaml only when
+the registry or a schema changed since it was last parsed (see load_yaml in
+src/harmonisation/columns.py).
+
+Change detection: every sheet read (each sheet of a multi-sheet workbook) is
+reduced to a fingerprint: its columns, a hash of them and its row count. The
+latest fingerprint per dataset and sheet is kept in scout_fingerprints.json
+(every run is appended to scout_history.ndjson), so a check is diffed against
+the previous run by one lookup and a hash comparison, without re-reading old
+files. Added, removed and renamed columns and row counts moving by more than
+--row-drift are reported as `drift`; --fail-on-drift exits 1 on any, for
+monitoring ahead of ingestion.
 
 Safe to run anytime. Does not modify data.
+
+Run with: python src/agents/scout_agent.py --ndjson --workers 4 --fail-on-drift
 """
 
 from __future__ import annotations
 
+import argparse
+import contextlib
+import csv
+import hashlib
 import json
+import sys
 import datetime as dt
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Any, Sequence
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
 
-import pandas as pd
-import yaml
+from src.harmonisation.columns import Resolution, load_yaml, resolver  # noqa: E402
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # -------------------------------------------------------
 # Paths
 # -------------------------------------------------------
 
-ROOT = Path(__file__).resolve().parents[2]
 CONFIG = ROOT / "config"
 REGISTRY_PATH = CONFIG / "datasets.yaml"
 SCHEMAS_DIR = CONFIG / "validation_schemas"
 DIAG_DIR = ROOT / "outputs" / "diagnostics"
+FINGERPRINTS_FILE = DIAG_DIR / "scout_fingerprints.json"
+HISTORY_FILE = DIAG_DIR / "scout_history.ndjson"
+
+# Relative row-count change reported as drift
+ROW_DRIFT = 0.05
 
 
 # -------------------------------------------------------
@@ -55,6 +90,10 @@ class DatasetCheck:
     lad_guess: Optional[str]
     year_guess: Optional[str]
     errors: List[str]
+    fingerprints: List[Dict[str, Any]] = field(default_factory=list)
+    drift: List[Dict[str, Any]] = field(default_factory=list)
+    resolved_columns: Dict[str, str] = field(default_factory=dict)
+    ambiguous_columns: Dict[str, List[str]] = field(default_factory=dict)
 
 
 @dataclass
@@ -64,13 +103,16 @@ class ScoutReport:
     datasets_registry_path: str
     all_ok: bool
     datasets: List[DatasetCheck]
+    mode: str = "full"
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "timestamp_utc": self.timestamp_utc,
             "repo_root": self.repo_root,
             "datasets_registry_path": self.datasets_registry_path,
+            "mode": self.mode,
             "all_ok": self.all_ok,
+            "drift": [d.dataset_key for d in self.datasets if d.drift],
             "datasets": [asdict(d) for d in self.datasets]
         }
 
@@ -80,8 +122,7 @@ class ScoutReport:
 # -------------------------------------------------------
 
 def load_registry(path: Path) -> Dict[str, Dict[str, Any]]:
-    with path.open("r", encoding="utf-8") as f:
-        doc = yaml.safe_load(f) or {}
+    doc = load_yaml(path) or {}
     if "datasets" not in doc:
         raise ValueError("datasets.yaml missing 'datasets:' block")
     return doc["datasets"]
@@ -91,54 +132,60 @@ def load_schema(key: str) -> Optional[Dict[str, Any]]:
     schema_path = SCHEMAS_DIR / f"{key}.yaml"
     if not schema_path.exists():
         return None
-    with schema_path.open("r", encoding="utf-8") as f:
-        return yaml.safe_load(f) or {}
+    return load_yaml(schema_path) or {}
+
+
+def resolve_columns(key: str, columns: Sequence[Any]) -> Resolution:
+    """The dataset's logical columns in this header (cached per header)."""
+    return resolver(key, SCHEMAS_DIR).resolve(columns)
 
 
-def guess_lad(cols: List[Any]) -> Optional[str]:
-    lower_cols = [str(c).lower() for c in cols]
-    hints = ["lad", "local authority", "lad19", "la code"]
-    for orig, low in zip(cols, lower_cols):
-        if any(h in low for h in hints):
-            return str(orig)
-    return None
+def apply_resolution(check: DatasetCheck, resolution: Resolution) -> None:
+    check.resolved_columns = dict(resolution.mapping)
+    check.ambiguous_columns = dict(resolution.ambiguous)
+    check.lad_guess = resolution.get("lad_code")
+    check.year_guess = resolution.get("year")
 
 
-def guess_year(cols: List[Any]) -> Optional[str]:
-    lower_cols = [str(c).lower() for c in cols]
-    for orig, low in zip(cols, lower_cols):
-        if "year" in low:
-            return str(orig)
-    return None
+def read_csv_header(path: Path, skiprows: int = 0) -> List[str]:
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        for _ in range(skiprows):
+            next(reader, None)
+        return next(reader, [])
 
 
 # Validation helpers
-def validate_required(df: pd.DataFrame, schema: Dict[str, Any]):
-    missing = []
-    required = schema.get("required_columns", {})
-    for logical_name, rule in required.items():
-        allowed = rule.get("any_of", [])
-        if not any(col in df.columns for col in allowed):
-            missing.append(f"{logical_name}: {allowed}")
-    return len(missing) == 0, missing
+def missing_required(key: str, columns: Sequence[Any]) -> List[str]:
+    """Required columns of the schema that resolve to no column, or to
+    several."""
+    return resolve_columns(key, columns).problems(resolver(key, SCHEMAS_DIR).rules)
 
 
-def validate_wide_years(df: pd.DataFrame, schema: Dict[str, Any]):
+def missing_wide_years(columns: Sequence[Any], schema: Dict[str, Any]) -> List[str]:
     wy = schema.get("wide_years")
     if not wy:
-        return True, []
+        return []
+    present = set(columns)
     prefix = wy["prefix"]
     start = wy["allowed_year_range"]["start"]
     end = wy["allowed_year_range"]["end"]
-    missing = []
-    for year in range(start, end + 1):
-        col = f"{prefix}{year}"
-        if col not in df.columns:
-            missing.append(col)
+    return [f"{prefix}{year}" for year in range(start, end + 1) if f"{prefix}{year}" not in present]
+
+
+def validate_required(key: str, df: pd.DataFrame):
+    missing = missing_required(key, df.columns)
+    return len(missing) == 0, missing
+
+
+def validate_wide_years(df: pd.DataFrame, schema: Dict[str, Any]):
+    missing = missing_wide_years(df.columns, schema)
     return len(missing) == 0, missing
 
 
 def validate_numeric(df: pd.DataFrame, schema: Dict[str, Any]):
+    import pandas as pd
+
     numeric = schema.get("column_rules", {}).get("numeric_columns", [])
     non_numeric = []
     for col in numeric:
@@ -154,30 +201,140 @@ def validate_row_count(df: pd.DataFrame, schema: Dict[str, Any]):
     return len(df) >= expected, expected
 
 
+# -------------------------------------------------------
+# Fingerprints and drift
+# -------------------------------------------------------
+
+def fingerprint(key: str, sheet: Optional[str], columns: Sequence[Any], n_rows: Optional[int]) -> Dict[str, Any]:
+    cols = [str(c) for c in columns]
+    return {
+        "id": f"{key}:{sheet}" if sheet is not None else key,
+        "dataset": key,
+        "sheet": sheet,
+        "columns_sha1": hashlib.sha1("\x1f".join(cols).encode("utf-8")).hexdigest()[:16],
+        "columns": cols,
+        "n_rows": n_rows,
+    }
+
+
+def schema_drift(prev: Dict[str, Any], fp: Dict[str, Any], row_drift: float = ROW_DRIFT) -> Dict[str, Any]:
+    """What changed from fingerprint `prev` to `fp` ({} if nothing did).
+    Columns are only compared when the hashes differ; a column replaced in
+    place (same position, same number of columns) is reported as renamed."""
+    out: Dict[str, Any] = {}
+    if prev["columns_sha1"] != fp["columns_sha1"]:
+        old, new = prev["columns"], fp["columns"]
+        old_set, new_set = set(old), set(new)
+        renamed = (
+            [[a, b] for a, b in zip(old, new) if a != b and a not in new_set and b not in old_set]
+            if len(old) == len(new) else []
+        )
+        out["added"] = [c for c in new if c not in old_set and c not in {b for _, b in renamed}]
+        out["removed"] = [c for c in old if c not in new_set and c not in {a for a, _ in renamed}]
+        out["renamed"] = renamed
+        if not (out["added"] or out["removed"] or renamed):
+            out["reordered"] = True
+    before, after = prev.get("n_rows"), fp.get("n_rows")
+    if before and after is not None and abs(after - before) > row_drift * before:
+        out["rows"] = [before, after]
+        out["row_change_pct"] = round(100 * (after - before) / before, 2)
+    return out
+
+
+def load_fingerprints(path: Path = FINGERPRINTS_FILE) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_fingerprints(report: ScoutReport, path: Path = FINGERPRINTS_FILE, history: Path = HISTORY_FILE) -> None:
+    """Append the report's fingerprints to the history and make them the
+    latest. A fast-mode fingerprint (no row count) keeps the last known one."""
+    latest = load_fingerprints(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with history.open("a", encoding="utf-8") as f:
+        for check in report.datasets:
+            for fp in check.fingerprints:
+                if fp["n_rows"] is None and fp["id"] in latest:
+                    fp = {**fp, "n_rows": latest[fp["id"]].get("n_rows")}
+                latest[fp["id"]] = fp
+                f.write(json.dumps({"timestamp_utc": report.timestamp_utc, "mode": report.mode, **fp}) + "\n")
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(latest, f, indent=2)
+
+
+def _check_in_worker(registry_path: str, fast: bool, key: str, meta: Dict[str, Any]) -> DatasetCheck:
+    return ScoutAgent(Path(registry_path), fast=fast).check(key, meta)
+
+
 # -------------------------------------------------------
 # ScoutAgent
 # -------------------------------------------------------
 
 class ScoutAgent:
-    def __init__(self, registry_path: Path | None = None):
+    def __init__(
+        self,
+        registry_path: Path | None = None,
+        fast: bool = False,
+        workers: int = 0,
+        row_drift: float = ROW_DRIFT,
+    ):
         self.registry_path = registry_path or REGISTRY_PATH
+        self.fast = fast
+        self.workers = workers
+        self.row_drift = row_drift
+
+    def check(self, key: str, meta: Dict[str, Any]) -> DatasetCheck:
+        return (self._check_dataset_fast if self.fast else self._check_dataset)(key, meta)
 
-    def run(self) -> ScoutReport:
+    def iter_checks(self) -> Iterator[DatasetCheck]:
+        """Checks in the order they finish, each already diffed against the
+        previous run's fingerprints."""
         registry = load_registry(self.registry_path)
+        previous = load_fingerprints()
+        if self.workers > 1 and len(registry) > 1:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+
+            with ProcessPoolExecutor(min(self.workers, len(registry))) as pool:
+                futures = [
+                    pool.submit(_check_in_worker, str(self.registry_path), self.fast, key, meta)
+                    for key, meta in registry.items()
+                ]
+                for future in as_completed(futures):
+                    yield self._diff(future.result(), previous)
+        else:
+            for key, meta in registry.items():
+                yield self._diff(self.check(key, meta), previous)
+
+    def _diff(self, check: DatasetCheck, previous: Dict[str, Dict[str, Any]]) -> DatasetCheck:
+        for fp in check.fingerprints:
+            prev = previous.get(fp["id"])
+            change = schema_drift(prev, fp, self.row_drift) if prev is not None else {}
+            if change:
+                check.drift.append({"id": fp["id"], "sheet": fp["sheet"], **change})
+        return check
+
+    def run(self, on_check=None) -> ScoutReport:
+        """Check every dataset; `on_check` is called with each check as it
+        finishes. The report lists them in registry order."""
+        order = {key: i for i, key in enumerate(load_registry(self.registry_path))}
         results = []
-
-        for key, meta in registry.items():
-            result = self._check_dataset(key, meta)
+        for result in self.iter_checks():
+            if on_check is not None:
+                on_check(result)
             results.append(result)
+        results.sort(key=lambda r: order[r.dataset_key])
 
         all_ok = all(r.exists and r.readable and (r.schema_ok is not False) for r in results)
 
         return ScoutReport(
-            timestamp_utc=dt.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            timestamp_utc=dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
             repo_root=str(ROOT),
             datasets_registry_path=str(self.registry_path),
             all_ok=all_ok,
             datasets=results,
+            mode="fast" if self.fast else "full",
         )
 
     def save(self, report: ScoutReport) -> None:
@@ -185,12 +342,53 @@ class ScoutAgent:
         out_path = DIAG_DIR / "scout_report.json"
         with out_path.open("w", encoding="utf-8") as f:
             json.dump(report.to_dict(), f, indent=2)
+        record_fingerprints(report)
         print(f"[ScoutAgent] Report written to {out_path}")
 
     # ----------------------------
     # Internal: dataset check
     # ----------------------------
+    def _check_dataset_fast(self, key: str, meta: Dict[str, Any]) -> DatasetCheck:
+        """Existence plus, for CSVs, a header-only schema check. Excel files
+        are only checked for existence (schema_checked=False)."""
+        name = meta.get("description", key)
+        path = ROOT / meta.get("path")
+        check = DatasetCheck(
+            dataset_key=key, name=name, path=str(path),
+            exists=path.exists(), readable=False, n_rows=None, columns=[],
+            schema_checked=False, schema_ok=None,
+            missing_columns=[], extra_columns=[], lad_guess=None,
+            year_guess=None, errors=[],
+        )
+        if not check.exists:
+            check.errors.append(f"File does not exist: {path}")
+            return check
+        if meta.get("loader", "csv") != "csv":
+            check.readable = True
+            return check
+
+        try:
+            check.columns = read_csv_header(path, meta.get("header_rows_to_skip") or 0)
+            check.readable = True
+        except (OSError, UnicodeDecodeError, csv.Error) as exc:
+            check.errors.append(f"Failed to read header: {exc}")
+            return check
+
+        check.fingerprints.append(fingerprint(key, None, check.columns, None))
+
+        schema = load_schema(key)
+        if schema:
+            check.schema_checked = True
+            check.missing_columns = (
+                missing_required(key, check.columns) + missing_wide_years(check.columns, schema)
+            )
+            check.schema_ok = not check.missing_columns
+        apply_resolution(check, resolve_columns(key, check.columns))
+        return check
+
     def _check_dataset(self, key: str, meta: Dict[str, Any]) -> DatasetCheck:
+        import pandas as pd
+
         errors = []
         name = meta.get("description", key)
 
@@ -217,18 +415,25 @@ class ScoutAgent:
         if skip is not None:
             read_kwargs["skiprows"] = skip
 
-        if loader == "excel":
-            if sheet:
-                read_kwargs["sheet_name"] = sheet
-            elif sheets:
-                read_kwargs["sheet_name"] = sheets[0]
-
-        # Try reading
+        # Try reading: the first sheet is validated, every listed sheet is
+        # fingerprinted
+        fingerprints = []
         try:
             if loader == "excel":
-                df = pd.read_excel(path, **read_kwargs)
+                wanted = [sheet] if sheet else list(sheets or [0])
+                with pd.ExcelFile(path) as book:
+                    df = book.parse(wanted[0], **read_kwargs)
+                    fingerprints.append(fingerprint(key, str(wanted[0]), df.columns, len(df)))
+                    for other_sheet in wanted[1:]:
+                        try:
+                            other = book.parse(other_sheet, **read_kwargs)
+                        except ValueError as exc:
+                            errors.append(f"Failed to read sheet {other_sheet}: {exc}")
+                            continue
+                        fingerprints.append(fingerprint(key, str(other_sheet), other.columns, len(other)))
             else:
                 df = pd.read_csv(path, **read_kwargs)
+                fingerprints.append(fingerprint(key, None, df.columns, len(df)))
             readable = True
         except Exception as exc:
             errors.append(f"Failed to read file: {exc}")
@@ -247,7 +452,7 @@ class ScoutAgent:
         schema_ok = None
 
         if schema:
-            ok_req, miss_req = validate_required(df, schema)
+            ok_req, miss_req = validate_required(key, df)
             ok_wy, miss_wy = validate_wide_years(df, schema)
             ok_num, miss_num = validate_numeric(df, schema)
             ok_rows, expected_rows = validate_row_count(df, schema)
@@ -261,7 +466,7 @@ class ScoutAgent:
 
             schema_ok = ok_req and ok_wy and ok_num and ok_rows
 
-        return DatasetCheck(
+        check = DatasetCheck(
             dataset_key=key,
             name=name,
             path=str(path),
@@ -273,25 +478,55 @@ class ScoutAgent:
             schema_ok=schema_ok,
             missing_columns=missing_total,
             extra_columns=[],
-            lad_guess=guess_lad(df.columns),
-            year_guess=guess_year(df.columns),
+            lad_guess=None,
+            year_guess=None,
             errors=errors,
+            fingerprints=fingerprints,
         )
+        apply_resolution(check, resolve_columns(key, df.columns))
+        return check
 
 
 # -------------------------------------------------------
 # CLI entrypoint
 # -------------------------------------------------------
 
-def main() -> None:
-    agent = ScoutAgent()
-    report = agent.run()
-    agent.save(report)
-    print("=== ScoutAgent Summary ===")
-    print(f"All OK: {report.all_ok}")
-    for d in report.datasets:
-        print(f"[{d.dataset_key}] {d.name} | Exists={d.exists} | Readable={d.readable} | SchemaOK={d.schema_ok}")
+def _emit(record: Dict[str, Any]) -> None:
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-ingestion dataset diagnostics.")
+    parser.add_argument("--fast", action="store_true", help="Existence and CSV header checks only")
+    parser.add_argument("--workers", type=int, default=0, help="Check datasets in N processes")
+    parser.add_argument("--ndjson", action="store_true", help="Stream one JSON line per dataset to stdout")
+    parser.add_argument("--row-drift", type=float, default=ROW_DRIFT,
+                        help=f"Relative row-count change reported as drift (default {ROW_DRIFT})")
+    parser.add_argument("--fail-on-drift", action="store_true", help="Exit 1 if any dataset drifted")
+    args = parser.parse_args(argv)
+
+    agent = ScoutAgent(fast=args.fast, workers=args.workers, row_drift=args.row_drift)
+    if args.ndjson:
+        report = agent.run(on_check=lambda d: _emit({"event": "dataset", **asdict(d)}))
+        with contextlib.redirect_stdout(sys.stderr):
+            agent.save(report)
+        _emit({"event": "summary", "timestamp_utc": report.timestamp_utc, "mode": report.mode,
+               "all_ok": report.all_ok, "drift": report.to_dict()["drift"]})
+    else:
+        report = agent.run()
+        agent.save(report)
+        print("=== ScoutAgent Summary ===")
+        print(f"All OK: {report.all_ok}")
+        for d in report.datasets:
+            print(f"[{d.dataset_key}] {d.name} | Exists={d.exists} | Readable={d.readable} | SchemaOK={d.schema_ok}")
+            for name, candidates in d.ambiguous_columns.items():
+                print(f"  ambiguous {name}: {candidates}")
+            for change in d.drift:
+                print(f"  drift {change['id']}: " + ", ".join(f"{k}={v}" for k, v in change.items()
+                                                          if k not in ("id", "sheet")))
+    return 1 if args.fail_on_drift and any(d.drift for d in report.datasets) else 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -1,48 +1,61 @@
 from __future__ import annotations
 
+import sys
 import pandas as pd
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation.lad_codes import LadDictionary  # noqa: E402
+from src.scoring.indicators import load_registry  # noqa: E402
+from src.storage.results_store import ResultsStore  # noqa: E402
+
 SCORED = ROOT / "data" / "processed" / "canonical" / "jtis_scored_la_year.csv"
 OUT = ROOT / "outputs" / "jtis_2023_ranked.csv"
 
 
 def main():
-    print("[JTIS_2023] Loading scored LA-year dataset...")
-    df = pd.read_csv(SCORED)
+    store = ResultsStore()
+    release = store.latest_release("scored")
+    if release is not None:
+        # Only the 2023 partition of the latest release is read
+        print(f"[JTIS_2023] Loading scored release {release} (year=2023)...")
+        df2023 = store.read("scored", release, years=[2023])
+    else:
+        print("[JTIS_2023] Loading scored LA-year dataset...")
+        df = pd.read_csv(SCORED)
+        df2023 = df[df["year"] == 2023]
+
+    # Names and region come from the LAD dimension table, joined on lad_id
+    lad = LadDictionary.load()
+    df2023 = lad.encode(df2023, update=True)
+    df2023 = lad.decorate(df2023, ["lad_name", "region"])
 
-    # Filter to 2023
-    df2023 = df[df["year"] == 2023].copy()
-    print(f"[JTIS_2023] LADs in 2023: {df2023['lad_code'].nunique()}")
+    print(f"[JTIS_2023] LADs in 2023: {df2023['lad_id'].nunique()}")
 
     # Rank LADs by JTI score (descending = more transition pressure)
     df2023 = df2023.sort_values("jti_score", ascending=False).reset_index(drop=True)
     df2023["rank"] = df2023.index + 1
 
-    # Select clean output columns
-    cols = [
-        "rank",
-        "lad_code",
-        "lad_name",
-        "region",
-        "jti_score",
-        "emissions_score",
-        "transport_score",
-        "structural_score",
-        "emissions_pc_tco2",
-        "fuel_pc_ktoe_per_1000",
-        "freight_share",
-        "bioenergy_share",
-        "population",
-        "area_km2",
-    ]
+    # Select clean output columns; components and snapshot metrics come
+    # from the indicator registry
+    registry = load_registry()
+    cols = (
+        ["rank", "area_code", "lad_code", "lad_name", "region", "jti_score"]
+        + list(registry.component_weights)
+        + registry.snapshot_metrics
+        + ["population", "area_km2"]
+    )
     existing_cols = [c for c in cols if c in df2023.columns]
 
     df2023_out = df2023[existing_cols]
 
     OUT.parent.mkdir(parents=True, exist_ok=True)
     df2023_out.to_csv(OUT, index=False)
+    if release is not None:
+        store.write(df2023_out.assign(year=2023), "ranked", release=release, overwrite=True)
 
     print(f"[JTIS_2023] Snapshot written to: {OUT}")
     print("[JTIS_2023] Top 5 LADs:")
@@ -0,0 +1,543 @@
+"""
+JTIS – report bundle and profile pages
+Precompute the aggregates every report needs once, into one compact JSON
+bundle, and render static HTML from it: an overview, one page per region and
+one profile page per LAD.
+
+- The bundle is columnar: every series is a list aligned with meta.years
+  (null where a LAD has no row), so a LAD's JTI, ranks and component scores
+  cost one list each however many pages read them
+- Built from the scored panel on dense (LAD × year) grids: national and
+  within-region ranks (1 = highest JTI, most transition pressure),
+  population-weighted region means and medians, national quantiles, each
+  component's contribution (weight × score) to the latest JTI, the snapshot
+  metrics and the per-LAD trends. A small-area panel is first reduced to
+  LADs by population-weighted means
+- Pages are plain HTML with inline SVG charts and one shared stylesheet;
+  LAD pages are rendered in chunks by worker processes that each read the
+  bundle once
+
+Writes outputs/reports/: bundle.json, index.html, style.css,
+regions/<region_code>.html, lads/<lad_code>.html
+
+Run with: python src/analysis/profiles.py [--workers 8] [--bundle-only]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation.lad_codes import LadDictionary  # noqa: E402
+from src.scoring.indicators import IndicatorRegistry, load_registry  # noqa: E402
+
+CANONICAL_DIR = ROOT / "data" / "processed" / "canonical"
+SCORED_FILE = CANONICAL_DIR / "jtis_scored_la_year.csv"
+TRENDS_FILE = CANONICAL_DIR / "jtis_trends_lad.csv"
+OUT_DIR = ROOT / "outputs" / "reports"
+BUNDLE_FILE = OUT_DIR / "bundle.json"
+
+DIGITS = 4
+TOP_N = 10
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+# -------------------------------------------------------
+# Bundle
+# -------------------------------------------------------
+
+def _series(v: np.ndarray) -> List[Optional[float]]:
+    """Rounded floats with NaN as null (JSON has no NaN)."""
+    v = np.round(np.asarray(v, dtype=float), DIGITS)
+    return [None if x != x else float(x) for x in v.tolist()]
+
+
+def _ints(v: np.ndarray) -> List[Optional[int]]:
+    return [None if x != x else int(x) for x in np.asarray(v, dtype=float).tolist()]
+
+
+def _lad_panel(df: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    """One row per LAD and year; small-area rows are averaged weighted by
+    population (sums for population itself)."""
+    if "area_id" not in df.columns:
+        return df
+    key = df["lad_id"].to_numpy(dtype=np.int64) * 10_000 + df["year"].to_numpy(dtype=np.int64)
+    keys, inv = np.unique(key, return_inverse=True)
+    pop = pd.to_numeric(df["population"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    out = {"lad_id": (keys // 10_000).astype(np.int32), "year": (keys % 10_000).astype(int)}
+    for c in columns:
+        if c == "population":
+            out[c] = np.bincount(inv, weights=pop, minlength=len(keys))
+            continue
+        v = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)
+        ok = ~np.isnan(v)
+        w = np.bincount(inv, weights=np.where(ok, pop, 0.0), minlength=len(keys))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[c] = np.bincount(inv, weights=np.where(ok, v * pop, 0.0), minlength=len(keys)) / w
+    out["areas"] = np.bincount(inv, minlength=len(keys)) if len(keys) else np.zeros(0, dtype=int)
+    return pd.DataFrame(out)
+
+
+def _rank_desc(grid: np.ndarray) -> np.ndarray:
+    """Rank of each row within each column, 1 = highest (ties share the lowest)."""
+    return pd.DataFrame(grid).rank(ascending=False, method="min").to_numpy()
+
+
+def build_bundle(
+    scored: pd.DataFrame,
+    lad: LadDictionary,
+    trends: Optional[pd.DataFrame] = None,
+    registry: Optional[IndicatorRegistry] = None,
+    release: Optional[str] = None,
+) -> Dict[str, Any]:
+    """The report bundle of a scored panel (no I/O)."""
+    registry = registry or load_registry()
+    components = registry.component_weights
+    metrics = [m for m in registry.snapshot_metrics if m in scored.columns]
+    columns = ["jti_score"] + list(components) + metrics + ["population"]
+    columns = [c for c in dict.fromkeys(columns) if c in scored.columns]
+
+    unit = "small area" if "area_id" in scored.columns else "lad"
+    df = _lad_panel(lad.encode(scored, update=True), columns)
+    ids, li = np.unique(df["lad_id"].to_numpy(dtype=np.int64), return_inverse=True)
+    years = np.arange(int(df["year"].min()), int(df["year"].max()) + 1) if len(df) else np.zeros(0, dtype=int)
+    yi = df["year"].to_numpy(dtype=np.int64) - (years[0] if len(years) else 0)
+
+    grid: Dict[str, np.ndarray] = {}
+    for c in columns + (["areas"] if "areas" in df.columns else []):
+        g = np.full((len(ids), len(years)), np.nan)
+        g[li, yi] = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)
+        grid[c] = g
+
+    dim = lad.dim().iloc[ids].reset_index(drop=True)
+    region = dim["region_code"].astype(object).fillna("unassigned").to_numpy()
+    jti = grid["jti_score"]
+    rank = _rank_desc(jti)
+    region_rank = np.full(jti.shape, np.nan)
+    regions: Dict[str, Any] = {}
+    pop = grid.get("population", np.ones(jti.shape))
+    for code in pd.unique(region):
+        rows = np.flatnonzero(region == code)
+        sub = jti[rows]
+        region_rank[rows] = _rank_desc(sub)
+        w = np.where(np.isnan(sub) | np.isnan(pop[rows]), 0.0, pop[rows])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nansum(sub * w, axis=0) / w.sum(axis=0)
+            comp_mean = {
+                c: _series(np.nansum(grid[c][rows] * w, axis=0) / w.sum(axis=0)) for c in components if c in grid
+            }
+        names = dim["region"].astype(object).iloc[rows].dropna()
+        regions[str(code)] = {
+            "name": str(names.iloc[0]) if len(names) else str(code),
+            "lads": [],  # filled below, by latest rank
+            "jti_mean": _series(mean),
+            "jti_median": _series(_nanquantile(sub, 0.5)),
+            "components_mean": comp_mean,
+            "population": _series(np.nansum(pop[rows], axis=0)),
+        }
+
+    # Latest year each LAD has a score in
+    has = ~np.isnan(jti)
+    last = np.where(has.any(axis=1), len(years) - 1 - np.argmax(has[:, ::-1], axis=1), -1)
+    r = np.arange(len(ids))
+    at = np.maximum(last, 0)
+    scored_n = has.sum(axis=0)
+
+    trend_rows: Dict[str, Dict[str, Any]] = {}
+    if trends is not None and len(trends) and "area_id" not in trends.columns:
+        cols = [c for c in trends.columns if c not in ("lad_id", "lad_code")]
+        for code, row in zip(trends["lad_code"].astype(str), trends[cols].itertuples(index=False)):
+            trend_rows[code] = {c: _value(v) for c, v in zip(cols, row)}
+
+    lads: Dict[str, Any] = {}
+    codes = dim["lad_code"].astype(str).to_numpy()
+    for k in r:
+        code = codes[k]
+        y = at[k]
+        latest = None
+        if last[k] >= 0:
+            latest = {
+                "year": int(years[y]),
+                "jti_score": _series([jti[k, y]])[0],
+                "rank": int(rank[k, y]),
+                "of": int(scored_n[y]),
+                "region_rank": int(region_rank[k, y]),
+                "percentile": _series([1.0 - (rank[k, y] - 1) / max(scored_n[y] - 1, 1)])[0],
+                "scores": {c: _series([grid[c][k, y]])[0] for c in components if c in grid},
+                "contributions": {c: _series([w * grid[c][k, y]])[0] for c, w in components.items() if c in grid},
+                "metrics": {m: _series([grid[m][k, y]])[0] for m in metrics},
+            }
+        lads[code] = {
+            "name": _text(dim["lad_name"].iloc[k], code),
+            "region_code": str(region[k]),
+            "region": regions[str(region[k])]["name"],
+            "country": _text(dim["country"].iloc[k], ""),
+            "jti": _series(jti[k]),
+            "rank": _ints(rank[k]),
+            "region_rank": _ints(region_rank[k]),
+            "components": {c: _series(grid[c][k]) for c in components if c in grid},
+            **({"areas": _ints(grid["areas"][k])} if "areas" in grid else {}),
+            "latest": latest,
+            "trends": trend_rows.get(code),
+        }
+
+    for code, reg in regions.items():
+        rows = np.flatnonzero(region == code)
+        key = np.where(last[rows] >= 0, rank[rows, at[rows]], np.inf)
+        reg["lads"] = [codes[i] for i in rows[np.argsort(key, kind="stable")]]
+
+    return {
+        "meta": {
+            "generated_utc": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+            "release": release,
+            "unit": unit,
+            "years": [int(y) for y in years],
+            "components": components,
+            "metrics": metrics,
+            "lads": int(len(ids)),
+        },
+        "national": {
+            **{f"jti_q{int(q * 100)}": _series(_nanquantile(jti, q)) for q in QUANTILES},
+            "scored": _ints(scored_n),
+            "components_median": {c: _series(_nanquantile(grid[c], 0.5)) for c in components if c in grid},
+            "top": [codes[i] for i in np.argsort(rank[:, -1], kind="stable")[:TOP_N]] if len(years) else [],
+        },
+        "regions": regions,
+        "lads": lads,
+    }
+
+
+def _nanquantile(g: np.ndarray, q: float) -> np.ndarray:
+    """Column quantiles ignoring NaN (NaN for all-NaN columns, no warning)."""
+    out = np.full(g.shape[1], np.nan)
+    ok = (~np.isnan(g)).any(axis=0)
+    if ok.any():
+        out[ok] = np.nanquantile(g[:, ok], q, axis=0)
+    return out
+
+
+def _value(v: Any) -> Any:
+    return bool(v) if isinstance(v, (bool, np.bool_)) else _series([v])[0]
+
+
+def _text(v: Any, default: str) -> str:
+    return default if v is None or v != v else str(v)
+
+
+def write_bundle(bundle: Dict[str, Any], path: Path = BUNDLE_FILE) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(bundle, f, separators=(",", ":"))
+    return path
+
+
+# -------------------------------------------------------
+# HTML
+# -------------------------------------------------------
+
+STYLE = """body{font-family:system-ui,sans-serif;margin:2rem auto;max-width:60rem;color:#222;padding:0 1rem}
+h1{font-size:1.6rem;margin-bottom:.2rem}h2{font-size:1.15rem;margin-top:2rem}
+.sub{color:#666;margin-top:0}table{border-collapse:collapse;width:100%;font-size:.9rem}
+th,td{padding:.25rem .5rem;border-bottom:1px solid #eee;text-align:left}td.n,th.n{text-align:right}
+.cards{display:flex;gap:1rem;flex-wrap:wrap}.card{border:1px solid #ddd;border-radius:6px;padding:.6rem 1rem}
+.card b{display:block;font-size:1.3rem}svg{display:block}a{color:#1a5fb4;text-decoration:none}
+.bar{fill:#1a5fb4}.line{fill:none;stroke:#1a5fb4;stroke-width:2}.band{fill:#1a5fb4;opacity:.12}
+.ref{fill:none;stroke:#999;stroke-width:1;stroke-dasharray:3 3}.axis{font-size:10px;fill:#666}
+"""
+
+
+def _fmt(v: Optional[float], digits: int = 3) -> str:
+    return "–" if v is None else f"{v:,.{digits}f}"
+
+
+def _page(title: str, body: str, depth: int = 0) -> str:
+    up = "../" * depth
+    return (
+        f"<!doctype html><html lang=\"en\"><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(title)}</title><link rel=\"stylesheet\" href=\"{up}style.css\"></head>"
+        f"<body><p><a href=\"{up}index.html\">JTIS reports</a></p>{body}</body></html>"
+    )
+
+
+def _line_chart(
+    years: Sequence[int],
+    series: Sequence[Optional[float]],
+    ref: Optional[Sequence[Optional[float]]] = None,
+    band: Optional[tuple] = None,
+    invert: bool = False,
+    lo: Optional[float] = None,
+    hi: Optional[float] = None,
+    width: int = 560,
+    height: int = 140,
+) -> str:
+    """An SVG line over the years, optionally with a dashed reference line
+    and a shaded (low, high) band; invert puts low values at the top (ranks)."""
+    pad = 28
+    values = [v for s in [series, ref or [], *(band or ())] for v in s if v is not None]
+    if not values or len(years) < 2:
+        return "<p class=\"sub\">No data</p>"
+    lo = min(values) if lo is None else lo
+    hi = max(values) if hi is None else hi
+    span = (hi - lo) or 1.0
+
+    def xy(i: int, v: float) -> str:
+        x = pad + i * (width - 2 * pad) / (len(years) - 1)
+        f = (v - lo) / span
+        y = pad / 2 + (f if invert else 1 - f) * (height - pad)
+        return f"{x:.1f},{y:.1f}"
+
+    def path(s: Sequence[Optional[float]], cls: str) -> str:
+        parts, pen = [], "M"
+        for i, v in enumerate(s):
+            if v is None:
+                pen = "M"
+                continue
+            parts.append(f"{pen}{xy(i, v)}")
+            pen = "L"
+        return f"<path class=\"{cls}\" d=\"{' '.join(parts)}\"/>" if parts else ""
+
+    shapes = []
+    if band is not None:
+        low, high = band
+        idx = [i for i in range(len(years)) if low[i] is not None and high[i] is not None]
+        if idx:
+            pts = [xy(i, high[i]) for i in idx] + [xy(i, low[i]) for i in reversed(idx)]
+            shapes.append(f"<polygon class=\"band\" points=\"{' '.join(pts)}\"/>")
+    if ref is not None:
+        shapes.append(path(ref, "ref"))
+    shapes.append(path(series, "line"))
+    labels = (
+        f"<text class=\"axis\" x=\"{pad}\" y=\"{height - 2}\">{years[0]}</text>"
+        f"<text class=\"axis\" x=\"{width - pad}\" y=\"{height - 2}\" text-anchor=\"end\">{years[-1]}</text>"
+        f"<text class=\"axis\" x=\"2\" y=\"{pad / 2 + (0 if invert else height - pad) + 3:.0f}\">{_fmt(lo, 2)}</text>"
+        f"<text class=\"axis\" x=\"2\" y=\"{pad / 2 + (height - pad if invert else 0) + 3:.0f}\">{_fmt(hi, 2)}</text>"
+    )
+    return f"<svg width=\"{width}\" height=\"{height}\" role=\"img\">{''.join(shapes)}{labels}</svg>"
+
+
+def _bar_chart(values: Dict[str, Optional[float]], width: int = 560, row: int = 22) -> str:
+    items = [(k, v) for k, v in values.items() if v is not None]
+    if not items:
+        return "<p class=\"sub\">No data</p>"
+    top = max(abs(v) for _, v in items) or 1.0
+    label_w = 160
+    bars = []
+    for i, (k, v) in enumerate(items):
+        w = abs(v) / top * (width - label_w - 60)
+        y = i * row
+        bars.append(
+            f"<text class=\"axis\" x=\"0\" y=\"{y + 14}\">{html.escape(k)}</text>"
+            f"<rect class=\"bar\" x=\"{label_w}\" y=\"{y + 3}\" width=\"{w:.1f}\" height=\"{row - 6}\"/>"
+            f"<text class=\"axis\" x=\"{label_w + w + 4:.1f}\" y=\"{y + 14}\">{_fmt(v)}</text>"
+        )
+    return f"<svg width=\"{width}\" height=\"{row * len(items)}\" role=\"img\">{''.join(bars)}</svg>"
+
+
+def _lad_link(code: str, lad: Dict[str, Any], depth: int) -> str:
+    return f"<a href=\"{'../' * depth}lads/{html.escape(code)}.html\">{html.escape(lad['name'])}</a>"
+
+
+def _ranking_table(bundle: Dict[str, Any], codes: Sequence[str], depth: int, rank_key: str = "rank") -> str:
+    comps = list(bundle["meta"]["components"])
+    head = "".join(f"<th class=\"n\">{html.escape(c.removesuffix('_score'))}</th>" for c in comps)
+    rows = []
+    for code in codes:
+        lad = bundle["lads"][code]
+        latest = lad["latest"] or {}
+        scores = latest.get("scores") or {}
+        cells = "".join(f"<td class=\"n\">{_fmt(scores.get(c))}</td>" for c in comps)
+        rows.append(
+            f"<tr><td class=\"n\">{latest.get(rank_key, '–')}</td><td>{_lad_link(code, lad, depth)}</td>"
+            f"<td>{html.escape(lad['region'])}</td><td class=\"n\">{_fmt(latest.get('jti_score'))}</td>{cells}</tr>"
+        )
+    return (
+        f"<table><tr><th class=\"n\">Rank</th><th>LAD</th><th>Region</th><th class=\"n\">JTI</th>{head}</tr>"
+        f"{''.join(rows)}</table>"
+    )
+
+
+def render_index(bundle: Dict[str, Any]) -> str:
+    meta, nat = bundle["meta"], bundle["national"]
+    years = meta["years"]
+    regions = sorted(bundle["regions"].items(), key=lambda kv: kv[1]["name"])
+    reg_rows = "".join(
+        f"<tr><td><a href=\"regions/{html.escape(code)}.html\">{html.escape(r['name'])}</a></td>"
+        f"<td class=\"n\">{len(r['lads'])}</td><td class=\"n\">{_fmt(r['jti_mean'][-1])}</td>"
+        f"<td class=\"n\">{_fmt(r['jti_median'][-1])}</td></tr>"
+        for code, r in regions
+    )
+    all_codes = sorted(bundle["lads"], key=lambda c: ((bundle["lads"][c]["latest"] or {}).get("rank", 1e9), c))
+    body = (
+        f"<h1>Just Transition Index</h1><p class=\"sub\">{meta['lads']} LADs, {years[0]}–{years[-1]}"
+        f"{' (from a ' + meta['unit'] + ' panel)' if meta['unit'] != 'lad' else ''}"
+        f"{', release ' + html.escape(meta['release']) if meta.get('release') else ''}</p>"
+        f"<h2>National JTI, median and 10th–90th percentile</h2>"
+        f"{_line_chart(years, nat['jti_q50'], band=(nat['jti_q10'], nat['jti_q90']))}"
+        f"<h2>Regions, {years[-1]}</h2><table><tr><th>Region</th><th class=\"n\">LADs</th>"
+        f"<th class=\"n\">JTI (population-weighted)</th><th class=\"n\">JTI median</th></tr>{reg_rows}</table>"
+        f"<h2>All LADs by JTI, {years[-1]}</h2>{_ranking_table(bundle, all_codes, 0)}"
+    )
+    return _page("Just Transition Index", body)
+
+
+def render_region(bundle: Dict[str, Any], code: str) -> str:
+    reg = bundle["regions"][code]
+    years = bundle["meta"]["years"]
+    comps = "".join(
+        f"<h3>{html.escape(c)}</h3>{_line_chart(years, s, ref=bundle['national']['components_median'].get(c), height=100)}"
+        for c, s in reg["components_mean"].items()
+    )
+    body = (
+        f"<h1>{html.escape(reg['name'])}</h1><p class=\"sub\">{len(reg['lads'])} LADs</p>"
+        f"<h2>JTI, population-weighted mean (dashed: national median)</h2>"
+        f"{_line_chart(years, reg['jti_mean'], ref=bundle['national']['jti_q50'])}"
+        f"<h2>LADs by JTI, {years[-1]}</h2>{_ranking_table(bundle, reg['lads'], 1, 'region_rank')}"
+        f"<h2>Components (dashed: national median)</h2>{comps}"
+    )
+    return _page(reg["name"], body, depth=1)
+
+
+def render_lad(bundle: Dict[str, Any], code: str) -> str:
+    lad = bundle["lads"][code]
+    meta = bundle["meta"]
+    years = meta["years"]
+    latest = lad["latest"] or {}
+    region = bundle["regions"][lad["region_code"]]
+    cards = "".join(
+        f"<div class=\"card\">{label}<b>{value}</b></div>"
+        for label, value in [
+            (f"JTI {latest.get('year', '')}", _fmt(latest.get("jti_score"))),
+            ("National rank", f"{latest['rank']} of {latest['of']}" if latest else "–"),
+            ("Rank in region", f"{latest['region_rank']} of {len(region['lads'])}" if latest else "–"),
+        ]
+    )
+    metric_rows = "".join(
+        f"<tr><td>{html.escape(m)}</td><td class=\"n\">{_fmt(v)}</td></tr>"
+        for m, v in (latest.get("metrics") or {}).items()
+    )
+    trend_rows = "".join(
+        f"<tr><td>{html.escape(k)}</td><td class=\"n\">{v if isinstance(v, bool) else _fmt(v)}</td></tr>"
+        for k, v in (lad.get("trends") or {}).items()
+    )
+    ranks = [None if r is None else float(r) for r in lad["rank"]]
+    n = max((x for x in bundle["national"]["scored"] if x is not None), default=1)
+    body = (
+        f"<h1>{html.escape(lad['name'])}</h1>"
+        f"<p class=\"sub\">{html.escape(code)} · <a href=\"../regions/{html.escape(lad['region_code'])}.html\">"
+        f"{html.escape(lad['region'])}</a> · {html.escape(lad['country'])}</p>"
+        f"<div class=\"cards\">{cards}</div>"
+        f"<h2>JTI (dashed: region mean; band: national 10th–90th percentile)</h2>"
+        f"{_line_chart(years, lad['jti'], ref=region['jti_mean'], band=(bundle['national']['jti_q10'], bundle['national']['jti_q90']))}"
+        f"<h2>National rank (1 = highest JTI)</h2>{_line_chart(years, ranks, invert=True, lo=1, hi=n)}"
+        f"<h2>Contributions to the {latest.get('year', '')} JTI (weight × component score)</h2>"
+        f"{_bar_chart(latest.get('contributions') or {})}"
+        f"<h2>Components over time</h2>"
+        + "".join(
+            f"<h3>{html.escape(c)}</h3>{_line_chart(years, s, ref=region['components_mean'].get(c), height=100)}"
+            for c, s in lad["components"].items()
+        )
+        + (f"<h2>Indicators, {latest.get('year', '')}</h2><table>{metric_rows}</table>" if metric_rows else "")
+        + (f"<h2>Trends</h2><table>{trend_rows}</table>" if trend_rows else "")
+    )
+    return _page(lad["name"], body, depth=1)
+
+
+# -------------------------------------------------------
+# Rendering
+# -------------------------------------------------------
+
+_BUNDLE: Optional[Dict[str, Any]] = None
+
+
+def _load_bundle(path: str) -> None:
+    global _BUNDLE
+    with open(path, "r", encoding="utf-8") as f:
+        _BUNDLE = json.load(f)
+
+
+def _render_lads(codes: Sequence[str], out_dir: str, bundle: Optional[Dict[str, Any]] = None) -> int:
+    bundle = bundle if bundle is not None else _BUNDLE
+    lad_dir = Path(out_dir) / "lads"
+    for code in codes:
+        (lad_dir / f"{code}.html").write_text(render_lad(bundle, code), encoding="utf-8")
+    return len(codes)
+
+
+def render_site(
+    bundle: Dict[str, Any],
+    out_dir: Path = OUT_DIR,
+    workers: Optional[int] = None,
+    bundle_file: Optional[Path] = None,
+) -> Dict[str, int]:
+    """Write the overview, region and LAD pages. LAD pages go to worker
+    processes in chunks; each worker reads the bundle file once."""
+    out_dir = Path(out_dir)
+    (out_dir / "lads").mkdir(parents=True, exist_ok=True)
+    (out_dir / "regions").mkdir(parents=True, exist_ok=True)
+    (out_dir / "style.css").write_text(STYLE, encoding="utf-8")
+    (out_dir / "index.html").write_text(render_index(bundle), encoding="utf-8")
+    for code in bundle["regions"]:
+        (out_dir / "regions" / f"{code}.html").write_text(render_region(bundle, code), encoding="utf-8")
+
+    codes = list(bundle["lads"])
+    workers = min(workers or os.cpu_count() or 1, max(len(codes) // 16, 1))
+    if workers <= 1 or bundle_file is None:
+        n = _render_lads(codes, str(out_dir), bundle)
+    else:
+        chunks = [codes[i::workers * 4] for i in range(workers * 4)]
+        with ProcessPoolExecutor(workers, initializer=_load_bundle, initargs=(str(bundle_file),)) as pool:
+            n = sum(pool.map(_render_lads, chunks, [str(out_dir)] * len(chunks)))
+    return {"regions": len(bundle["regions"]), "lads": n}
+
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the report bundle and render the HTML report pages.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the LAD pages (default: CPUs)")
+    parser.add_argument("--bundle-only", action="store_true", help="Write bundle.json, no HTML")
+    args = parser.parse_args(argv)
+
+    if not SCORED_FILE.exists():
+        raise FileNotFoundError(f"Scored table not found: {SCORED_FILE}. Run src/scoring/jti_scoring.py first.")
+
+    from src.storage.results_store import ResultsStore
+
+    t0 = time.perf_counter()
+    print(f"[PROFILES] Loading scored panel from: {SCORED_FILE}")
+    scored = pd.read_csv(SCORED_FILE)
+    trends = pd.read_csv(TRENDS_FILE) if TRENDS_FILE.exists() else None
+    lad = LadDictionary.load()
+    bundle = build_bundle(scored, lad, trends, release=ResultsStore().latest_release("scored"))
+    path = write_bundle(bundle)
+    t1 = time.perf_counter()
+    print(f"[PROFILES] Bundle: {bundle['meta']['lads']} LADs, {len(bundle['regions'])} regions, "
+          f"{path.stat().st_size / 2**10:.0f} KB ({t1 - t0:.2f}s) → {path}")
+    if args.bundle_only:
+        return 0
+
+    counts = render_site(bundle, OUT_DIR, args.workers, bundle_file=path)
+    print(f"[PROFILES] Rendered index, {counts['regions']} region and {counts['lads']} LAD pages "
+          f"({time.perf_counter() - t1:.2f}s) → {OUT_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,323 @@
+"""
+JTIS – release diff
+Explains what changed between two scored panels.
+
+Both panels are aligned on (lad_code, year) with a sorted-key merge over
+integer-encoded keys, all metric deltas are computed as one array operation,
+and every jti_score change is split exactly into its emissions, transport and
+structural contributions (jti is a weighted sum of the three; each release is
+weighted with the component weights recorded in its store meta). Raw input
+columns are grouped by source so a report can say whether a change came from a
+DESNZ, DfT, ONS or IMD revision.
+
+Runs automatically at the end of jti_scoring.main when a previous release is
+in the results store; can also diff any two releases or CSVs by hand.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.scoring.indicators import load_registry  # noqa: E402
+from src.storage.results_store import ResultsStore  # noqa: E402
+
+DIAG_FILE = ROOT / "outputs" / "diagnostics" / "release_diff_report.json"
+
+KEY_COLS = ["lad_code", "year"]
+
+# Raw inputs grouped by the upstream source that revises them
+SOURCE_COLUMNS = {
+    "desnz": [
+        "total_emissions_scope_ktco2",
+        "territorial_emissions_ktco2e",
+        "area_km2",
+    ],
+    "dft": [
+        "total_fuel_ktoe",
+        "personal_transport_ktoe",
+        "freight_transport_ktoe",
+        "bioenergy_ktoe",
+    ],
+    "ons": ["population"],
+    "imd": ["imd_rank_avg", "deprivation_pct", "deprived_share"],
+}
+
+
+TOLERANCE = 1e-9
+TOP_N = 20
+
+
+def components(weights: Optional[Dict[str, float]] = None) -> Dict[str, str]:
+    """Component name -> score column, from `weights` (default: the
+    indicator registry's)."""
+    weights = weights if weights is not None else load_registry().component_weights
+    return {c.removesuffix("_score"): c for c in weights}
+
+
+def release_weights(store: ResultsStore, release: str, table: str = "scored") -> Dict[str, float]:
+    """Component weights a release was scored with; the current registry's
+    for releases written before they were recorded."""
+    meta = store.catalogue()["tables"][table]["releases"][release].get("meta", {})
+    return meta.get("component_weights") or load_registry().component_weights
+
+
+# -------------------------------------------------------
+# Alignment
+# -------------------------------------------------------
+
+def _encode_keys(old: pd.DataFrame, new: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Map (lad_code, year) in both tables onto one int64 key space;
+    (area_code, year) when both are small-area panels."""
+    if "area_code" in old.columns and "area_code" in new.columns:
+        # area_id is local to one base table; align on the codes
+        codes, _ = pd.factorize(
+            pd.concat([old["area_code"], new["area_code"]], ignore_index=True).astype(str)
+        )
+    else:
+        # lad_id is not stable across releases (dim_lad is rebuilt locally in
+        # first-seen order), so releases always align on the codes
+        codes, _ = pd.factorize(
+            pd.concat([old["lad_code"], new["lad_code"]], ignore_index=True).astype(str)
+        )
+    years = np.concatenate(
+        [old["year"].to_numpy(dtype=np.int64), new["year"].to_numpy(dtype=np.int64)]
+    )
+    keys = codes.astype(np.int64) * 10_000 + years
+    return keys[: len(old)], keys[len(old):]
+
+
+def align(old: pd.DataFrame, new: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Sorted-key merge of two panels. Returns row positions of matched keys in
+    each table plus the positions of keys only present on one side.
+    """
+    if ("area_code" in old.columns) != ("area_code" in new.columns):
+        raise ValueError("One panel is LAD-level, the other small-area; cannot align panels")
+    k_old, k_new = _encode_keys(old, new)
+    o_order = np.argsort(k_old, kind="stable")
+    n_order = np.argsort(k_new, kind="stable")
+    o_sorted = k_old[o_order]
+    n_sorted = k_new[n_order]
+
+    if (np.diff(o_sorted) == 0).any() or (np.diff(n_sorted) == 0).any():
+        raise ValueError("Duplicate (lad_code, year) keys; cannot align panels")
+
+    _, o_idx, n_idx = np.intersect1d(
+        o_sorted, n_sorted, assume_unique=True, return_indices=True
+    )
+    removed = np.setdiff1d(np.arange(len(o_sorted)), o_idx, assume_unique=True)
+    added = np.setdiff1d(np.arange(len(n_sorted)), n_idx, assume_unique=True)
+
+    return {
+        "old": o_order[o_idx],
+        "new": n_order[n_idx],
+        "removed": o_order[removed],
+        "added": n_order[added],
+    }
+
+
+def _changed(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    both_nan = np.isnan(a) & np.isnan(b)
+    return ~both_nan & ~(np.abs(b - a) <= TOLERANCE)
+
+
+def _numeric_block(df: pd.DataFrame, rows: np.ndarray, cols: List[str]) -> np.ndarray:
+    block = df[cols].iloc[rows]
+    return block.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+
+# -------------------------------------------------------
+# Diff
+# -------------------------------------------------------
+
+def diff_panels(
+    old: pd.DataFrame,
+    new: pd.DataFrame,
+    weights_old: Optional[Dict[str, float]] = None,
+    weights_new: Optional[Dict[str, float]] = None,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Compare two scored panels. Returns one row per aligned LA–year with the
+    deltas and per-component contributions, plus a compact summary dict.
+    Each panel's jti_score is attributed with the component weights it was
+    scored with (default: the current registry's).
+    """
+    idx = align(old, new)
+    current = load_registry().component_weights if weights_old is None or weights_new is None else {}
+    weights_old = weights_old if weights_old is not None else current
+    weights_new = weights_new if weights_new is not None else current
+    comps = {
+        n: c for n, c in components({**weights_old, **weights_new}).items()
+        if c in old.columns and c in new.columns
+    }
+
+    source_cols = {
+        src: [c for c in cols if c in old.columns and c in new.columns]
+        for src, cols in SOURCE_COLUMNS.items()
+    }
+    input_cols = [c for cols in source_cols.values() for c in cols]
+    score_cols = ["jti_score"] + list(comps.values())
+    metric_cols = list(dict.fromkeys(input_cols + score_cols))
+
+    a = _numeric_block(old, idx["old"], metric_cols)
+    b = _numeric_block(new, idx["new"], metric_cols)
+    delta = b - a
+    changed = _changed(a, b)
+
+    pos = {c: i for i, c in enumerate(metric_cols)}
+    out = pd.DataFrame(
+        {
+            **({"area_code": new["area_code"].to_numpy()[idx["new"]]} if "area_code" in new.columns else {}),
+            "lad_code": new["lad_code"].to_numpy()[idx["new"]],
+            "year": new["year"].to_numpy()[idx["new"]],
+            "jti_old": a[:, pos["jti_score"]],
+            "jti_new": b[:, pos["jti_score"]],
+            "jti_delta": delta[:, pos["jti_score"]],
+        }
+    )
+
+    # Exact attribution: Δjti = Σ (w_new,c · component_new,c − w_old,c · component_old,c),
+    # which is Σ w_c · Δcomponent_c while the weights are unchanged
+    for name, col in comps.items():
+        out[f"{name}_contrib"] = (
+            weights_new.get(col, 0.0) * b[:, pos[col]] - weights_old.get(col, 0.0) * a[:, pos[col]]
+        )
+
+    source_changed = {}
+    for src, cols in source_cols.items():
+        if cols:
+            source_changed[src] = changed[:, [pos[c] for c in cols]].any(axis=1)
+            out[f"{src}_revised"] = source_changed[src]
+
+    jti_changed = changed[:, pos["jti_score"]]
+    out["jti_changed"] = jti_changed
+
+    contrib = out[[f"{n}_contrib" for n in comps]].to_numpy()
+    abs_total = np.nansum(np.abs(contrib))
+    summary: Dict[str, Any] = {
+        "rows_old": int(len(old)),
+        "rows_new": int(len(new)),
+        "aligned": int(len(idx["old"])),
+        "added": int(len(idx["added"])),
+        "removed": int(len(idx["removed"])),
+        "added_examples": new[KEY_COLS].iloc[idx["added"][:TOP_N]].values.tolist(),
+        "removed_examples": old[KEY_COLS].iloc[idx["removed"][:TOP_N]].values.tolist(),
+        "changed_rows": int(jti_changed.sum()),
+        "component_weights": {"old": dict(weights_old), "new": dict(weights_new)},
+        "jti_delta": {
+            "mean": float(np.nanmean(out["jti_delta"])) if len(out) else 0.0,
+            "max_abs": float(np.nanmax(np.abs(out["jti_delta"]))) if jti_changed.any() else 0.0,
+        },
+        "component_share": {
+            name: (float(np.nansum(np.abs(contrib[:, i]))) / abs_total if abs_total else 0.0)
+            for i, name in enumerate(comps)
+        },
+        "source_revisions": {src: int(mask.sum()) for src, mask in source_changed.items()},
+        "metric_changes": {c: int(changed[:, i].sum()) for c, i in pos.items()},
+    }
+
+    mover_idx = out.loc[jti_changed, "jti_delta"].abs().sort_values(ascending=False).index
+    movers = out.loc[mover_idx[:TOP_N]]
+    summary["top_movers"] = [
+        {
+            "lad_code": r.lad_code,
+            "year": int(r.year),
+            "jti_old": r.jti_old,
+            "jti_new": r.jti_new,
+            "jti_delta": r.jti_delta,
+            **{f"{n}_contrib": getattr(r, f"{n}_contrib") for n in comps},
+            "sources_revised": [s for s in source_changed if getattr(r, f"{s}_revised")],
+        }
+        for r in movers.itertuples(index=False)
+    ]
+
+    return out, summary
+
+
+def same_unit(store: ResultsStore, release_a: str, release_b: str, table: str = "scored") -> bool:
+    """Whether two releases are panels of the same unit (LAD or small area)."""
+    releases = store.catalogue()["tables"][table]["releases"]
+    return ("area_code" in releases[release_a]["columns"]) == ("area_code" in releases[release_b]["columns"])
+
+
+def diff_releases(
+    store: ResultsStore,
+    release_old: str,
+    release_new: str,
+    table: str = "scored",
+) -> Dict[str, Any]:
+    """Diff two releases of the results store, reading only the needed
+    columns; each is attributed with the weights it was scored with."""
+    weights_old = release_weights(store, release_old, table)
+    weights_new = release_weights(store, release_new, table)
+    wanted = set(KEY_COLS + ["area_code", "jti_score"] + list(components({**weights_old, **weights_new}).values()))
+    wanted.update(c for cols in SOURCE_COLUMNS.values() for c in cols)
+
+    def load(release: str) -> pd.DataFrame:
+        available = store.catalogue()["tables"][table]["releases"][release]["columns"]
+        return store.read(table, release, columns=[c for c in available if c in wanted])
+
+    _, summary = diff_panels(load(release_old), load(release_new), weights_old, weights_new)
+    return {
+        "timestamp_utc": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "table": table,
+        "release_old": release_old,
+        "release_new": release_new,
+        **summary,
+    }
+
+
+def write_report(report: Dict[str, Any], path: Path | None = None) -> Path:
+    out = path or DIAG_FILE
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=float)
+    print(f"[RELEASE_DIFF] Report written to {out}")
+    return out
+
+
+# -------------------------------------------------------
+# CLI entrypoint
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Diff two scored panels.")
+    parser.add_argument("old", nargs="?", help="Old release (or CSV path); default: previous release")
+    parser.add_argument("new", nargs="?", help="New release (or CSV path); default: latest release")
+    args = parser.parse_args(argv)
+
+    if (args.old or "").endswith(".csv") or (args.new or "").endswith(".csv"):
+        if not (args.old and args.new):
+            parser.error("diffing CSVs needs both the old and the new CSV path")
+        _, summary = diff_panels(pd.read_csv(args.old), pd.read_csv(args.new))
+        report = {"release_old": args.old, "release_new": args.new, **summary}
+    else:
+        store = ResultsStore()
+        new = args.new or store.latest_release("scored")
+        old = args.old or (store.latest_release("scored", before=new) if new else None)
+        if old is None or new is None:
+            print("[RELEASE_DIFF] Need two scored releases to compare.")
+            return 1
+        report = diff_releases(store, old, new)
+
+    write_report(report)
+    print(f"[RELEASE_DIFF] {report['changed_rows']} changed LA–years, "
+          f"{report['added']} added, {report['removed']} removed")
+    print(f"[RELEASE_DIFF] Source revisions: {report['source_revisions']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,404 @@
+"""
+JTIS – scenario engine
+What-if interventions on the base LA–year panel, rescored in memory.
+
+- An intervention scales, shifts or replaces one base measure for rows
+  selected by LAD, region and year range; a scenario is a list of them
+- Scenarios are applied as a batch over the shared base arrays: only the
+  measures a scenario touches get a (scenarios, rows) array, and changes to
+  personal or freight fuel carry through to total fuel
+- Each batch goes through the indicator registry's metric plan and
+  normalisation at once (leading scenario axis), so nothing is written
+  between steps
+- The result is a scenario × LAD cube (float32 scores, int16 ranks) for one
+  year, with the unmodified panel as scenario 0 ("baseline")
+
+Scenarios are declared in config/scenarios.yaml; a list `value` expands
+into one scenario per value (sweeps).
+
+Run with: python src/analysis/scenarios.py [--year 2023] [--only NAME ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation import impute  # noqa: E402
+from src.harmonisation.lad_codes import LadDictionary  # noqa: E402
+from src.scoring import trends  # noqa: E402
+from src.scoring.indicators import IndicatorRegistry, load_registry  # noqa: E402
+
+SCENARIOS_FILE = ROOT / "config" / "scenarios.yaml"
+OUT_DIR = ROOT / "outputs" / "scenarios"
+DIAG_FILE = ROOT / "outputs" / "diagnostics" / "scenario_report.json"
+
+OPS = ("scale", "shift", "set")
+BASELINE = "baseline"
+
+# Base measures that are the sum of others; an intervention on a part moves
+# the total by the same amount unless the total is itself intervened on
+TOTALS = {
+    "total_fuel_ktoe": ("personal_transport_ktoe", "freight_transport_ktoe"),
+}
+
+BATCH_SIZE = 64
+TOP_N = 10
+
+
+@dataclass(frozen=True)
+class Intervention:
+    metric: str
+    op: str
+    value: float
+    lads: Tuple[str, ...] = ()
+    regions: Tuple[str, ...] = ()                  # names or codes
+    years: Tuple[Optional[int], Optional[int]] = (None, None)   # inclusive
+
+    @property
+    def selector(self) -> Tuple[Any, ...]:
+        return (self.lads, self.regions, self.years)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    interventions: Tuple[Intervention, ...] = ()
+    description: str = ""
+
+
+# -------------------------------------------------------
+# Scenario definitions
+# -------------------------------------------------------
+
+def _intervention(spec: Mapping[str, Any], value: float) -> Intervention:
+    years = spec.get("years") or {}
+    if isinstance(years, int):
+        years = {"from": years, "to": years}
+    return Intervention(
+        metric=spec["metric"],
+        op=spec.get("op", "scale"),
+        value=float(value),
+        lads=tuple(spec.get("lads") or ()),
+        regions=tuple(spec.get("regions") or ()),
+        years=(years.get("from"), years.get("to")),
+    )
+
+
+def parse_scenarios(doc: Mapping[str, Any]) -> List[Scenario]:
+    """Scenarios from a scenarios.yaml document; an intervention whose value
+    is a list expands into one scenario per value ("<name>@<value>")."""
+    out: List[Scenario] = []
+    for name, spec in (doc.get("scenarios") or {}).items():
+        ivs = spec.get("interventions") or []
+        sweep = [k for k, iv in enumerate(ivs) if isinstance(iv.get("value"), list)]
+        if len(sweep) > 1:
+            raise ValueError(f"[SCENARIOS] {name}: only one intervention may sweep a list of values")
+        values = ivs[sweep[0]]["value"] if sweep else [None]
+        for v in values:
+            built = tuple(
+                _intervention(iv, v if k in sweep else iv["value"]) for k, iv in enumerate(ivs)
+            )
+            label = f"{name}@{v:g}" if sweep else name
+            out.append(Scenario(label, built, spec.get("description", "")))
+    return out
+
+
+def load_scenarios(path: Path = SCENARIOS_FILE) -> List[Scenario]:
+    with Path(path).open("r", encoding="utf-8") as f:
+        return parse_scenarios(yaml.safe_load(f) or {})
+
+
+# -------------------------------------------------------
+# Result cube
+# -------------------------------------------------------
+
+@dataclass
+class ScenarioCube:
+    scenarios: List[str]
+    lad_id: np.ndarray            # (g,)
+    lad_code: np.ndarray          # (g,)
+    year: int
+    scores: Dict[str, np.ndarray] = field(default_factory=dict)   # name -> (s, g) float32
+    rank: np.ndarray = field(default_factory=lambda: np.empty((0, 0), dtype=np.int16))
+
+    @property
+    def jti(self) -> np.ndarray:
+        return self.scores["jti_score"]
+
+    def delta(self, name: str = "jti_score") -> np.ndarray:
+        """Change against the baseline, (s, g)."""
+        return self.scores[name] - self.scores[name][0]
+
+    def rank_change(self) -> np.ndarray:
+        """Places moved against the baseline (positive = higher pressure rank)."""
+        return self.rank[0].astype(np.int32) - self.rank.astype(np.int32)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long format: one row per scenario × LAD."""
+        s, g = self.rank.shape
+        out = pd.DataFrame({
+            "scenario": np.repeat(np.array(self.scenarios, dtype=object), g),
+            "lad_id": np.tile(self.lad_id, s),
+            "lad_code": np.tile(self.lad_code, s),
+            "year": self.year,
+        })
+        for name, values in self.scores.items():
+            out[name] = values.ravel()
+        out["rank"] = self.rank.ravel()
+        out["jti_delta"] = self.delta().ravel()
+        out["rank_change"] = self.rank_change().ravel()
+        return out
+
+    def summary(self, top: int = TOP_N) -> List[Dict[str, Any]]:
+        delta, moved = self.delta(), self.rank_change()
+        rows = []
+        for k, name in enumerate(self.scenarios[1:], start=1):
+            order = np.argsort(-np.abs(moved[k]), kind="stable")[:top]
+            rows.append({
+                "scenario": name,
+                "mean_jti_delta": float(np.nanmean(delta[k])),
+                "max_abs_jti_delta": float(np.nanmax(np.abs(delta[k]))),
+                "lads_rank_changed": int((moved[k] != 0).sum()),
+                "top_rank_moves": [
+                    {"lad_code": str(self.lad_code[i]), "rank": int(self.rank[k, i]), "moved": int(moved[k, i])}
+                    for i in order if moved[k, i] != 0
+                ],
+            })
+        return rows
+
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            scenarios=np.array(self.scenarios),
+            lad_id=self.lad_id,
+            lad_code=self.lad_code.astype(str),
+            year=np.array(self.year),
+            rank=self.rank,
+            **{f"score__{k}": v for k, v in self.scores.items()},
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "ScenarioCube":
+        with np.load(path) as z:
+            return cls(
+                scenarios=z["scenarios"].tolist(),
+                lad_id=z["lad_id"],
+                lad_code=z["lad_code"].astype(object),
+                year=int(z["year"]),
+                scores={k[len("score__"):]: z[k] for k in z.files if k.startswith("score__")},
+                rank=z["rank"],
+            )
+
+
+def rank_desc(values: np.ndarray) -> np.ndarray:
+    """1 = highest along the last axis; NaN ranks last."""
+    order = np.argsort(np.where(np.isnan(values), np.inf, -values), axis=-1, kind="stable")
+    rank = np.empty(values.shape, dtype=np.int16)
+    np.put_along_axis(rank, order, np.arange(1, values.shape[-1] + 1, dtype=np.int16)[None, :], axis=-1)
+    return rank
+
+
+# -------------------------------------------------------
+# Engine
+# -------------------------------------------------------
+
+def measures(registry: IndicatorRegistry) -> List[str]:
+    """Base measures scenarios can change: those the scores read, plus the
+    parts of any total among them."""
+    cols = registry.base_columns(registry.plan(outputs=False))
+    parts = [p for total, ps in TOTALS.items() if total in cols for p in ps]
+    return list(dict.fromkeys(cols + parts))
+
+
+class ScenarioEngine:
+    def __init__(
+        self,
+        base: pd.DataFrame,
+        lad: LadDictionary,
+        registry: Optional[IndicatorRegistry] = None,
+    ):
+        """`base` is the lad_id-keyed base panel with at least the registry's
+        base columns (see star.gather)."""
+        self.registry = registry or load_registry()
+        self.plan = self.registry.plan(outputs=False)
+        self.columns = measures(self.registry)
+
+        base = base.sort_values(["lad_id", "year"]).reset_index(drop=True)
+        self.panel = trends.Panel.from_frame(base, "lad_id")
+        self.lad_id = base["lad_id"].to_numpy(dtype=np.int64)
+        self.year = base["year"].to_numpy(dtype=np.int64)
+        self.base = {
+            c: pd.to_numeric(base[c], errors="coerce").to_numpy(dtype=float) for c in self.columns
+        }
+
+        dim = lad.dim()
+        self.lad_code = lad.decode(self.lad_id)
+        self.region = dim["region"].astype(object).to_numpy()[self.lad_id]
+        self.region_code = dim["region_code"].astype(object).to_numpy()[self.lad_id]
+        self._masks: Dict[Tuple[Any, ...], np.ndarray] = {}
+
+    @classmethod
+    def from_star(cls, registry: Optional[IndicatorRegistry] = None) -> "ScenarioEngine":
+        """Engine over the base columns gathered from the star schema facts,
+        gaps imputed as in the base table."""
+        registry = registry or load_registry()
+        lad = LadDictionary.load()
+        return cls(impute.gather_filled(measures(registry), lad=lad)[0], lad, registry)
+
+    def mask(self, iv: Intervention) -> np.ndarray:
+        """Rows an intervention applies to (cached per selector)."""
+        key = iv.selector
+        if key not in self._masks:
+            m = np.ones(len(self.year), dtype=bool)
+            if iv.lads:
+                m &= np.isin(self.lad_code, list(iv.lads))
+            if iv.regions:
+                m &= np.isin(self.region, list(iv.regions)) | np.isin(self.region_code, list(iv.regions))
+            lo, hi = iv.years
+            if lo is not None:
+                m &= self.year >= lo
+            if hi is not None:
+                m &= self.year <= hi
+            self._masks[key] = m
+        return self._masks[key]
+
+    def validate(self, scenarios: Sequence[Scenario]) -> None:
+        for sc in scenarios:
+            for iv in sc.interventions:
+                if iv.metric not in self.base:
+                    raise ValueError(
+                        f"[SCENARIOS] {sc.name}: {iv.metric!r} is not a base measure the scores use "
+                        f"(one of {self.columns})"
+                    )
+                if iv.op not in OPS:
+                    raise ValueError(f"[SCENARIOS] {sc.name}: op must be one of {OPS}")
+                if not self.mask(iv).any():
+                    print(f"[SCENARIOS] Warning: {sc.name}: an intervention on {iv.metric} selects no rows")
+
+    def apply(self, scenarios: Sequence[Scenario]) -> Dict[str, np.ndarray]:
+        """Base arrays with the scenarios applied: (s, n) for touched
+        measures, the shared (n,) base array otherwise. Within a scenario,
+        set is applied first, then scale, then shift."""
+        s = len(scenarios)
+        touched = {iv.metric for sc in scenarios for iv in sc.interventions}
+        factor = {c: np.ones((s, len(self.year))) for c in touched}
+        offset = {c: np.zeros((s, len(self.year))) for c in touched}
+        replaced = {c: np.full((s, len(self.year)), np.nan) for c in touched}
+
+        for k, sc in enumerate(scenarios):
+            for iv in sc.interventions:
+                m = self.mask(iv)
+                if iv.op == "scale":
+                    factor[iv.metric][k, m] *= iv.value
+                elif iv.op == "shift":
+                    offset[iv.metric][k, m] += iv.value
+                else:
+                    replaced[iv.metric][k, m] = iv.value
+
+        out: Dict[str, np.ndarray] = dict(self.base)
+        for c in touched:
+            start = np.where(np.isnan(replaced[c]), self.base[c], replaced[c])
+            out[c] = start * factor[c] + offset[c]
+
+        for total, parts in TOTALS.items():
+            moved = [p for p in parts if p in touched]
+            if total in out and total not in touched and moved:
+                out[total] = self.base[total] + sum(out[p] - self.base[p] for p in moved)
+        return out
+
+    def score(
+        self,
+        scenarios: Sequence[Scenario],
+        year: Optional[int] = None,
+        batch_size: int = BATCH_SIZE,
+    ) -> ScenarioCube:
+        """Rescore the baseline plus `scenarios`; cube for `year` (default:
+        the latest year in the panel)."""
+        scenarios = [Scenario(BASELINE)] + [sc for sc in scenarios if sc.name != BASELINE]
+        self.validate(scenarios)
+        year = int(self.year.max()) if year is None else int(year)
+        rows = np.flatnonzero(self.year == year)
+        if not rows.size:
+            raise ValueError(f"[SCENARIOS] No rows for year {year}")
+
+        names = ["jti_score"] + list(self.registry.component_weights)
+        scores = {n: np.empty((len(scenarios), rows.size), dtype=np.float32) for n in names}
+        for lo in range(0, len(scenarios), batch_size):
+            batch = scenarios[lo: lo + batch_size]
+            metrics = self.registry.compute_metrics(self.apply(batch), self.panel, self.plan)
+            result = self.registry.compute_scores(metrics, years=self.year)
+            for n in names:
+                scores[n][lo: lo + len(batch)] = np.broadcast_to(
+                    result[n], (len(batch), len(self.year))
+                )[:, rows]
+
+        return ScenarioCube(
+            scenarios=[sc.name for sc in scenarios],
+            lad_id=self.lad_id[rows],
+            lad_code=self.lad_code[rows],
+            year=year,
+            scores=scores,
+            rank=rank_desc(scores["jti_score"]),
+        )
+
+
+# -------------------------------------------------------
+# CLI entrypoint
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score what-if scenarios against the base panel.")
+    parser.add_argument("--scenarios", type=Path, default=SCENARIOS_FILE)
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Scenario names (sweeps: prefix)")
+    parser.add_argument("--year", type=int, help="Year of the result cube (default: latest)")
+    parser.add_argument("--out", type=Path, default=OUT_DIR / "scenario_cube.npz")
+    args = parser.parse_args(argv)
+
+    scenarios = load_scenarios(args.scenarios)
+    if args.only:
+        scenarios = [sc for sc in scenarios if sc.name.split("@")[0] in args.only or sc.name in args.only]
+    print(f"[SCENARIOS] {len(scenarios)} scenario(s) from {args.scenarios}")
+
+    engine = ScenarioEngine.from_star()
+    cube = engine.score(scenarios, year=args.year)
+    path = cube.save(args.out)
+    print(f"[SCENARIOS] Cube {len(cube.scenarios)} × {len(cube.lad_id)} LADs ({cube.year}) → {path}")
+
+    report = {
+        "timestamp_utc": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "year": cube.year,
+        "scenarios": cube.summary(),
+        "cube": str(path),
+    }
+    DIAG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with DIAG_FILE.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for row in report["scenarios"]:
+        print(
+            f"[SCENARIOS] {row['scenario']:<40} mean Δjti {row['mean_jti_delta']:+.4f}  "
+            f"{row['lads_rank_changed']} LADs changed rank"
+        )
+    print(f"[SCENARIOS] Report written to {DIAG_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,253 @@
+"""
+JTIS – command line
+Single entry point for the pipeline:
+
+    jtap scout [--fast]                  jtap compose
+    jtap fetch [...]                     jtap check
+    jtap ingest [desnz dft]              jtap score
+    jtap harmonise [desnz dft ons imd]   jtap snapshot
+    jtap report [NAME] [--json]          jtap run STAGE... [--downstream]
+    jtap releases [TABLE]
+
+plus diff, agents, watch, daemon, client, memcheck, scenarios, lineage,
+shards, profiles and features, which forward their arguments to the module's own CLI.
+
+This module imports only the standard library. Each subcommand imports the
+modules it needs when it runs, and nothing here touches the filesystem at
+import time, so --help, `scout --fast`, `report` and `releases` start without
+loading pandas.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import importlib
+import json
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+DIAG_DIR = ROOT / "outputs" / "diagnostics"
+CATALOGUE_FILE = ROOT / "outputs" / "store" / "catalogue.json"
+
+# Subcommands that hand their remaining arguments to an existing module CLI
+FORWARDED: Dict[str, tuple] = {
+    "scout": ("src.agents.scout_agent", "Pre-ingestion diagnostics (--fast: headers only)"),
+    "fetch": ("src.ingestion.fetch", "Refresh raw datasets into the local mirror"),
+    "diff": ("src.analysis.release_diff", "Diff two scored releases"),
+    "agents": ("src.agents.runtime", "Run the message-passing agent pipeline"),
+    "watch": ("src.pipeline.watch", "Re-run affected stages when inputs change"),
+    "daemon": ("src.pipeline.daemon", "Start the warm pipeline daemon"),
+    "client": ("src.pipeline.client", "Send a request to the pipeline daemon"),
+    "memcheck": ("src.pipeline.memcheck", "Peak-memory regression check on synthetic data"),
+    "scenarios": ("src.analysis.scenarios", "Score what-if scenarios into a scenario × LAD cube"),
+    "lineage": ("src.lineage", "Trace an LA–year of the base table back to its raw rows"),
+    "shards": ("src.pipeline.shards", "Harmonise and score as parallel region shards"),
+    "profiles": ("src.analysis.profiles", "Build the report bundle and render HTML region and LAD pages"),
+    "features": ("src.storage.feature_store", "Materialise or query LA–year features by release"),
+}
+
+INGEST_MODULES = {
+    "desnz": "src.ingestion.desnz_ingest",
+    "dft": "src.ingestion.dft_ingest",
+}
+
+HARMONISE_MODULES = {
+    "desnz": "src.harmonisation.desnz_canonical",
+    "dft": "src.harmonisation.dft_canonical",
+    "ons": "src.harmonisation.ons_canonical",
+    "imd": "src.harmonisation.imd_canonical",
+}
+
+
+def _call(module: str, func: str = "main", *args: Any) -> int:
+    result = getattr(importlib.import_module(module), func)(*args)
+    return result if isinstance(result, int) else 0
+
+
+def _run_each(modules: Dict[str, str], names: List[str]) -> int:
+    for name in names or list(modules):
+        code = _call(modules[name])
+        if code:
+            return code
+    return 0
+
+
+# -------------------------------------------------------
+# Pipeline commands
+# -------------------------------------------------------
+
+def cmd_ingest(args: argparse.Namespace) -> int:
+    return _run_each(INGEST_MODULES, args.datasets)
+
+
+def cmd_harmonise(args: argparse.Namespace) -> int:
+    return _run_each(HARMONISE_MODULES, args.datasets)
+
+
+def cmd_compose(args: argparse.Namespace) -> int:
+    return _call("src.agents.composer_agent")
+
+
+def cmd_check(args: argparse.Namespace) -> int:
+    return _call("src.scoring.anomalies")
+
+
+def cmd_score(args: argparse.Namespace) -> int:
+    return _call("src.scoring.jti_scoring")
+
+
+def cmd_snapshot(args: argparse.Namespace) -> int:
+    return _call("src.analysis.jtis_snapshot_2023")
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    from src.pipeline.stages import downstream, run_stages
+
+    names = downstream(args.stages) if args.downstream else args.stages
+    results = run_stages(names)
+    for r in results:
+        status = "ok" if r.ok else f"FAILED {r.error}"
+        print(f"[JTAP] {r.name:<16} {r.seconds:6.2f}s  {status}")
+    return 0 if all(r.ok for r in results) else 1
+
+
+# -------------------------------------------------------
+# Report viewing (standard library only)
+# -------------------------------------------------------
+
+def _scalar(v: Any) -> bool:
+    return v is None or isinstance(v, (str, int, float, bool))
+
+
+def _fmt(v: Any) -> str:
+    if isinstance(v, float):
+        return f"{v:.4g}"
+    if isinstance(v, list):
+        return f"[{len(v)} items]"
+    if isinstance(v, dict):
+        return "{" + ", ".join(f"{k}={_fmt(x)}" for k, x in v.items() if _scalar(x)) + "}"
+    return str(v)
+
+
+def print_summary(doc: Dict[str, Any], limit: int = 25) -> None:
+    for key, value in doc.items():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            print(f"{key}: {len(value)}")
+            for item in value[:limit]:
+                print("  " + "  ".join(f"{k}={_fmt(v)}" for k, v in item.items() if _scalar(v)))
+            if len(value) > limit:
+                print(f"  … {len(value) - limit} more")
+        elif isinstance(value, dict) and not all(_scalar(v) for v in value.values()):
+            print(f"{key}:")
+            for k, v in value.items():
+                print(f"  {k}: {_fmt(v)}")
+        else:
+            print(f"{key}: {_fmt(value)}")
+
+
+def cmd_report(args: argparse.Namespace) -> int:
+    reports = {p.stem[: -len("_report")]: p for p in sorted(DIAG_DIR.glob("*_report.json"))}
+    if not args.name:
+        if not reports:
+            print(f"[JTAP] No reports in {DIAG_DIR}")
+        for name, path in reports.items():
+            st = path.stat()
+            when = dt.datetime.fromtimestamp(st.st_mtime).isoformat(sep=" ", timespec="seconds")
+            print(f"{name:<16} {when}  {st.st_size:>9,d} B  {path.relative_to(ROOT)}")
+        return 0
+    if args.name not in reports:
+        print(f"[JTAP] No report {args.name!r}; available: {', '.join(reports) or 'none'}", file=sys.stderr)
+        return 1
+    with reports[args.name].open("r", encoding="utf-8") as f:
+        doc = json.load(f)
+    if args.json:
+        print(json.dumps(doc, indent=2))
+    else:
+        print_summary(doc)
+    return 0
+
+
+def cmd_releases(args: argparse.Namespace) -> int:
+    if not CATALOGUE_FILE.exists():
+        print(f"[JTAP] No results store catalogue at {CATALOGUE_FILE}")
+        return 0
+    with CATALOGUE_FILE.open("r", encoding="utf-8") as f:
+        tables = json.load(f).get("tables", {})
+    for table, entry in sorted(tables.items()):
+        if args.table and table != args.table:
+            continue
+        rels = entry.get("releases", {})
+        print(f"{table}: {len(rels)} release(s)")
+        for name, rel in sorted(rels.items(), key=lambda kv: (kv[1]["created_utc"], kv[0])):
+            parts = rel.get("partitions", {})
+            span = f"{min(parts)}–{max(parts)}" if parts else "-"
+            print(f"  {name:<24} {rel['created_utc']}  rows={rel['rows']:<6} {rel['partition_col']}={span}")
+    return 0
+
+
+# -------------------------------------------------------
+# Entrypoint
+# -------------------------------------------------------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="jtap", description="Just Transition Agentic Pipeline.")
+    sub = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    for name, (_, help_text) in FORWARDED.items():
+        # add_help=False so `jtap NAME --help` reaches the module's own parser
+        sub.add_parser(name, help=help_text, add_help=False)
+
+    p = sub.add_parser("ingest", help="Phase 1 ingestion of raw datasets")
+    p.add_argument("datasets", nargs="*", choices=list(INGEST_MODULES), metavar="DATASET",
+                   help=f"Any of: {', '.join(INGEST_MODULES)} (default: all)")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("harmonise", help="Phase 2 canonical LA–year tables")
+    p.add_argument("datasets", nargs="*", choices=list(HARMONISE_MODULES), metavar="DATASET",
+                   help=f"Any of: {', '.join(HARMONISE_MODULES)} (default: all)")
+    p.set_defaults(func=cmd_harmonise)
+
+    sub.add_parser("compose", help="Join canonical tables into the base table").set_defaults(func=cmd_compose)
+    sub.add_parser("check", help="Screen the base table for anomalies").set_defaults(func=cmd_check)
+    sub.add_parser("score", help="Compute JTI scores").set_defaults(func=cmd_score)
+    sub.add_parser("snapshot", help="Write the ranked 2023 snapshot").set_defaults(func=cmd_snapshot)
+
+    p = sub.add_parser("run", help="Run stages from the stage graph in one process")
+    p.add_argument("stages", nargs="+")
+    p.add_argument("--downstream", action="store_true", help="Also run dependent stages")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("report", help="List or show diagnostics reports")
+    p.add_argument("name", nargs="?", help="Report name, e.g. scout, scoring, fetch")
+    p.add_argument("--json", action="store_true", help="Print the raw JSON")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("releases", help="List releases in the results store")
+    p.add_argument("table", nargs="?")
+    p.set_defaults(func=cmd_releases)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+
+    if args.command in FORWARDED:
+        module = importlib.import_module(FORWARDED[args.command][0])
+        result = module.main(argv[argv.index(args.command) + 1:])
+        return result if isinstance(result, int) else 0
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    func: Callable[[argparse.Namespace], int] = args.func
+    return func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
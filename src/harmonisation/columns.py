@@ -0,0 +1,238 @@
+"""
+JTIS – column resolver
+Maps the logical columns of a source (lad_code, year, total_fuel, ...) to the
+columns of the header actually on disk.
+
+- Rules are compiled from config/validation_schemas/<dataset>.yaml:
+  required_columns and optional_columns entries, each with `any_of` aliases
+  (in order of preference) and optional `contains` keywords. Every dataset
+  also gets the generic lad_code and year rules the scout uses as guesses,
+  unless its schema defines them
+- Headers are compared normalised (case-folded, whitespace collapsed), in
+  tiers; a rule is settled by the first tier that matches anything:
+    exact      the column equals an alias (the first alias that matches wins)
+    annotated  the column is an alias followed by a bracketed note,
+               e.g. "Local Authority [Note 4]"
+    contains   the column contains a keyword
+  All rules take their exact matches before any rule falls back to the
+  looser tiers, and a column goes to one rule only, so "Local Authority"
+  cannot take "Local Authority Code" from lad_code
+- Several candidates in the settling tier make the rule ambiguous: it is
+  reported with its candidates and never resolved by guessing
+- A resolution is cached per header (the exact column tuple), so a known
+  sheet layout resolves by one dictionary lookup
+
+Imports only the standard library (the fast scout uses it). YAML files are
+read through load_yaml, which keeps each parsed file in a JSON cache keyed by
+its mtime and size (.jtap/yaml_cache.json), so yaml is imported only when a
+schema or the registry changed since it was last parsed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+SCHEMAS_DIR = ROOT / "config" / "validation_schemas"
+YAML_CACHE = ROOT / ".jtap" / "yaml_cache.json"
+
+TIERS = ("exact", "annotated", "contains")
+
+# A bracketed note after an alias: "Local Authority [Note 4]", "Rank (2019)"
+ANNOTATION_RE = re.compile(r"^\s*[\[(]")
+
+# Generic rules, used where a schema does not define these names
+GUESS_RULES: Dict[str, Dict[str, Any]] = {
+    "lad_code": {
+        "any_of": ["lad_code", "Local Authority Code", "LAD Code", "LAD19CD", "la code"],
+        "contains": ["lad", "local authority", "la code"],
+    },
+    "year": {"any_of": ["year", "Calendar Year"], "contains": ["year"]},
+}
+
+
+class AmbiguousColumnError(ValueError):
+    pass
+
+
+def normalise(name: Any) -> str:
+    return " ".join(str(name).split()).casefold()
+
+
+# -------------------------------------------------------
+# YAML
+# -------------------------------------------------------
+
+_YAML_CACHE: Optional[Dict[str, Any]] = None
+
+
+def load_yaml(path: Path) -> Any:
+    """yaml.safe_load of `path`, served from the JSON cache while the file's
+    mtime and size are unchanged. Documents JSON cannot hold exactly (non-str
+    keys, dates) are parsed every time."""
+    global _YAML_CACHE
+    path = Path(path).resolve()
+    st = path.stat()
+    stamp = [st.st_mtime_ns, st.st_size]
+    if _YAML_CACHE is None:
+        try:
+            _YAML_CACHE = json.loads(YAML_CACHE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _YAML_CACHE = {}
+    hit = _YAML_CACHE.get(str(path))
+    if hit is not None and hit["stamp"] == stamp:
+        return hit["doc"]
+
+    import yaml
+
+    with path.open("r", encoding="utf-8") as f:
+        doc = yaml.safe_load(f)
+    try:
+        exact = json.loads(json.dumps(doc)) == doc
+    except (TypeError, ValueError):
+        exact = False
+    if exact:
+        _YAML_CACHE[str(path)] = {"stamp": stamp, "doc": doc}
+        try:
+            YAML_CACHE.parent.mkdir(parents=True, exist_ok=True)
+            tmp = YAML_CACHE.with_name(f"{YAML_CACHE.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(_YAML_CACHE), encoding="utf-8")
+            os.replace(tmp, YAML_CACHE)
+        except OSError:
+            pass  # read-only checkout: parse again next time
+    return doc
+
+
+# -------------------------------------------------------
+# Rules
+# -------------------------------------------------------
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    any_of: Tuple[str, ...] = ()
+    contains: Tuple[str, ...] = ()
+    required: bool = True
+
+    @classmethod
+    def from_dict(cls, name: str, d: Dict[str, Any], required: bool) -> "Rule":
+        return cls(name, tuple(str(a) for a in d.get("any_of") or ()),
+                   tuple(str(k) for k in d.get("contains") or ()), required)
+
+    def candidates(self, tier: str, norm: Sequence[str], claimed: set) -> List[int]:
+        """Indices of the columns not yet `claimed` this rule matches in `tier`."""
+        free = [i for i in range(len(norm)) if i not in claimed]
+        if tier == "contains":
+            keys = [normalise(k) for k in self.contains]
+            return [i for i in free if any(k in norm[i] for k in keys)]
+        for alias in map(normalise, self.any_of):
+            if tier == "exact":
+                hits = [i for i in free if norm[i] == alias]
+            else:
+                hits = [i for i in free if norm[i].startswith(alias) and ANNOTATION_RE.match(norm[i][len(alias):])]
+            if hits:
+                return hits
+        return []
+
+
+@dataclass
+class Resolution:
+    dataset: str
+    mapping: Dict[str, str] = field(default_factory=dict)  # logical name -> column
+    tier: Dict[str, str] = field(default_factory=dict)  # logical name -> tier it matched in
+    ambiguous: Dict[str, List[str]] = field(default_factory=dict)  # logical name -> candidates
+    missing: List[str] = field(default_factory=list)  # required rules without a match
+
+    def column(self, name: str) -> str:
+        if name in self.mapping:
+            return self.mapping[name]
+        if name in self.ambiguous:
+            raise AmbiguousColumnError(
+                f"[COLUMNS] {self.dataset}: '{name}' is ambiguous between {self.ambiguous[name]}"
+            )
+        raise ValueError(f"[COLUMNS] {self.dataset}: missing required column '{name}'")
+
+    def get(self, name: str) -> Optional[str]:
+        return self.mapping.get(name)
+
+    def renames(self, names: Optional[Sequence[str]] = None) -> Dict[str, str]:
+        """{column: logical name} for `names` (default: all resolved), raising
+        for any of them that is missing or ambiguous."""
+        return {self.column(n): n for n in (names if names is not None else self.mapping)}
+
+    def problems(self, rules: Dict[str, Rule]) -> List[str]:
+        return (
+            [f"{n}: {list(rules[n].any_of or rules[n].contains)}" for n in self.missing]
+            + [f"{n}: ambiguous {cands}" for n, cands in self.ambiguous.items() if rules[n].required]
+        )
+
+
+# -------------------------------------------------------
+# Resolver
+# -------------------------------------------------------
+
+class ColumnResolver:
+    def __init__(self, dataset: str, rules: Sequence[Rule]) -> None:
+        self.dataset = dataset
+        self.rules: Dict[str, Rule] = {r.name: r for r in rules}
+        self._cache: Dict[Tuple[str, ...], Resolution] = {}
+
+    @classmethod
+    def from_schema(cls, dataset: str, schema: Optional[Dict[str, Any]]) -> "ColumnResolver":
+        schema = schema or {}
+        rules = [Rule.from_dict(n, d or {}, True) for n, d in (schema.get("required_columns") or {}).items()]
+        rules += [Rule.from_dict(n, d or {}, False) for n, d in (schema.get("optional_columns") or {}).items()]
+        names = {r.name for r in rules}
+        rules += [Rule.from_dict(n, d, False) for n, d in GUESS_RULES.items() if n not in names]
+        return cls(dataset, rules)
+
+    def resolve(self, columns: Sequence[Any]) -> Resolution:
+        header = tuple(str(c) for c in columns)
+        cached = self._cache.get(header)
+        if cached is None:
+            cached = self._cache[header] = self._resolve(header)
+        return cached
+
+    def _resolve(self, header: Tuple[str, ...]) -> Resolution:
+        norm = [normalise(c) for c in header]
+        out = Resolution(self.dataset)
+        claimed: set = set()
+        pending = list(self.rules.values())
+        for tier in TIERS:
+            unsettled = []
+            for rule in pending:
+                hits = rule.candidates(tier, norm, claimed)
+                if len(hits) == 1:
+                    out.mapping[rule.name], out.tier[rule.name] = header[hits[0]], tier
+                    claimed.add(hits[0])
+                elif hits:
+                    out.ambiguous[rule.name] = [header[i] for i in hits]
+                else:
+                    unsettled.append(rule)
+            pending = unsettled
+        out.missing = [r.name for r in pending if r.required]
+        return out
+
+
+_COMPILED: Dict[Path, Tuple[Optional[int], ColumnResolver]] = {}
+
+
+def resolver(dataset: str, schemas_dir: Path = SCHEMAS_DIR) -> ColumnResolver:
+    """The compiled resolver of a dataset's schema (generic rules only if it
+    has none), recompiled only when the schema file changes."""
+    path = Path(schemas_dir) / f"{dataset}.yaml"
+    mtime = path.stat().st_mtime_ns if path.exists() else None
+    cached = _COMPILED.get(path)
+    if cached is None or cached[0] != mtime:
+        schema = (load_yaml(path) or {}) if mtime is not None else None
+        cached = _COMPILED[path] = (mtime, ColumnResolver.from_schema(dataset, schema))
+    return cached[1]
+
+
+def resolve(dataset: str, columns: Sequence[Any]) -> Resolution:
+    return resolver(dataset).resolve(columns)
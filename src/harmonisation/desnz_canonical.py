@@ -8,12 +8,20 @@ import pandas as pd
 ROOT = Path(__file__).resolve().parents[2]
 PROCESSED_DIR = ROOT / "data" / "processed"
 CANONICAL_DIR = PROCESSED_DIR / "canonical"
-CANONICAL_DIR.mkdir(parents=True, exist_ok=True)
 
 
 RAW_PROCESSED_FILE = PROCESSED_DIR / "desnz_ghg_emissions_processed.csv"
 CANONICAL_OUT_FILE = CANONICAL_DIR / "desnz_la_year.csv"
 
+# Sector/gas rows → one LA–year row. Population and area repeat across the
+# sector/gas rows, so the first occurrence stands for the group
+AGGREGATION = {
+    "Emissions within the scope of influence of LAs (kt CO2)": "sum",
+    "Territorial emissions (kt CO2e)": "sum",
+    "Mid-year Population (thousands)": "first",
+    "Area (km2)": "first",
+}
+
 
 def load_desnz_processed() -> pd.DataFrame:
     """
@@ -84,17 +92,7 @@ def build_la_year_canonical(df: pd.DataFrame) -> pd.DataFrame:
         "Calendar Year",
     ]
 
-    agg_df = (
-        df.groupby(group_keys, as_index=False)
-        .agg(
-            {
-                "Emissions within the scope of influence of LAs (kt CO2)": "sum",
-                "Territorial emissions (kt CO2e)": "sum",
-                "Mid-year Population (thousands)": "first",
-                "Area (km2)": "first",
-            }
-        )
-    )
+    agg_df = df.groupby(group_keys, as_index=False).agg(AGGREGATION)
 
     # Rename to a canonical JTIS-friendly schema
     agg_df = agg_df.rename(
@@ -143,15 +141,41 @@ def build_la_year_canonical(df: pd.DataFrame) -> pd.DataFrame:
 
 def write_canonical_table(df: pd.DataFrame) -> None:
     print(f"[DESNZ_CANONICAL] Writing canonical LA–year table to: {CANONICAL_OUT_FILE}")
+    CANONICAL_DIR.mkdir(parents=True, exist_ok=True)
     df.to_csv(CANONICAL_OUT_FILE, index=False)
     print("[DESNZ_CANONICAL] Write complete.")
 
 
+def record_lineage(df: pd.DataFrame, canonical: pd.DataFrame) -> None:
+    """Map each canonical row to the processed (= raw CSV) sector/gas rows
+    aggregated into it."""
+    from src import lineage
+
+    lineage.Record(
+        "desnz_canonical",
+        {
+            "upstream": "desnz_ingest",
+            "input": lineage.fingerprint(RAW_PROCESSED_FILE),
+            "output": lineage.fingerprint(CANONICAL_OUT_FILE),
+            "aggregation": {"group_by": ["Local Authority Code", "Calendar Year"], **AGGREGATION},
+            "columns": list(AGGREGATION),
+        },
+        keys={"lad_code": canonical["lad_code"], "year": canonical["year"]},
+        maps={
+            "input": lineage.RowMap.from_keys(
+                [df["Local Authority Code"], df["Calendar Year"]],
+                [canonical["lad_code"], canonical["year"]],
+            )
+        },
+    ).save()
+
+
 def main() -> int:
     print("[DESNZ_CANONICAL] Phase 2 harmonisation (DESNZ LA–year) starting...")
     df = load_desnz_processed()
     canonical_df = build_la_year_canonical(df)
     write_canonical_table(canonical_df)
+    record_lineage(df, canonical_df)
     print("[DESNZ_CANONICAL] Phase 2 harmonisation (DESNZ LA–year) finished successfully.")
     return 0
 
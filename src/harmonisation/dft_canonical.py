@@ -1,16 +1,24 @@
 from __future__ import annotations
 
 from pathlib import Path
+import re
 import pandas as pd
 
 
 ROOT = Path(__file__).resolve().parents[2]
 PROCESSED_DIR = ROOT / "data" / "processed"
 CANONICAL_DIR = PROCESSED_DIR / "canonical"
-CANONICAL_DIR.mkdir(parents=True, exist_ok=True)
 
 RAW_PROCESSED_FILE = PROCESSED_DIR / "dft_fuel_consumption_processed.csv"
 CANONICAL_OUT_FILE = CANONICAL_DIR / "dft_la_year.csv"
+VEHICLE_OUT_FILE = CANONICAL_DIR / "dft_vehicle_la_year.csv"
+
+# Column rules: config/validation_schemas/<DATASET>.yaml
+DATASET = "dft_fuel_consumption"
+MEASURES = ["total_fuel_ktoe", "personal_transport_ktoe", "freight_transport_ktoe", "bioenergy_ktoe"]
+
+# Per vehicle × road-type breakdown columns, e.g. "Diesel cars - \nA roads"
+VEHICLE_ROAD_RE = re.compile(r"^(?P<vehicle>.+?)\s*-\s*(?P<road>Motorways|A roads|Minor roads)$")
 
 
 def load_dft_processed() -> pd.DataFrame:
@@ -29,18 +37,22 @@ def load_dft_processed() -> pd.DataFrame:
     return df
 
 
-def find_column(df: pd.DataFrame, keyword: str) -> str:
+def resolve_columns(df: pd.DataFrame):
     """
-    Find a column containing the keyword, case-insensitive.
-    Raise an error if none or multiple are found.
+    Resolve the logical DfT columns (lad_code, lad_name, year and MEASURES)
+    against the table's header with the schema's column rules.
     """
-    matches = [c for c in df.columns if keyword.lower() in c.lower()]
-    if len(matches) == 0:
-        raise ValueError(f"[DFT_CANONICAL] Missing required column with keyword: '{keyword}'")
-    if len(matches) > 1:
-        # Choose the most specific, longest match
-        matches = sorted(matches, key=len, reverse=True)
-    return matches[0]
+    from src.harmonisation.columns import resolve
+
+    return resolve(DATASET, df.columns)
+
+
+def find_column(df: pd.DataFrame, name: str) -> str:
+    """
+    The column holding logical column `name`.
+    Raise an error if it is missing or ambiguous.
+    """
+    return resolve_columns(df).column(name)
 
 
 def build_la_year_canonical(df: pd.DataFrame) -> pd.DataFrame:
@@ -50,37 +62,15 @@ def build_la_year_canonical(df: pd.DataFrame) -> pd.DataFrame:
     """
     print("[DFT_CANONICAL] Building LA–year canonical table...")
 
-    # --- Robust lookup of required columns ---
-    lad_code_col = find_column(df, "Local Authority Code")
-    lad_name_col = find_column(df, "Local Authority")
-    year_col = find_column(df, "__source_sheet__")
-
-    # Fuel-related required fields (fuzzy matching)
-    total_fuel_col = find_column(df, "Fuel consumption by all vehicles")
-    personal_col = find_column(df, "Personal transport")
-    freight_col = find_column(df, "Freight transport")
-    bioenergy_col = find_column(df, "bioenergy")
+    # --- Resolve required columns (schema column rules) ---
+    resolution = resolve_columns(df)
+    renames = resolution.renames(["lad_code", "lad_name", "year"] + MEASURES)
 
     print("[DFT_CANONICAL] Resolved columns:")
-    print("  lad_code_col:", lad_code_col)
-    print("  lad_name_col:", lad_name_col)
-    print("  year_col:", year_col)
-    print("  total_fuel_col:", total_fuel_col)
-    print("  personal_col:", personal_col)
-    print("  freight_col:", freight_col)
-    print("  bioenergy_col:", bioenergy_col)
-
-    df = df.rename(
-        columns={
-            lad_code_col: "lad_code",
-            lad_name_col: "lad_name",
-            year_col: "year",
-            total_fuel_col: "total_fuel_ktoe",
-            personal_col: "personal_transport_ktoe",
-            freight_col: "freight_transport_ktoe",
-            bioenergy_col: "bioenergy_ktoe",
-        }
-    )
+    for col, name in renames.items():
+        print(f"  {name}: {col!r} ({resolution.tier[name]})")
+
+    df = df.rename(columns=renames)
 
     df["year"] = df["year"].astype(int)
 
@@ -94,9 +84,9 @@ def build_la_year_canonical(df: pd.DataFrame) -> pd.DataFrame:
         "bioenergy_ktoe",
     ]
 
-    other_cols = [c for c in df.columns if c not in canonical_cols]
-
-    out_df = df[canonical_cols + other_cols]
+    # The vehicle × road breakdown goes to its own long table
+    # (build_vehicle_canonical); the LA–year table keeps only these measures
+    out_df = df[canonical_cols]
     out_df = out_df.sort_values(["lad_code", "year"]).reset_index(drop=True)
 
     print(
@@ -106,17 +96,86 @@ def build_la_year_canonical(df: pd.DataFrame) -> pd.DataFrame:
     return out_df
 
 
-def write_canonical_table(df: pd.DataFrame) -> None:
+def build_vehicle_canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Long LA–year–vehicle–road table of fuel consumption (ktoe) from the
+    "<vehicle> - <road>" breakdown columns. Per-vehicle totals are left out;
+    they are the sum over road types.
+    """
+    lad_code_col = find_column(df, "lad_code")
+    year_col = find_column(df, "year")
+
+    parts = {}
+    for col in df.columns:
+        m = VEHICLE_ROAD_RE.match(" ".join(str(col).split()))
+        if m:
+            parts[col] = (m.group("vehicle"), m.group("road"))
+    if not parts:
+        print("[DFT_CANONICAL] No vehicle × road columns found.")
+        return pd.DataFrame(columns=["lad_code", "year", "vehicle", "road", "fuel_ktoe"])
+
+    long = df[[lad_code_col, year_col] + list(parts)].melt(
+        id_vars=[lad_code_col, year_col], var_name="column", value_name="fuel_ktoe"
+    )
+    vehicle = {c: v for c, (v, _) in parts.items()}
+    road = {c: r for c, (_, r) in parts.items()}
+    out_df = pd.DataFrame({
+        "lad_code": long[lad_code_col],
+        "year": long[year_col].astype(int),
+        "vehicle": long["column"].map(vehicle),
+        "road": long["column"].map(road),
+        "fuel_ktoe": pd.to_numeric(long["fuel_ktoe"], errors="coerce"),
+    })
+    out_df = out_df.sort_values(["lad_code", "year", "vehicle", "road"]).reset_index(drop=True)
+
+    print(
+        f"[DFT_CANONICAL] Vehicle × road table built: {out_df.shape[0]} rows, "
+        f"{out_df['vehicle'].nunique()} vehicle types"
+    )
+    return out_df
+
+
+def write_canonical_table(df: pd.DataFrame, vehicle: pd.DataFrame | None = None) -> None:
     print(f"[DFT_CANONICAL] Writing canonical table to: {CANONICAL_OUT_FILE}")
+    CANONICAL_DIR.mkdir(parents=True, exist_ok=True)
     df.to_csv(CANONICAL_OUT_FILE, index=False)
+    if vehicle is not None:
+        print(f"[DFT_CANONICAL] Writing vehicle × road table to: {VEHICLE_OUT_FILE}")
+        vehicle.to_csv(VEHICLE_OUT_FILE, index=False)
     print("[DFT_CANONICAL] Write complete.")
 
 
+def record_lineage(df: pd.DataFrame, canonical: pd.DataFrame) -> None:
+    """Map each canonical row to the processed row it was taken from (one LA
+    row per year sheet; nothing is aggregated)."""
+    from src import lineage
+
+    columns = [find_column(df, k) for k in MEASURES]
+    lineage.Record(
+        "dft_canonical",
+        {
+            "upstream": "dft_ingest",
+            "input": lineage.fingerprint(RAW_PROCESSED_FILE),
+            "output": lineage.fingerprint(CANONICAL_OUT_FILE),
+            "aggregation": "none: one row per LA in each year sheet",
+            "columns": columns,
+        },
+        keys={"lad_code": canonical["lad_code"], "year": canonical["year"]},
+        maps={
+            "input": lineage.RowMap.from_keys(
+                [df[find_column(df, "lad_code")], df[find_column(df, "year")].astype(int)],
+                [canonical["lad_code"], canonical["year"]],
+            )
+        },
+    ).save()
+
+
 def main() -> int:
     print("[DFT_CANONICAL] Phase 2 harmonisation (DfT LA–year) starting...")
     df = load_dft_processed()
     canonical = build_la_year_canonical(df)
-    write_canonical_table(canonical)
+    write_canonical_table(canonical, build_vehicle_canonical(df))
+    record_lineage(df, canonical)
     print("[DFT_CANONICAL] Phase 2 harmonisation (DfT LA–year) finished successfully.")
     return 0
 
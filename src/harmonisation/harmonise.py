@@ -38,18 +38,18 @@ def harmonise_all(
     # --- 1. Restrict to the common year window ---
     emissions = df_emissions[
         (df_emissions["year"] >= year_min) & (df_emissions["year"] <= year_max)
-    ].copy()
+    ]
 
     fuel = df_fuel[
         (df_fuel["year"] >= year_min) & (df_fuel["year"] <= year_max)
-    ].copy()
+    ]
 
     population = df_population[
         (df_population["year"] >= year_min) & (df_population["year"] <= year_max)
-    ].copy()
+    ]
 
     # --- 2. Base table from emissions ---
-    base = emissions[["lad_code", "lad_name", "year", "total_emissions_ktco2e"]].copy()
+    base = emissions[["lad_code", "lad_name", "year", "total_emissions_ktco2e"]]
 
     # --- 3. Join population (ONS replaces DESNZ population) ---
     pop_cols = ["lad_code", "year", "population"]
@@ -1,49 +1,114 @@
 from __future__ import annotations
+import sys
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
 
-def main():
-    ROOT = Path(__file__).resolve().parents[2]
-    RAW = ROOT / "data" / "raw" / "imd_2019.xlsx"
-    OUT = ROOT / "data" / "processed" / "canonical" / "imd_la.csv"
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation import nations  # noqa: E402
+
+RAW = ROOT / "data" / "raw" / "imd_2019.xlsx"
+OUT = ROOT / "data" / "processed" / "canonical" / "imd_la.csv"
+# Small-area measures, for the LSOA / MSOA panel (src/harmonisation/small_areas.py)
+SMALL_AREA_OUT = ROOT / "data" / "processed" / "canonical" / "imd_small_area.csv"
 
-    print("[IMD_CANONICAL] Phase 2 harmonisation (IMD 2019 England LSOA → LAD) starting...")
+
+def load_imd_raw() -> pd.DataFrame:
     print(f"[IMD_CANONICAL] Loading raw IMD from: {RAW}")
 
     # Load IMD LSOA-level
-    df = pd.read_excel(RAW, sheet_name="IMD2019")
-
-    # Required columns
-    lad_code_col = "Local Authority District code (2019)"
-    lad_name_col = "Local Authority District name (2019)"
-    imd_rank_col = "Index of Multiple Deprivation (IMD) Rank"
-
-    for col in [lad_code_col, lad_name_col, imd_rank_col]:
-        if col not in df.columns:
-            raise ValueError(f"[IMD_CANONICAL] Missing IMD column: {col}")
-
-    # England-only (LSOA codes beginning with E)
-    df = df[df["LSOA code (2011)"].str.startswith("E")].copy()
-
-    # Group to LAD level (mean IMD rank across LSOAs)
-    imd = (
-        df.groupby([lad_code_col, lad_name_col])[imd_rank_col]
-        .mean()
-        .reset_index()
-        .rename(columns={
-            lad_code_col: "lad_code",
-            lad_name_col: "lad_name",
-            imd_rank_col: "imd_rank_avg"
-        })
+    return pd.read_excel(RAW, sheet_name="IMD2019")
+
+
+def build_lad_canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapse the LSOA-level IMD table to one row per LAD (mean IMD rank and
+    the harmonised measures of nations.py). England only; main() builds
+    every nation's table.
+    """
+    config = nations.load_config()
+    england = config.nation("england")
+    spec = england.sources["deprivation"]
+    imd = nations.lad_deprivation(
+        nations.select_ranks(df, spec, england), config.deprived_fraction, spec.get("index")
     )
 
     print(f"[IMD_CANONICAL] LAD-level IMD shape: {imd.shape}")
+    return imd
+
 
+def write_canonical(imd: pd.DataFrame) -> None:
     OUT.parent.mkdir(parents=True, exist_ok=True)
     imd.to_csv(OUT, index=False)
 
     print(f"[IMD_CANONICAL] Wrote canonical IMD table → {OUT}")
+
+
+def write_small_areas(ranks: dict[str, pd.DataFrame]) -> None:
+    areas = nations.small_area_deprivation(ranks)
+    SMALL_AREA_OUT.parent.mkdir(parents=True, exist_ok=True)
+    areas.to_csv(SMALL_AREA_OUT, index=False)
+
+    print(f"[IMD_CANONICAL] Wrote {len(areas)} small areas → {SMALL_AREA_OUT}")
+
+
+def record_lineage(ranks: dict[str, pd.DataFrame], imd: pd.DataFrame) -> None:
+    """Map each LAD to the raw small-area rows whose ranks it averages, one
+    row map per nation (ranks as returned by nations.deprivation; each frame's
+    `row` is the row of the nation's own deprivation file)."""
+    from src import lineage
+
+    config = nations.load_config()
+    sources, maps = {}, {}
+    for name, frame in ranks.items():
+        spec = config.nation(name).sources["deprivation"]
+        rows = frame["row"].to_numpy()
+        cols = spec["columns"]
+        sources[name] = {
+            "index": spec.get("index", name),
+            "map": f"input_{name}",
+            "source": lineage.fingerprint(ROOT / spec["path"]),
+            "sheets": [{
+                "sheet": spec.get("sheet", 0),
+                "start": 0,
+                "stop": int(rows.max(initial=-1)) + 1,
+                "skiprows": spec.get("skiprows", 0),
+            }],
+            "columns": [cols["rank"]],
+            "aggregation": {
+                "group_by": [cols.get("lad_code") or cols["lad_name"]],
+                **({"filter": f"{cols['area']} starts with {spec['area_prefix']}"} if "area_prefix" in spec else {}),
+                cols["rank"]: "mean",
+            },
+        }
+        maps[f"input_{name}"] = lineage.RowMap.from_keys(
+            [frame["lad_code"].astype(str).to_numpy()], [imd["lad_code"]], rows=rows
+        )
+    lineage.Record(
+        "imd_canonical",
+        {
+            "nations": sources,
+            "output": lineage.fingerprint(OUT),
+            "aggregation": "mean of small-area ranks per LAD, within each nation's index",
+            "columns": [],
+        },
+        keys={"lad_code": imd["lad_code"]},
+        maps=maps,
+    ).save()
+
+
+def main():
+    print("[IMD_CANONICAL] Phase 2 harmonisation (deprivation, small areas → LAD, per nation) starting...")
+
+    imd, ranks = nations.deprivation()
+    write_canonical(imd)
+    write_small_areas(ranks)
+    record_lineage(ranks, imd)
+
     print("[IMD_CANONICAL] Done.")
 
     return 0
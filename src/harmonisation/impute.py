@@ -0,0 +1,264 @@
+"""
+JTIS – gap imputation
+Fill LA–years missing from one source instead of dropping them from the
+base table.
+
+- The outer-joined facts are laid out on a dense (LAD × year) grid, one
+  (L, Y) array per measure, and every method fills all LADs at once from the
+  nearest reported years on either side (running max/min of reported-year
+  indices along the year axis)
+- Methods (config/imputation.yaml), tried in order per measure: interpolate,
+  carry, population_ratio; every method works from the reported values only
+  (never from cells an earlier step imputed), so nothing is filled further
+  than max_gap years from a reported value
+- A grid cell becomes a base row when at least min_sources annual sources
+  (default: all of them, which keeps the year window of the inner join)
+  report it and the measures of the others could all be filled; imputed
+  cells are listed with their method in jtis_imputed_cells.csv and counted
+  in the base table's `imputed` column
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.harmonisation import star
+from src.harmonisation.lad_codes import STATIC_MEASURES, LadDictionary
+
+ROOT = Path(__file__).resolve().parents[2]
+CONFIG_FILE = ROOT / "config" / "imputation.yaml"
+
+# Method codes of the flag arrays (0 = reported)
+METHODS = ("interpolate", "carry", "population_ratio")
+REPORTED = 0
+
+
+@dataclass(frozen=True)
+class Step:
+    method: str
+    reference: str = "population"
+
+
+@dataclass(frozen=True)
+class ImputationConfig:
+    min_sources: Optional[int] = None  # None: every annual source
+    max_gap: int = 3
+    measures: Mapping[str, Tuple[Step, ...]] = field(default_factory=dict)
+
+    @classmethod
+    def from_yaml(cls, path: Path = CONFIG_FILE) -> "ImputationConfig":
+        with Path(path).open("r", encoding="utf-8") as f:
+            doc = yaml.safe_load(f) or {}
+        measures = {}
+        for name, steps in (doc.get("measures") or {}).items():
+            parsed = []
+            for step in steps:
+                step = Step(**step) if isinstance(step, Mapping) else Step(step)
+                if step.method not in METHODS:
+                    raise ValueError(f"[IMPUTE] {name}: unknown method {step.method!r}; expected one of {METHODS}")
+                parsed.append(step)
+            measures[name] = tuple(parsed)
+        min_sources = doc.get("min_sources", "all")
+        min_sources = None if min_sources in (None, "all") else int(min_sources)
+        return cls(min_sources, int(doc.get("max_gap", 3)), measures)
+
+    @property
+    def references(self) -> List[str]:
+        return list(dict.fromkeys(
+            s.reference for steps in self.measures.values() for s in steps if s.method == "population_ratio"
+        ))
+
+    def order(self) -> List[str]:
+        """Measures with the references they scale by filled first."""
+        order: List[str] = []
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if name in order or name not in self.measures:
+                return
+            if name in path:
+                raise ValueError(f"[IMPUTE] Reference cycle: {' → '.join(path + (name,))}")
+            for s in self.measures[name]:
+                if s.method == "population_ratio":
+                    visit(s.reference, path + (name,))
+            order.append(name)
+
+        for name in self.measures:
+            visit(name, ())
+        return order
+
+
+# -------------------------------------------------------
+# Methods on (L, Y) grids
+# -------------------------------------------------------
+
+def _neighbours(valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Year index of the nearest valid cell at or before / at or after each
+    cell of its row; -1 / Y where there is none."""
+    n_years = valid.shape[-1]
+    idx = np.broadcast_to(np.arange(n_years), valid.shape)
+    before = np.maximum.accumulate(np.where(valid, idx, -1), axis=-1)
+    after = np.flip(np.minimum.accumulate(np.flip(np.where(valid, idx, n_years), -1), axis=-1), -1)
+    return before, after
+
+
+def _at(v: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    return np.take_along_axis(v, np.clip(idx, 0, v.shape[-1] - 1), axis=-1)
+
+
+def interpolate(v: np.ndarray, max_gap: int) -> np.ndarray:
+    """Linear in year across gaps of at most `max_gap` years."""
+    before, after = _neighbours(~np.isnan(v))
+    ok = (before >= 0) & (after < v.shape[-1]) & (after - before - 1 <= max_gap)
+    y = np.arange(v.shape[-1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(after > before, (y - before) / (after - before), 0.0)
+        filled = _at(v, before) + w * (_at(v, after) - _at(v, before))
+    return np.where(np.isnan(v) & ok, filled, v)
+
+
+def carry(v: np.ndarray, max_gap: int) -> np.ndarray:
+    """The nearest earlier value within `max_gap` years, else the nearest later one."""
+    before, after = _neighbours(~np.isnan(v))
+    y = np.arange(v.shape[-1])
+    fwd = (before >= 0) & (y - before <= max_gap)
+    bwd = (after < v.shape[-1]) & (after - y <= max_gap)
+    filled = np.where(fwd, _at(v, before), np.where(bwd, _at(v, after), np.nan))
+    return np.where(np.isnan(v), filled, v)
+
+
+def population_ratio(v: np.ndarray, reference: np.ndarray, max_gap: int) -> np.ndarray:
+    """v per unit of `reference`, interpolated then carried, times the reference."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = v / np.where(reference > 0, reference, np.nan)
+    ratio = carry(interpolate(ratio, max_gap), max_gap)
+    return np.where(np.isnan(v), ratio * reference, v)
+
+
+# -------------------------------------------------------
+# Grid
+# -------------------------------------------------------
+
+def fill(
+    df: pd.DataFrame,
+    config: Optional[ImputationConfig] = None,
+    lad: Optional[LadDictionary] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """Impute an outer-gathered LA–year frame (see star.gather) on the dense
+    grid. Returns the base rows, the imputed cells and a summary."""
+    config = config or ImputationConfig.from_yaml()
+    lad = lad if lad is not None else LadDictionary.load()
+    annual = [m for m in df.columns if m in star.MEASURE_FACT and star.FACTS[star.MEASURE_FACT[m]].annual]
+    per_lad = [m for m in df.columns if m in star.MEASURE_FACT and m not in annual]
+    static = [m for m in df.columns if m in STATIC_MEASURES]
+
+    lads, li = np.unique(df["lad_id"].to_numpy(dtype=np.int64), return_inverse=True)
+    years = df["year"].to_numpy(dtype=np.int64)
+    y0 = int(years.min()) if len(years) else 0
+    n_years = int(years.max()) - y0 + 1 if len(years) else 0
+    yi = years - y0
+
+    grid: Dict[str, np.ndarray] = {}
+    for m in annual:
+        g = np.full((len(lads), n_years), np.nan)
+        g[li, yi] = pd.to_numeric(df[m], errors="coerce").to_numpy(dtype=float)
+        grid[m] = g
+
+    # A source reports a cell when any of its measures there is a number
+    sources: Dict[str, List[str]] = {}
+    for m in annual:
+        sources.setdefault(star.MEASURE_FACT[m], []).append(m)
+    reported = {s: np.any([~np.isnan(grid[m]) for m in ms], axis=0) for s, ms in sources.items()}
+
+    # Each step fills from the reported values of its measure, so a later
+    # step cannot extend an earlier step's imputations another max_gap years
+    method = {m: np.zeros(grid[m].shape, dtype=np.int8) for m in annual}
+    for m in config.order():
+        if m not in grid:
+            continue
+        observed = grid[m].copy()
+        for step in config.measures[m]:
+            before = np.isnan(grid[m])
+            if not before.any():
+                break
+            if step.method == "population_ratio":
+                if step.reference not in grid:
+                    raise KeyError(f"[IMPUTE] {m}: reference {step.reference!r} is not in the frame")
+                filled = population_ratio(observed, grid[step.reference], config.max_gap)
+            else:
+                filled = {"interpolate": interpolate, "carry": carry}[step.method](observed, config.max_gap)
+            grid[m] = np.where(before, filled, grid[m])
+            method[m][before & ~np.isnan(grid[m])] = METHODS.index(step.method) + 1
+
+    n_sources = np.sum(list(reported.values()), axis=0) if reported else np.zeros((len(lads), n_years))
+    keep = n_sources >= (config.min_sources if config.min_sources is not None else len(reported))
+    for s, ms in sources.items():
+        filled = np.all([~np.isnan(grid[m]) for m in ms], axis=0)
+        keep &= reported[s] | filled
+    l_idx, y_idx = np.nonzero(keep)
+
+    ids = lads[l_idx]
+    out = pd.DataFrame({
+        "lad_id": ids.astype(np.int32),
+        "lad_code": pd.Categorical.from_codes(ids, dtype=lad.dtype),
+        "year": (y_idx + y0).astype(int),
+        **{m: grid[m][l_idx, y_idx] for m in annual},
+    })
+    if per_lad:
+        by_lad = df.groupby("lad_id")[per_lad].first()
+        out = out.join(by_lad, on="lad_id")
+    if static:
+        out = lad.decorate(out, static)
+    codes = np.stack([method[m][l_idx, y_idx] for m in annual]) if annual else np.zeros((0, len(out)))
+    out["imputed"] = (codes > REPORTED).sum(axis=0).astype(np.int8)
+    out = out[[c for c in df.columns if c in out.columns] + ["imputed"]]
+
+    k, rows = np.nonzero(codes)
+    cells = pd.DataFrame({
+        "lad_code": out["lad_code"].to_numpy()[rows],
+        "year": out["year"].to_numpy()[rows],
+        "measure": np.asarray(annual, dtype=object)[k],
+        "method": np.asarray(METHODS, dtype=object)[codes[k, rows] - 1],
+    })
+
+    all_sources = np.all(list(reported.values()), axis=0) if reported else np.zeros((len(lads), n_years), bool)
+    inner = int(all_sources.sum())
+    inner_years = np.nonzero(all_sources.any(axis=0))[0] + y0
+    report = {
+        "grid": {"lads": int(len(lads)), "years": [y0, y0 + n_years - 1] if n_years else []},
+        "rows": int(len(out)),
+        "rows_all_sources": inner,
+        "years": [int(out["year"].min()), int(out["year"].max())] if len(out) else [],
+        "years_all_sources": [int(inner_years.min()), int(inner_years.max())] if len(inner_years) else [],
+        "lads": int(out["lad_id"].nunique()),
+        "lads_all_sources": int(np.all(list(reported.values()), axis=0).any(axis=1).sum()) if reported else 0,
+        "imputed_rows": int((out["imputed"] > 0).sum()),
+        "imputed_cells": {
+            m: {name: int((method[m][keep] == i + 1).sum()) for i, name in enumerate(METHODS)}
+            for m in annual if (method[m][keep] > REPORTED).any()
+        },
+    }
+    return out, cells, report
+
+
+def gather_filled(
+    measures: Sequence[str],
+    facts: Optional[Dict[str, pd.DataFrame]] = None,
+    lad: Optional[LadDictionary] = None,
+    config: Optional[ImputationConfig] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """Like star.gather, but over every LA–year any source reports, with gaps
+    imputed. Reference measures the methods need are gathered too and
+    dropped again unless requested."""
+    config = config or ImputationConfig.from_yaml()
+    lad = lad if lad is not None else LadDictionary.load()
+    extra = [r for r in config.references if r not in measures and r in star.MEASURE_FACT]
+    df = star.gather(list(measures) + extra, facts, lad, how="outer")
+    out, cells, report = fill(df, config, lad)
+    return out.drop(columns=extra), cells, report
+
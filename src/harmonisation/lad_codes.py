@@ -0,0 +1,217 @@
+"""
+JTIS – LAD code dictionary
+One shared, append-only mapping lad_code → lad_id (int32) used by every stage,
+persisted with the LAD attributes as the dimension table dim_lad.csv of the
+star schema (src/harmonisation/star.py).
+
+- lad_id is the row position in the dictionary, so it is also the category
+  code of lad_code under the shared CategoricalDtype: encoding a frame that
+  already uses the shared categories costs nothing
+- Codes are never renumbered; codes seen for the first time are appended
+- Names, region and country live only in the dimension table; encode() drops
+  them from fact frames and decorate() attaches them back by array take
+- Static measures (area_km2) are held per LAD and follow the latest source
+  value; first_year/last_year record the vintage over which each code has
+  been observed and only ever widen
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+ROOT = Path(__file__).resolve().parents[2]
+STAR_DIR = ROOT / "data" / "processed" / "star"
+DIM_FILE = STAR_DIR / "dim_lad.csv"
+
+LAD_ID_DTYPE = np.int32
+DIM_ATTRS = ["lad_name", "region_code", "region", "country_code", "country"]
+# Attributes with few distinct values, held as categoricals in memory
+CATEGORICAL_ATTRS = ["region_code", "region", "country_code", "country"]
+# Per-LAD measures that do not vary by year, kept with the dimension
+STATIC_MEASURES = ["area_km2"]
+VINTAGE_COLS = ["first_year", "last_year"]
+
+
+class LadDictionary:
+    def __init__(self, dim: Optional[pd.DataFrame] = None):
+        if dim is None:
+            dim = pd.DataFrame({"lad_code": pd.Series([], dtype=object)})
+        if "lad_id" in dim.columns:
+            dim = dim.sort_values("lad_id")
+            if not np.array_equal(dim["lad_id"].to_numpy(), np.arange(len(dim))):
+                raise ValueError("[LAD_CODES] lad_id must run 0..n-1 in the dictionary")
+        codes = dim["lad_code"].astype(str).to_numpy(dtype=object)
+        if len(set(codes)) != len(codes):
+            raise ValueError("[LAD_CODES] Duplicate lad_code in dictionary")
+        self._codes = pd.Index(codes, dtype=object, name="lad_code")
+        self._attrs = {
+            col: (
+                np.array(dim[col].astype(object), dtype=object)
+                if col in dim.columns
+                else np.full(len(codes), None, dtype=object)
+            )
+            for col in DIM_ATTRS + STATIC_MEASURES
+        }
+        self._vintage = {
+            col: (
+                pd.to_numeric(dim[col], errors="coerce").to_numpy(dtype=float)
+                if col in dim.columns
+                else np.full(len(codes), np.nan)
+            )
+            for col in VINTAGE_COLS
+        }
+        self.dtype = pd.CategoricalDtype(self._codes)
+        self.changed = False
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    @classmethod
+    def load(cls, path: Path = DIM_FILE) -> "LadDictionary":
+        if not Path(path).exists():
+            return cls()
+        return cls(pd.read_csv(path, dtype={"lad_code": str}))
+
+    def save(self, path: Path = DIM_FILE) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.dim().to_csv(path, index=False)
+        self.changed = False
+        print(f"[LAD_CODES] Wrote {len(self)} LADs → {path}")
+
+    # ----------------------------
+    # Dictionary
+    # ----------------------------
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def codes(self) -> pd.Index:
+        return self._codes
+
+    def dim(self) -> pd.DataFrame:
+        """The dimension table: lad_id, lad_code, attributes, static measures
+        and vintage."""
+        dim = pd.DataFrame({
+            "lad_id": np.arange(len(self), dtype=LAD_ID_DTYPE),
+            "lad_code": self._codes.to_numpy(),
+        })
+        for col in DIM_ATTRS:
+            values = pd.Series(self._attrs[col], dtype=object)
+            dim[col] = values.astype("category") if col in CATEGORICAL_ATTRS else values
+        for col in STATIC_MEASURES:
+            dim[col] = pd.to_numeric(pd.Series(self._attrs[col], dtype=object), errors="coerce")
+        for col in VINTAGE_COLS:
+            dim[col] = pd.array(self._vintage[col], dtype="Int32")
+        return dim
+
+    def update(self, df: pd.DataFrame) -> int:
+        """Append unseen lad_codes from df, fill attributes that are still
+        missing, refresh static measures and widen the vintage. Existing ids
+        and descriptive attributes are never changed. Returns the number of codes added."""
+        first = df.drop_duplicates("lad_code")
+        codes = first["lad_code"].astype(str).to_numpy(dtype=object)
+        pos = self._codes.get_indexer(codes)
+        new = pos < 0
+        n_new = int(new.sum())
+        if n_new:
+            self._codes = self._codes.append(pd.Index(codes[new], dtype=object, name="lad_code"))
+            for col in DIM_ATTRS + STATIC_MEASURES:
+                self._attrs[col] = np.concatenate([self._attrs[col], np.full(n_new, None, dtype=object)])
+            for col in VINTAGE_COLS:
+                self._vintage[col] = np.concatenate([self._vintage[col], np.full(n_new, np.nan)])
+            pos[new] = np.arange(len(self._codes) - n_new, len(self._codes))
+            self.dtype = pd.CategoricalDtype(self._codes)
+            self.changed = True
+
+        for col in DIM_ATTRS:
+            if col not in first.columns:
+                continue
+            current = self._attrs[col]
+            incoming = first[col].to_numpy(dtype=object)
+            fill = pd.isna(current[pos]) & ~pd.isna(incoming)
+            if fill.any():
+                current[pos[fill]] = incoming[fill]
+                self.changed = True
+
+        static = [c for c in STATIC_MEASURES if c in df.columns]
+        if static or "year" in df.columns:
+            self._refresh(df, static)
+        return n_new
+
+    def _refresh(self, df: pd.DataFrame, static: List[str]) -> None:
+        """Static measures from each code's latest year; vintage widened to
+        the years seen in df."""
+        ids = self.ids(df["lad_code"]).astype(np.int64)
+        if "year" in df.columns:
+            years = pd.to_numeric(df["year"], errors="coerce").to_numpy(dtype=float)
+            order = np.argsort(years, kind="stable")
+            ids, years = ids[order], years[order]
+            lo = np.full(len(self), np.nan)
+            hi = np.full(len(self), np.nan)
+            np.fmin.at(lo, ids, years)
+            np.fmax.at(hi, ids, years)
+            lo = np.fmin(self._vintage["first_year"], lo)
+            hi = np.fmax(self._vintage["last_year"], hi)
+            if not (np.array_equal(lo, self._vintage["first_year"], equal_nan=True)
+                    and np.array_equal(hi, self._vintage["last_year"], equal_nan=True)):
+                self._vintage["first_year"], self._vintage["last_year"] = lo, hi
+                self.changed = True
+        else:
+            order = np.arange(len(ids))
+
+        for col in static:
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)[order]
+            ok = ~np.isnan(values)
+            # Latest year per id: first occurrence in the reversed order
+            rev_ids, rev_values = ids[ok][::-1], values[ok][::-1]
+            uniq, idx = np.unique(rev_ids, return_index=True)
+            latest = np.full(len(self), np.nan)
+            latest[uniq] = rev_values[idx]
+            seen = ~np.isnan(latest)
+            current = pd.to_numeric(pd.Series(self._attrs[col][seen], dtype=object), errors="coerce")
+            if not np.array_equal(current.to_numpy(dtype=float), latest[seen], equal_nan=True):
+                self._attrs[col][seen] = latest[seen]
+                self.changed = True
+
+    def ids(self, codes: pd.Series) -> np.ndarray:
+        """lad_id for each code; raises KeyError on codes not in the dictionary."""
+        if isinstance(codes.dtype, pd.CategoricalDtype) and codes.dtype == self.dtype:
+            ids = codes.cat.codes.to_numpy()
+        else:
+            ids = self._codes.get_indexer(codes.astype(str))
+        if (ids < 0).any():
+            unknown = pd.unique(np.asarray(codes)[ids < 0])[:10]
+            raise KeyError(f"[LAD_CODES] Codes not in dictionary: {list(unknown)}")
+        return ids.astype(LAD_ID_DTYPE)
+
+    def decode(self, ids: Iterable[int]) -> np.ndarray:
+        return self._codes.to_numpy()[np.asarray(ids, dtype=np.int64)]
+
+    # ----------------------------
+    # Frames
+    # ----------------------------
+    def encode(self, df: pd.DataFrame, update: bool = False) -> pd.DataFrame:
+        """Fact frame keyed by lad_id: adds lad_id (int32), turns lad_code into
+        the shared categorical and drops the dimension attributes."""
+        if update:
+            self.update(df)
+        ids = self.ids(df["lad_code"])
+        out = df.drop(columns=[c for c in DIM_ATTRS + ["lad_id"] if c in df.columns])
+        out["lad_code"] = pd.Categorical.from_codes(ids, dtype=self.dtype)
+        out.insert(0, "lad_id", ids)
+        return out
+
+    def decorate(self, df: pd.DataFrame, attrs: Optional[List[str]] = None) -> pd.DataFrame:
+        """Attach dimension attributes by lad_id (columns df already has are kept)."""
+        attrs = [c for c in (attrs or DIM_ATTRS) if c not in df.columns]
+        if not attrs:
+            return df
+        ids = df["lad_id"].to_numpy(dtype=np.int64)
+        dim = self.dim()
+        return df.assign(**{c: pd.Series(dim[c].take(ids).array, index=df.index) for c in attrs})
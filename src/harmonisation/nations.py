@@ -0,0 +1,313 @@
+"""
+JTIS – nations
+Per-nation source adapters, so the panel covers the UK rather than England.
+
+- config/nations.yaml lists the nations (by GSS code prefix) and, for each,
+  the loader of every source kind; loaders register by name with
+  @loader(kind, name) and return one common frame per kind:
+    deprivation  area, lad_code, lad_name, rank, row (raw row position)
+    population   lad_code, lad_name, year, population
+- Deprivation: one worker process per nation loads its index (reading the
+  workbooks is most of the time), then each nation's ranks are harmonised
+  within the nation: deprivation_pct and deprived_share compare across
+  nations, imd_rank_avg stays in the index's own units
+- Population: nations sharing a loader share one load (ons_mye covers the
+  UK); every loader's rows are kept for its own nations only
+- prefixes() is the filter compose applies to the canonical tables
+"""
+
+from __future__ import annotations
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+ROOT = Path(__file__).resolve().parents[2]
+CONFIG_FILE = ROOT / "config" / "nations.yaml"
+CANONICAL_DIR = ROOT / "data" / "processed" / "canonical"
+NAME_FILES = (CANONICAL_DIR / "ons_la_year.csv", CANONICAL_DIR / "desnz_la_year.csv")
+
+KINDS = ("deprivation", "population")
+DEPRIVATION_MEASURES = ["imd_rank_avg", "deprivation_pct", "deprived_share"]
+
+LOADERS: Dict[str, Dict[str, Callable[..., pd.DataFrame]]] = {kind: {} for kind in KINDS}
+
+
+def loader(kind: str, name: str) -> Callable:
+    """Register a loader of source `kind` under `name` for nations.yaml."""
+    def register(fn: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+        LOADERS[kind][name] = fn
+        return fn
+    return register
+
+
+@dataclass(frozen=True)
+class Nation:
+    name: str
+    prefix: str
+    sources: Mapping[str, Mapping[str, Any]] = field(default_factory=dict)  # kind → spec
+
+
+@dataclass(frozen=True)
+class NationsConfig:
+    nations: Tuple[Nation, ...]
+    deprived_fraction: float = 0.1
+
+    @classmethod
+    def from_yaml(cls, path: Path = CONFIG_FILE) -> "NationsConfig":
+        with Path(path).open("r", encoding="utf-8") as f:
+            doc = yaml.safe_load(f) or {}
+        shared = {"population": doc.get("population") or {"loader": "ons_mye"}}
+        nations = []
+        for name, spec in (doc.get("nations") or {}).items():
+            sources = {**shared, **{k: spec[k] for k in KINDS if k in spec}}
+            for kind, src in sources.items():
+                if src.get("loader") not in LOADERS[kind]:
+                    raise ValueError(
+                        f"[NATIONS] {name}: unknown {kind} loader {src.get('loader')!r}; "
+                        f"expected one of {sorted(LOADERS[kind])}"
+                    )
+            nations.append(Nation(name, str(spec["prefix"]), sources))
+        prefixes = [n.prefix for n in nations]
+        if len(set(prefixes)) != len(prefixes):
+            raise ValueError(f"[NATIONS] Duplicate code prefixes: {prefixes}")
+        return cls(tuple(nations), float(doc.get("deprived_fraction", 0.1)))
+
+    def nation(self, name: str) -> Nation:
+        for n in self.nations:
+            if n.name == name:
+                return n
+        raise KeyError(f"[NATIONS] No nation {name!r} in {CONFIG_FILE.name}")
+
+    @property
+    def prefixes(self) -> Tuple[str, ...]:
+        return tuple(n.prefix for n in self.nations)
+
+
+def load_config(path: Path = CONFIG_FILE) -> NationsConfig:
+    return NationsConfig.from_yaml(path)
+
+
+def prefixes(config: Optional[NationsConfig] = None) -> Tuple[str, ...]:
+    return (config or load_config()).prefixes
+
+
+def in_nations(codes: pd.Series, prefix: Sequence[str]) -> np.ndarray:
+    """Rows whose GSS code starts with one of `prefix`."""
+    return codes.astype(str).str.startswith(tuple(prefix)).fillna(False).to_numpy(dtype=bool)
+
+
+# -------------------------------------------------------
+# Loaders
+# -------------------------------------------------------
+
+def select_ranks(raw: pd.DataFrame, spec: Mapping[str, Any], nation: Nation) -> pd.DataFrame:
+    """The common deprivation frame from a raw small-area table; with an
+    area_prefix, rows of other small areas (another nation's) are dropped."""
+    cols = spec["columns"]
+    raw = raw.rename(columns=lambda c: str(c).strip())
+    missing = [cols[k] for k in ("area", "rank", "lad_code", "lad_name") if k in cols and cols[k] not in raw.columns]
+    if missing or "lad_code" not in cols and "lad_name" not in cols:
+        raise ValueError(f"[NATIONS] {nation.name}: deprivation columns missing: {missing or ['lad_code or lad_name']}")
+    area = raw[cols["area"]].astype(str)
+    out = pd.DataFrame({
+        "area": area,
+        "lad_code": raw[cols["lad_code"]] if "lad_code" in cols else None,
+        "lad_name": raw[cols["lad_name"]] if "lad_name" in cols else None,
+        "rank": pd.to_numeric(raw[cols["rank"]], errors="coerce"),
+        "row": np.arange(len(raw)),
+    })
+    if "area_prefix" in spec:
+        out = out[in_nations(area, [str(spec["area_prefix"])])]
+    return out.reset_index(drop=True)
+
+
+@loader("deprivation", "small_area_ranks")
+def small_area_ranks(spec: Mapping[str, Any], nation: Nation) -> pd.DataFrame:
+    path = ROOT / spec["path"]
+    if not path.exists():
+        raise FileNotFoundError(f"[NATIONS] {nation.name}: deprivation file not found: {path}")
+    print(f"[NATIONS] Loading {spec.get('index', nation.name)} from: {path}")
+    raw = pd.read_excel(path, sheet_name=spec.get("sheet", 0), skiprows=spec.get("skiprows", 0))
+    return select_ranks(raw, spec, nation)
+
+
+@loader("population", "ons_mye")
+def ons_mye(spec: Mapping[str, Any], nation: Optional[Nation] = None) -> pd.DataFrame:
+    from src.harmonisation import ons_canonical
+
+    return ons_canonical.build_la_year_canonical(ons_canonical.load_ons_raw())
+
+
+def _load(kind: str, spec: Mapping[str, Any], nation: Optional[Nation]) -> pd.DataFrame:
+    return LOADERS[kind][spec["loader"]](spec, nation)
+
+
+def _run(tasks: Dict[str, tuple], workers: Optional[int]) -> Dict[str, Any]:
+    """_load(*args) per task, in worker processes when there is more than
+    one; a task whose file is missing yields its FileNotFoundError."""
+    workers = min(workers or len(tasks), len(tasks))
+
+    def settle(get):
+        try:
+            return get()
+        except FileNotFoundError as exc:
+            return exc
+
+    if workers <= 1:
+        return {key: settle(lambda a=args: _load(*a)) for key, args in tasks.items()}
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {key: pool.submit(_load, *args) for key, args in tasks.items()}
+        return {key: settle(f.result) for key, f in futures.items()}
+
+
+# -------------------------------------------------------
+# Deprivation
+# -------------------------------------------------------
+
+def _name_key(names: pd.Series) -> pd.Series:
+    s = names.astype(str).str.lower().str.replace("&", " and ", regex=False)
+    return s.str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip()
+
+
+def lad_names(ons: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """(lad_code, lad_name) pairs known to the pipeline: the LAD dimension
+    and the ONS and DESNZ canonical tables, which name every UK LAD."""
+    from src.harmonisation.lad_codes import LadDictionary
+
+    frames = [LadDictionary.load().dim()[["lad_code", "lad_name"]]]
+    if ons is not None:
+        frames.append(ons[["lad_code", "lad_name"]])
+    frames += [pd.read_csv(p, usecols=["lad_code", "lad_name"]) for p in NAME_FILES if p.exists()]
+    names = pd.concat([f.astype(object) for f in frames], ignore_index=True).dropna()
+    return names.drop_duplicates().reset_index(drop=True)
+
+
+def resolve_codes(ranks: pd.DataFrame, nation: Nation, names: pd.DataFrame) -> pd.DataFrame:
+    """Fill lad_code from lad_name (or lad_name from lad_code) within the
+    nation; small areas whose LAD cannot be resolved are dropped."""
+    names = names[in_nations(names["lad_code"], [nation.prefix])]
+    if ranks["lad_code"].isna().all():
+        by_name = dict(zip(_name_key(names["lad_name"]), names["lad_code"].astype(str)))
+        ranks = ranks.assign(lad_code=_name_key(ranks["lad_name"]).map(by_name))
+        unknown = ranks.loc[ranks["lad_code"].isna(), "lad_name"].unique()
+        if len(unknown):
+            print(f"[NATIONS] {nation.name}: {len(unknown)} LAD names not resolved, e.g. {list(unknown[:5])}")
+        ranks = ranks[ranks["lad_code"].notna()]
+    if ranks["lad_name"].isna().all():
+        ranks = ranks.assign(lad_name=ranks["lad_code"].map(dict(zip(names["lad_code"], names["lad_name"]))))
+    return ranks
+
+
+def area_deprivation(ranks: pd.DataFrame, deprived_fraction: float = 0.1) -> pd.DataFrame:
+    """One nation's small-area ranks with the deprivation measures of each
+    small area (a LAD's are their means)."""
+    # Small areas the index ranks (its top rank, should the file hold fewer)
+    n = max(ranks["area"].nunique(), int(ranks["rank"].max()) if ranks["rank"].notna().any() else 0)
+    return ranks.assign(
+        imd_rank_avg=ranks["rank"],
+        deprivation_pct=(ranks["rank"] - 0.5) / n,
+        deprived_share=(ranks["rank"] <= deprived_fraction * n).astype(float).where(ranks["rank"].notna()),
+    )
+
+
+def lad_deprivation(ranks: pd.DataFrame, deprived_fraction: float = 0.1, index: Optional[str] = None) -> pd.DataFrame:
+    """One row per LAD from one nation's small-area ranks."""
+    grouped = (
+        area_deprivation(ranks, deprived_fraction)
+        .groupby(["lad_code", "lad_name"])[DEPRIVATION_MEASURES]
+        .mean()
+        .reset_index()
+    )
+    if index is not None:
+        grouped["deprivation_index"] = index
+    return grouped
+
+
+def deprivation(
+    config: Optional[NationsConfig] = None,
+    workers: Optional[int] = None,
+    ons: Optional[pd.DataFrame] = None,
+) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """The UK LAD deprivation table (sorted by lad_code) and each nation's
+    small-area ranks."""
+    config = config or load_config()
+    todo = [n for n in config.nations if "deprivation" in n.sources]
+    loaded = _run({n.name: ("deprivation", n.sources["deprivation"], n) for n in todo}, workers)
+
+    names = None
+    ranks, tables = {}, []
+    for nation in todo:
+        result = loaded[nation.name]
+        if isinstance(result, FileNotFoundError):
+            print(f"{result}; {nation.name} keeps empty deprivation measures")
+            continue
+        if result["lad_code"].isna().all() or result["lad_name"].isna().all():
+            names = lad_names(ons) if names is None else names
+            result = resolve_codes(result, nation, names)
+        ranks[nation.name] = result
+        spec = nation.sources["deprivation"]
+        tables.append(lad_deprivation(result, config.deprived_fraction, spec.get("index", nation.name)))
+        print(f"[NATIONS] {nation.name}: {result['area'].nunique()} small areas → {len(tables[-1])} LADs")
+
+    if not tables:
+        return pd.DataFrame(columns=["lad_code", "lad_name"] + DEPRIVATION_MEASURES + ["deprivation_index"]), ranks
+    out = pd.concat(tables, ignore_index=True)
+    return out.sort_values(["lad_code", "lad_name"]).reset_index(drop=True), ranks
+
+
+def small_area_deprivation(ranks: Dict[str, pd.DataFrame], config: Optional[NationsConfig] = None) -> pd.DataFrame:
+    """The deprivation measures of every small area of every nation (ranks
+    as returned by deprivation()), sorted by area."""
+    config = config or load_config()
+    cols = ["area", "lad_code"] + DEPRIVATION_MEASURES + ["deprivation_index"]
+    parts = [
+        area_deprivation(r, config.deprived_fraction).assign(
+            deprivation_index=config.nation(name).sources["deprivation"].get("index", name)
+        )[cols]
+        for name, r in ranks.items()
+    ]
+    if not parts:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(parts, ignore_index=True).sort_values("area").reset_index(drop=True)
+
+
+# -------------------------------------------------------
+# Population
+# -------------------------------------------------------
+
+def population(
+    ons: Optional[pd.DataFrame] = None,
+    config: Optional[NationsConfig] = None,
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """LA–year population of every nation, each from its own loader.
+    `ons` is the ONS canonical table when the caller has already built it
+    (it stands in for the ons_mye loader)."""
+    config = config or load_config()
+    groups: Dict[str, List[Nation]] = {}
+    for n in config.nations:
+        groups.setdefault(json.dumps(n.sources["population"], sort_keys=True), []).append(n)
+
+    tasks = {
+        key: ("population", nations[0].sources["population"], nations[0])
+        for key, nations in groups.items()
+        if not (ons is not None and nations[0].sources["population"]["loader"] == "ons_mye")
+    }
+    loaded = _run(tasks, workers) if tasks else {}
+    parts = []
+    for key, nations in groups.items():
+        df = loaded[key] if key in loaded else ons
+        if isinstance(df, FileNotFoundError):
+            raise df
+        parts.append(df[in_nations(df["lad_code"], [n.prefix for n in nations])])
+    if not parts:
+        return pd.DataFrame(columns=["lad_code", "lad_name", "year", "population"])
+    out = pd.concat(parts, ignore_index=True)
+    return out.sort_values(["lad_code", "year"]).reset_index(drop=True)
@@ -8,7 +8,6 @@ ROOT = Path(__file__).resolve().parents[2]
 PROCESSED_DIR = ROOT / "data" / "processed"
 RAW_DIR = ROOT / "data" / "raw"
 CANONICAL_DIR = PROCESSED_DIR / "canonical"
-CANONICAL_DIR.mkdir(parents=True, exist_ok=True)
 
 RAW_FILE = RAW_DIR / "ons_population.xlsx"
 CANONICAL_OUT_FILE = CANONICAL_DIR / "ons_la_year.csv"
@@ -82,15 +81,50 @@ def build_la_year_canonical(df: pd.DataFrame) -> pd.DataFrame:
 
 def write_canonical(df: pd.DataFrame) -> None:
     print(f"[ONS_CANONICAL] Writing canonical table to: {CANONICAL_OUT_FILE}")
+    CANONICAL_DIR.mkdir(parents=True, exist_ok=True)
     df.to_csv(CANONICAL_OUT_FILE, index=False)
     print("[ONS_CANONICAL] Write complete.")
 
 
+def record_lineage(df: pd.DataFrame, canonical: pd.DataFrame) -> None:
+    """Map each canonical LA–year to the raw age × sex rows whose
+    population_<year> cells it sums."""
+    import numpy as np
+
+    from src import lineage
+
+    years = [c for c in df.columns if c.startswith("population_")]
+    n = len(df)
+    lineage.Record(
+        "ons_canonical",
+        {
+            "source": lineage.fingerprint(RAW_FILE),
+            "sheets": [{"sheet": "MYEB1", "start": 0, "stop": n, "skiprows": 1}],
+            "output": lineage.fingerprint(CANONICAL_OUT_FILE),
+            "aggregation": {"group_by": ["ladcode23", "year"], "population": "sum over age and sex"},
+            "columns": ["population_{year}"],
+        },
+        keys={"lad_code": canonical["lad_code"], "year": canonical["year"]},
+        maps={
+            "input": lineage.RowMap.from_keys(
+                [np.tile(df["ladcode23"].to_numpy(), len(years)),
+                 np.repeat([int(c.replace("population_", "")) for c in years], n)],
+                [canonical["lad_code"], canonical["year"]],
+                rows=np.tile(np.arange(n), len(years)),
+            )
+        },
+    ).save()
+
+
 def main() -> int:
     print("[ONS_CANONICAL] Phase 2 harmonisation (ONS LA–year) starting...")
+    from src.harmonisation import nations
+
     df = load_ons_raw()
-    canonical = build_la_year_canonical(df)
+    # Rows of the nations in config/nations.yaml, each from its own loader
+    canonical = nations.population(build_la_year_canonical(df))
     write_canonical(canonical)
+    record_lineage(df, canonical)
     print("[ONS_CANONICAL] Phase 2 harmonisation (ONS LA–year) finished successfully.")
     return 0
 
@@ -0,0 +1,295 @@
+"""
+JTIS – small-area granularity
+Optional LSOA / MSOA panel: the LAD-level base table apportioned to each
+LAD's small areas by population share (config/granularity.yaml).
+
+- level lad (default) leaves the pipeline LAD-level; with lsoa / msoa,
+  compose writes one base row per small area and year, keyed by area_id
+  (int32, the area's position in the area list ordered by LAD and code) with
+  the lad_id / lad_code of its LAD; anomalies and scoring key their panels
+  by area_id when the table has it (trends.panel_key)
+- This stage writes small_area_year.csv: every small area's population in
+  each year of the estimates (one file per year, read in worker processes)
+  and its own deprivation measures from imd_small_area.csv
+- apportion() lays the populations out on a dense (area × year) grid over
+  the estimate and base years; years without estimates take the nearest
+  year's (impute.carry) and shares are normalised within each LAD-year, so
+  apportioned measures add up to the LAD's values. Base rows are repeated
+  over a CSR layout of areas by LAD: no joins, one row take of the base
+  table and one float array per apportioned measure
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation import impute, nations  # noqa: E402
+from src.harmonisation.lad_codes import LadDictionary  # noqa: E402
+
+CONFIG_FILE = ROOT / "config" / "granularity.yaml"
+CANONICAL_DIR = ROOT / "data" / "processed" / "canonical"
+DEPRIVATION_FILE = CANONICAL_DIR / "imd_small_area.csv"
+OUT_FILE = CANONICAL_DIR / "small_area_year.csv"
+
+LEVELS = ("lad", "lsoa", "msoa")
+
+
+@dataclass(frozen=True)
+class GranularityConfig:
+    level: str = "lad"
+    population: Tuple[Mapping[str, Any], ...] = ()
+    msoa_lookup: Optional[Mapping[str, Any]] = None
+    apportion: Tuple[str, ...] = field(default_factory=tuple)
+
+    @classmethod
+    def from_yaml(cls, path: Path = CONFIG_FILE) -> "GranularityConfig":
+        if not Path(path).exists():
+            return cls()
+        with Path(path).open("r", encoding="utf-8") as f:
+            doc = yaml.safe_load(f) or {}
+        level = str(doc.get("level", "lad")).lower()
+        if level not in LEVELS:
+            raise ValueError(f"[SMALL_AREAS] Unknown level {level!r}; expected one of {LEVELS}")
+        if level == "msoa" and not doc.get("msoa_lookup"):
+            raise ValueError("[SMALL_AREAS] level msoa needs an msoa_lookup")
+        return cls(
+            level,
+            tuple(doc.get("population") or ()),
+            doc.get("msoa_lookup"),
+            tuple(doc.get("apportion") or ()),
+        )
+
+    @property
+    def areal(self) -> bool:
+        """Whether the panel is keyed by small area."""
+        return self.level != "lad"
+
+
+def load_config(path: Path = CONFIG_FILE) -> GranularityConfig:
+    return GranularityConfig.from_yaml(path)
+
+
+# -------------------------------------------------------
+# Small-area population
+# -------------------------------------------------------
+
+def population_files(spec: Mapping[str, Any]) -> Dict[Optional[int], Path]:
+    """The files of one population source by year (one long file: {None: path})."""
+    path = str(spec["path"])
+    if "{year}" not in path:
+        return {None: ROOT / path}
+    pattern = re.compile(re.escape(path).replace(re.escape("{year}"), r"(\d{4})") + "$")
+    files = {}
+    for p in sorted(ROOT.glob(path.replace("{year}", "*"))):
+        m = pattern.match(p.relative_to(ROOT).as_posix())
+        if m:
+            files[int(m.group(1))] = p
+    return files
+
+
+def read_population(spec: Mapping[str, Any], year: Optional[int], path: Path) -> pd.DataFrame:
+    """area, lad_code, year, population from one file of a source."""
+    if path.suffix.lower() == ".csv":
+        raw = pd.read_csv(path, skiprows=spec.get("skiprows", 0))
+    else:
+        sheet = spec.get("sheet", 0)
+        if isinstance(sheet, str) and year is not None:
+            sheet = sheet.replace("{year}", str(year))
+        raw = pd.read_excel(path, sheet_name=sheet, skiprows=spec.get("skiprows", 0))
+    raw = raw.rename(columns=lambda c: str(c).strip())
+    cols = spec["columns"]
+    missing = [cols[k] for k in ("area", "lad_code", "population", "year") if k in cols and cols[k] not in raw.columns]
+    if missing:
+        raise ValueError(f"[SMALL_AREAS] {path.name}: columns missing: {missing}")
+    out = pd.DataFrame({
+        "area": raw[cols["area"]].astype(str).str.strip(),
+        "lad_code": raw[cols["lad_code"]].astype(str).str.strip(),
+        "year": pd.to_numeric(raw[cols["year"]], errors="coerce") if "year" in cols else year,
+        "population": pd.to_numeric(raw[cols["population"]], errors="coerce"),
+    })
+    return out.dropna(subset=["year", "population"]).astype({"year": int})
+
+
+def load_population(config: GranularityConfig, workers: Optional[int] = None) -> pd.DataFrame:
+    """Every population source's rows, one worker process per file."""
+    tasks = [(spec, year, path) for spec in config.population for year, path in population_files(spec).items()]
+    if not tasks:
+        raise FileNotFoundError(
+            f"[SMALL_AREAS] No small-area population files for level {config.level} (see {CONFIG_FILE.name})"
+        )
+    for spec in config.population:
+        print(f"[SMALL_AREAS] {spec.get('name', spec['path'])}: {len(population_files(spec))} file(s)")
+    workers = min(workers or len(tasks), len(tasks))
+    if workers <= 1:
+        parts = [read_population(*t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(read_population, *zip(*tasks)))
+    return pd.concat(parts, ignore_index=True)
+
+
+def to_msoa(frame: pd.DataFrame, spec: Mapping[str, Any], value_cols: Sequence[str], how: str) -> pd.DataFrame:
+    """Regroup LSOA rows by MSOA (`how`: sum or mean of value_cols)."""
+    path = ROOT / spec["path"]
+    if not path.exists():
+        raise FileNotFoundError(f"[SMALL_AREAS] MSOA lookup not found: {path}")
+    cols = spec["columns"]
+    lookup = pd.read_csv(path, usecols=[cols["area"], cols["msoa"]], dtype=str).drop_duplicates(cols["area"])
+    msoa = frame["area"].map(lookup.set_index(cols["area"])[cols["msoa"]])
+    keys = [c for c in ("lad_code", "year") if c in frame.columns]
+    return (
+        frame.assign(area=msoa)
+        .dropna(subset=["area"])
+        .groupby(["area"] + keys, sort=False)[list(value_cols)]
+        .agg(how)
+        .reset_index()
+    )
+
+
+def build(config: Optional[GranularityConfig] = None, workers: Optional[int] = None) -> pd.DataFrame:
+    """The small-area table: area_code, lad_code, year, population and the
+    area's deprivation measures (NaN where the index does not rank it)."""
+    config = config or load_config()
+    pop = load_population(config, workers)
+    dep = pd.read_csv(DEPRIVATION_FILE) if DEPRIVATION_FILE.exists() else pd.DataFrame(columns=["area"])
+    dep = dep.reindex(columns=["area"] + nations.DEPRIVATION_MEASURES).astype(
+        {"area": str, **{m: float for m in nations.DEPRIVATION_MEASURES}}
+    )
+    if config.level == "msoa":
+        pop = to_msoa(pop, config.msoa_lookup, ["population"], "sum")
+        dep = to_msoa(dep, config.msoa_lookup, nations.DEPRIVATION_MEASURES, "mean")
+    out = pop.merge(dep.drop_duplicates("area"), on="area", how="left").rename(columns={"area": "area_code"})
+    return out.sort_values(["area_code", "year"]).reset_index(drop=True)
+
+
+# -------------------------------------------------------
+# Apportioning
+# -------------------------------------------------------
+
+def apportion(
+    base: pd.DataFrame,
+    areas: pd.DataFrame,
+    measures: Optional[Sequence[str]] = None,
+    lad: Optional[LadDictionary] = None,
+) -> Tuple[pd.DataFrame, dict]:
+    """The small-area panel of a LAD-level base table (keyed by lad_id) and a
+    summary. `areas` is the small-area table (see build()); `measures` are
+    split by population share (default: the config's apportion list)."""
+    measures = [m for m in (measures if measures is not None else load_config().apportion) if m in base.columns]
+    lad = lad if lad is not None else LadDictionary.load()
+
+    # Areas as integer codes (sorted, so codes order areas by code); one LAD
+    # per area, the one of its latest estimate
+    code, a_codes = pd.factorize(areas["area_code"].astype(str), sort=True)
+    lad_row, lad_uniques = pd.factorize(areas["lad_code"].astype(str))
+    row_lad = lad.codes.get_indexer(lad_uniques)[lad_row]
+    e_year = areas["year"].to_numpy(dtype=np.int64)
+    latest = np.lexsort((e_year, code))
+    latest = latest[np.r_[code[latest][1:] != code[latest][:-1], True]] if len(code) else latest
+    a_lad = row_lad[latest]
+    dep = {m: pd.to_numeric(areas[m], errors="coerce").to_numpy(dtype=float)[latest]
+           for m in nations.DEPRIVATION_MEASURES if m in areas.columns}
+
+    # Areas of LADs outside the base table are dropped; base LADs without
+    # estimates become one area standing for the whole LAD
+    b_lad = base["lad_id"].to_numpy(dtype=np.int64)
+    b_year = base["year"].to_numpy(dtype=np.int64)
+    lads = np.unique(b_lad)
+    known = np.isin(a_lad, lads)
+    whole = np.setdiff1d(lads, a_lad[known], assume_unique=True)
+    src = np.concatenate([np.flatnonzero(known), np.full(len(whole), -1)])  # area -> code, -1 whole LAD
+    a_lad = np.concatenate([a_lad[known], whole])
+
+    order = np.lexsort((src, a_lad))
+    src, a_lad = src[order], a_lad[order]
+    a_index = np.full(len(a_codes), -1)
+    a_index[src[src >= 0]] = np.flatnonzero(src >= 0)
+    labels = np.where(src >= 0, np.asarray(a_codes, dtype=object)[np.maximum(src, 0)],
+                      lad.codes.to_numpy()[a_lad].astype(object))
+    dep = {m: np.where(src >= 0, v[np.maximum(src, 0)], np.nan) for m, v in dep.items()}
+
+    # Population grid over the estimate and base years, nearest year carried
+    years = np.concatenate([b_year, e_year])
+    y0, y1 = (int(years.min()), int(years.max())) if len(years) else (0, 0)
+    grid = np.full((len(a_lad), y1 - y0 + 1), np.nan)
+    rows = a_index[code]
+    ok = rows >= 0
+    grid[rows[ok], e_year[ok] - y0] = pd.to_numeric(areas["population"], errors="coerce").to_numpy(dtype=float)[ok]
+    grid[src < 0] = 1.0
+    grid = np.nan_to_num(impute.carry(grid, grid.shape[1]))
+
+    starts = np.flatnonzero(np.r_[True, a_lad[1:] != a_lad[:-1]]) if len(a_lad) else np.zeros(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(a_lad)])
+    totals = np.add.reduceat(grid, starts, axis=0) if len(starts) else np.zeros((0, grid.shape[1]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = grid / np.repeat(totals, sizes, axis=0)
+
+    # CSR repeat: each base row once per area of its LAD, then by (area, year)
+    g = np.searchsorted(a_lad[starts], b_lad)
+    counts = sizes[g]
+    rep = np.repeat(np.arange(len(base)), counts)
+    area = np.repeat(starts[g] - np.cumsum(counts) + counts, counts) + np.arange(len(rep))
+    perm = np.lexsort((b_year[rep], area))
+    rep, area = rep[perm], area[perm]
+    w = share[area, b_year[rep] - y0]
+    del perm, share, grid
+
+    # Columns taken from the base rows once; apportioned and area-level
+    # measures are computed straight into their output arrays
+    cols: Dict[str, Any] = {
+        "area_id": area.astype(np.int32),
+        "area_code": pd.Categorical.from_codes(area, categories=pd.Index(labels)),
+    }
+    for c in base.columns:
+        if c in measures:
+            cols[c] = pd.to_numeric(base[c], errors="coerce").to_numpy(dtype=float)[rep]
+            cols[c] *= w
+        elif c in dep:
+            v = dep[c][area]
+            cols[c] = np.where(np.isnan(v), pd.to_numeric(base[c], errors="coerce").to_numpy(dtype=float)[rep], v)
+        else:
+            cols[c] = base[c].iloc[rep].reset_index(drop=True)
+    out = pd.DataFrame(cols, copy=False)
+
+    report = {
+        "areas": int(len(a_lad) - len(whole)),
+        "lads_as_one_area": int(len(whole)),
+        "areas_outside_base": int((~known).sum()),
+        "rows": int(len(out)),
+        "apportioned": measures,
+    }
+    return out, report
+
+
+# -------------------------------------------------------
+# Stage
+# -------------------------------------------------------
+
+def main(workers: Optional[int] = None) -> int:
+    config = load_config()
+    if not config.areal:
+        print(f"[SMALL_AREAS] Level lad in {CONFIG_FILE.name}; nothing to build")
+        return 0
+    print(f"[SMALL_AREAS] Building the {config.level} table...")
+    table = build(config, workers)
+    OUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(OUT_FILE, index=False)
+    print(f"[SMALL_AREAS] {table['area_code'].nunique()} areas, {len(table)} area–years → {OUT_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
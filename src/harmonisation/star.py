@@ -0,0 +1,209 @@
+"""
+JTIS – star schema
+The LAD dimension table (dim_lad.csv, see lad_codes.py) plus one narrow fact
+table per source, keyed by (lad_id, year), under data/processed/star/.
+
+- A fact holds only its source's measures and integer keys; names, regions
+  and area live once in the dimension table
+- gather(measures) reads just the facts (and columns) the measures come from
+  and joins them on the integer keys; rows are the (lad_id, year) pairs
+  present in every fact it touches, or with how="outer" in any annual one
+- fact_transport_vehicle is a long detail fact (lad_id, year, vehicle, road)
+  for the DfT vehicle × road breakdown and is read with read_fact()
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.harmonisation.lad_codes import STAR_DIR, STATIC_MEASURES, LadDictionary
+
+
+@dataclass(frozen=True)
+class Fact:
+    name: str
+    source: str                  # canonical dataset the fact is built from
+    measures: Tuple[str, ...]
+    keys: Tuple[str, ...] = ("lad_id", "year")
+    optional: Tuple[str, ...] = ()  # measures older source tables lack; empty (NaN) there
+
+    @property
+    def path(self) -> Path:
+        return STAR_DIR / f"fact_{self.name}.parquet"
+
+    @property
+    def annual(self) -> bool:
+        return "year" in self.keys
+
+
+FACTS: Dict[str, Fact] = {
+    f.name: f
+    for f in [
+        Fact(
+            "emissions",
+            "desnz",
+            ("total_emissions_scope_ktco2", "territorial_emissions_ktco2e", "mid_year_population_thousands"),
+        ),
+        Fact(
+            "transport",
+            "dft",
+            ("total_fuel_ktoe", "personal_transport_ktoe", "freight_transport_ktoe", "bioenergy_ktoe"),
+        ),
+        Fact("population", "ons", ("population",)),
+        Fact(
+            "deprivation",
+            "imd",
+            ("imd_rank_avg", "deprivation_pct", "deprived_share"),
+            keys=("lad_id",),
+            optional=("deprivation_pct", "deprived_share"),
+        ),
+        Fact("transport_vehicle", "dft_vehicle", ("fuel_ktoe",), keys=("lad_id", "year", "vehicle", "road")),
+    ]
+}
+
+# measure -> fact for everything gather() can join on (lad_id[, year])
+MEASURE_FACT: Dict[str, str] = {
+    m: f.name
+    for f in FACTS.values()
+    if set(f.keys) <= {"lad_id", "year"}
+    for m in f.measures
+}
+
+# Measures of the JTIS base table, in output order
+BASE_MEASURES: List[str] = [
+    "total_emissions_scope_ktco2",
+    "territorial_emissions_ktco2e",
+    "mid_year_population_thousands",
+    "area_km2",
+    "total_fuel_ktoe",
+    "personal_transport_ktoe",
+    "freight_transport_ktoe",
+    "bioenergy_ktoe",
+    "population",
+    "imd_rank_avg",
+    "deprivation_pct",
+    "deprived_share",
+]
+
+
+# -------------------------------------------------------
+# Building facts
+# -------------------------------------------------------
+
+def build_fact(fact: Fact, df: pd.DataFrame) -> pd.DataFrame:
+    """Narrow fact frame from an encoded (lad_id-keyed) source frame."""
+    missing = [c for c in fact.keys + fact.measures if c not in df.columns and c not in fact.optional]
+    if missing:
+        raise KeyError(f"[STAR] fact_{fact.name} needs columns missing from {fact.source}: {missing}")
+    absent = [c for c in fact.optional if c not in df.columns]
+    if absent:
+        print(f"[STAR] fact_{fact.name}: {fact.source} has no {absent}; left empty")
+        df = df.assign(**{c: np.nan for c in absent})
+    out = df[list(fact.keys + fact.measures)]
+    if fact.annual:
+        out = out.assign(year=out["year"].astype(np.int16))
+    for col in fact.keys[2:]:
+        out = out.assign(**{col: out[col].astype("category")})
+    return out.sort_values(list(fact.keys)).reset_index(drop=True)
+
+
+def build_facts(sources: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """Fact frames for every fact whose source is in `sources` (encoded frames)."""
+    return {
+        f.name: build_fact(f, sources[f.source])
+        for f in FACTS.values()
+        if f.source in sources
+    }
+
+
+# -------------------------------------------------------
+# Persistence
+# -------------------------------------------------------
+
+def write_facts(facts: Dict[str, pd.DataFrame]) -> None:
+    STAR_DIR.mkdir(parents=True, exist_ok=True)
+    for name, df in facts.items():
+        path = FACTS[name].path
+        df.to_parquet(path, index=False)
+        print(f"[STAR] Wrote fact_{name}: {len(df)} rows x {df.shape[1]} columns → {path}")
+
+
+def read_fact(
+    name: str,
+    measures: Optional[Sequence[str]] = None,
+    years: Optional[Iterable[int]] = None,
+) -> pd.DataFrame:
+    """One fact table from disk, reading only the key and requested columns."""
+    fact = FACTS[name]
+    if not fact.path.exists():
+        raise FileNotFoundError(
+            f"Fact table not found: {fact.path}. Run src/agents/composer_agent.py first."
+        )
+    columns = list(fact.keys) + list(measures if measures is not None else fact.measures)
+    filters = [("year", "in", [int(y) for y in years])] if years is not None and fact.annual else None
+    return pd.read_parquet(fact.path, columns=columns, filters=filters)
+
+
+# -------------------------------------------------------
+# Gathering measures
+# -------------------------------------------------------
+
+def gather(
+    measures: Sequence[str],
+    facts: Optional[Dict[str, pd.DataFrame]] = None,
+    lad: Optional[LadDictionary] = None,
+    years: Optional[Iterable[int]] = None,
+    how: str = "inner",
+) -> pd.DataFrame:
+    """LA–year frame of the requested measures: lad_id, lad_code, year, measures.
+
+    Facts come from `facts` when given (in-memory composition), else from
+    disk; static measures (area_km2) come from the dimension table. With
+    how="outer" the rows are the (lad_id, year) pairs in any annual fact,
+    with NaN for measures of facts that lack them (see impute.py).
+    """
+    if how not in ("inner", "outer"):
+        raise ValueError(f"[STAR] how must be 'inner' or 'outer', not {how!r}")
+    lad = lad if lad is not None else LadDictionary.load()
+    unknown = [m for m in measures if m not in MEASURE_FACT and m not in STATIC_MEASURES]
+    if unknown:
+        raise KeyError(f"[STAR] Unknown measures: {unknown}")
+
+    wanted: Dict[str, List[str]] = {}
+    for m in measures:
+        if m in MEASURE_FACT:
+            wanted.setdefault(MEASURE_FACT[m], []).append(m)
+    annual = [n for n in wanted if FACTS[n].annual]
+    if not annual:
+        raise ValueError("[STAR] gather() needs at least one annual measure")
+    years = None if years is None else sorted({int(y) for y in years})
+
+    def load(name: str) -> pd.DataFrame:
+        cols = list(FACTS[name].keys) + wanted[name]
+        if facts is not None:
+            df = facts[name][cols]
+            if years is not None and FACTS[name].annual:
+                df = df[df["year"].isin(years)]
+            return df
+        return read_fact(name, wanted[name], years)
+
+    out = None
+    for name in annual + [n for n in wanted if n not in annual]:
+        df = load(name)
+        join = how if FACTS[name].annual else ("left" if how == "outer" else "inner")
+        out = df if out is None else out.merge(df, on=list(FACTS[name].keys), how=join)
+
+    out = out.sort_values(["lad_id", "year"]).reset_index(drop=True)
+    ids = out["lad_id"].to_numpy()
+    out.insert(1, "lad_code", pd.Categorical.from_codes(ids, dtype=lad.dtype))
+    out["year"] = out["year"].astype(int)
+
+    static = [m for m in measures if m in STATIC_MEASURES]
+    if static:
+        out = lad.decorate(out, static)
+    return out[["lad_id", "lad_code", "year"] + list(measures)]
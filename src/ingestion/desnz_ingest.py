@@ -11,7 +11,6 @@ import yaml
 ROOT = Path(__file__).resolve().parents[2]
 DATASETS_CONFIG = ROOT / "config" / "datasets.yaml"
 PROCESSED_DIR = ROOT / "data" / "processed"
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def load_datasets_config() -> dict:
@@ -72,17 +71,32 @@ def write_desnz_processed(df: pd.DataFrame) -> Path:
     """
     out_path = PROCESSED_DIR / "desnz_ghg_emissions_processed.csv"
     print(f"[DESNZ] Writing processed CSV to: {out_path}")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     df.to_csv(out_path, index=False)
     print("[DESNZ] Write complete.")
     return out_path
 
 
+def record_lineage(desnz_cfg: dict, df: pd.DataFrame, out_path: Path) -> None:
+    """Processed rows are the raw CSV rows, one for one."""
+    from src import lineage
+
+    lineage.Record(
+        "desnz_ingest",
+        {
+            "source": lineage.fingerprint(ROOT / desnz_cfg["path"]),
+            "sheets": [{"sheet": None, "start": 0, "stop": len(df), "skiprows": 0}],
+            "output": lineage.fingerprint(out_path),
+        },
+    ).save()
+
+
 def main() -> int:
     print("[DESNZ] Phase 1 ingestion starting...")
     datasets_cfg = load_datasets_config()
     desnz_cfg = get_desnz_config(datasets_cfg)
     df = read_desnz_raw(desnz_cfg)
-    write_desnz_processed(df)
+    record_lineage(desnz_cfg, df, write_desnz_processed(df))
     print("[DESNZ] Phase 1 ingestion finished successfully.")
     return 0
 
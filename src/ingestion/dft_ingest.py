@@ -9,7 +9,6 @@ import yaml
 ROOT = Path(__file__).resolve().parents[2]
 DATASETS_CONFIG = ROOT / "config" / "datasets.yaml"
 PROCESSED_DIR = ROOT / "data" / "processed"
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def load_datasets_config() -> dict:
@@ -75,17 +74,38 @@ def read_dft_raw(cfg: dict) -> pd.DataFrame:
 def write_dft_processed(df: pd.DataFrame) -> Path:
     out_path = PROCESSED_DIR / "dft_fuel_consumption_processed.csv"
     print(f"[DfT] Writing processed CSV to: {out_path}")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     df.to_csv(out_path, index=False)
     print("[DfT] Write complete.")
     return out_path
 
 
+def record_lineage(cfg: dict, df: pd.DataFrame, out_path: Path) -> None:
+    """Which rows of the processed table came from which raw sheet."""
+    from src import lineage
+
+    skip = cfg.get("header_rows_to_skip", 0)
+    if "__source_sheet__" in df.columns:
+        sheets = lineage.sheet_ranges(df["__source_sheet__"].to_numpy(), skip)
+    else:
+        sheet = cfg.get("sheets")
+        sheets = [{"sheet": str(sheet if sheet is not None else 0), "start": 0, "stop": len(df), "skiprows": skip}]
+    lineage.Record(
+        "dft_ingest",
+        {
+            "source": lineage.fingerprint(ROOT / cfg["path"]),
+            "sheets": sheets,
+            "output": lineage.fingerprint(out_path),
+        },
+    ).save()
+
+
 def main() -> int:
     print("[DfT] Phase 1 ingestion starting...")
     datasets_cfg = load_datasets_config()
     cfg = get_dft_config(datasets_cfg)
     df = read_dft_raw(cfg)
-    write_dft_processed(df)
+    record_lineage(cfg, df, write_dft_processed(df))
     print("[DfT] Phase 1 ingestion finished successfully.")
     return 0
 
@@ -0,0 +1,516 @@
+"""
+JTIS – dataset fetcher
+Pulls registry entries from their upstream URLs into a local mirror.
+
+This module:
+- Reads dataset registry from config/datasets.yaml
+- Resolves each entry's URL (`url:` field, or --base-url + file name)
+- Downloads all entries concurrently over a small asyncio HTTP/1.1 client
+- Sends ETag / Last-Modified conditional requests so unchanged upstreams cost one round trip
+- Resumes interrupted downloads with Range / If-Range
+- Verifies the optional `sha256:` registry field and stores objects content-addressed
+  under data/mirror/objects/<aa>/<sha256>
+- Copies the mirrored object to the registry `path` (data/raw/...) when it changed
+- Writes a fetch report to outputs/diagnostics/fetch_report.json
+
+Re-running with nothing changed upstream is a no-op: every dataset answers 304
+and no file under data/ is touched.
+
+Every network read (connect, status line, headers and each body chunk) is
+bounded by --timeout, so a stalled server fails the dataset instead of hanging
+the refresh. src/ingestion/fetch_stub.py serves files over a local stub HTTP
+server and checks the 304, resume, checksum and stall paths against it.
+
+Run with: python src/ingestion/fetch.py [--base-url URL] [datasets...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import hashlib
+import json
+import os
+import shutil
+import ssl
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import yaml
+
+# -------------------------------------------------------
+# Paths
+# -------------------------------------------------------
+
+ROOT = Path(__file__).resolve().parents[2]
+REGISTRY_PATH = ROOT / "config" / "datasets.yaml"
+MIRROR_DIR = ROOT / "data" / "mirror"
+OBJECTS_DIR = MIRROR_DIR / "objects"
+PARTIAL_DIR = MIRROR_DIR / "partial"
+INDEX_PATH = MIRROR_DIR / "index.json"
+DIAG_FILE = ROOT / "outputs" / "diagnostics" / "fetch_report.json"
+
+BASE_URL_ENV = "JTAP_FETCH_BASE_URL"
+CHUNK_SIZE = 1 << 16
+TIMEOUT = 60.0
+MAX_REDIRECTS = 5
+USER_AGENT = "jtap-fetch/1.0"
+
+
+# -------------------------------------------------------
+# Minimal asyncio HTTP/1.1 client
+# -------------------------------------------------------
+
+class FetchError(RuntimeError):
+    pass
+
+
+@dataclass
+class HttpResponse:
+    url: str
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    timeout: float = TIMEOUT
+
+    async def _read(self, n: int) -> bytes:
+        try:
+            return await asyncio.wait_for(self.reader.read(n), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise FetchError(f"No data for {self.timeout}s while reading the body: {self.url}") from None
+
+    async def _readline(self) -> bytes:
+        try:
+            return await asyncio.wait_for(self.reader.readline(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise FetchError(f"No data for {self.timeout}s while reading the body: {self.url}") from None
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        """Yield the body in chunks (Content-Length, chunked, or read-to-EOF)."""
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await self._readline()
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Drain trailers up to the terminating blank line
+                    while (await self._readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                remaining = size
+                while remaining:
+                    chunk = await self._read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        raise FetchError(f"Connection closed mid-chunk: {self.url}")
+                    remaining -= len(chunk)
+                    yield chunk
+                await self._readline()
+        elif "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            while remaining:
+                chunk = await self._read(min(remaining, CHUNK_SIZE))
+                if not chunk:
+                    raise FetchError(
+                        f"Connection closed with {remaining} bytes outstanding: {self.url}"
+                    )
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while True:
+                chunk = await self._read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, ssl.SSLError):
+            pass
+
+
+async def http_get(url: str, headers: Dict[str, str], timeout: float = TIMEOUT) -> HttpResponse:
+    """Issue a GET and return once the status line and headers are read."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise FetchError(f"Unsupported URL scheme: {url}")
+
+    host = parts.hostname or ""
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    ssl_ctx = ssl.create_default_context() if parts.scheme == "https" else None
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port, ssl=ssl_ctx), timeout=timeout
+    )
+
+    host_header = host if parts.port is None else f"{host}:{parts.port}"
+    lines = [
+        f"GET {target} HTTP/1.1",
+        f"Host: {host_header}",
+        f"User-Agent: {USER_AGENT}",
+        "Accept-Encoding: identity",
+        "Connection: close",
+    ]
+    lines.extend(f"{k}: {v}" for k, v in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+    status_line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+    try:
+        _, status, *reason = status_line.decode("latin-1").strip().split(" ", 2)
+        status_code = int(status)
+    except ValueError:
+        writer.close()
+        raise FetchError(f"Malformed status line from {url}: {status_line!r}")
+
+    resp_headers: Dict[str, str] = {}
+    while True:
+        line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        resp_headers[name.strip().lower()] = value.strip()
+
+    return HttpResponse(
+        url=url,
+        status=status_code,
+        reason=reason[0] if reason else "",
+        headers=resp_headers,
+        reader=reader,
+        writer=writer,
+        timeout=timeout,
+    )
+
+
+# -------------------------------------------------------
+# Mirror index
+# -------------------------------------------------------
+
+def load_registry(path: Path) -> Dict[str, Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        doc = yaml.safe_load(f) or {}
+    if "datasets" not in doc:
+        raise ValueError("datasets.yaml missing 'datasets:' block")
+    return doc["datasets"]
+
+
+def load_index() -> Dict[str, Dict[str, Any]]:
+    if not INDEX_PATH.exists():
+        return {}
+    with INDEX_PATH.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_index(index: Dict[str, Dict[str, Any]]) -> None:
+    MIRROR_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = INDEX_PATH.with_suffix(".json.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, INDEX_PATH)
+
+
+def object_path(sha256: str) -> Path:
+    return OBJECTS_DIR / sha256[:2] / sha256
+
+
+def sha256_file(path: Path) -> "hashlib._Hash":
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h
+
+
+def resolve_url(meta: Dict[str, Any], base_url: Optional[str]) -> Optional[str]:
+    if meta.get("url"):
+        return str(meta["url"])
+    if base_url and meta.get("path"):
+        return urljoin(base_url.rstrip("/") + "/", Path(meta["path"]).name)
+    return None
+
+
+# -------------------------------------------------------
+# Fetch a single dataset
+# -------------------------------------------------------
+
+@dataclass
+class FetchResult:
+    dataset_key: str
+    url: Optional[str]
+    status: str  # downloaded | resumed | unchanged | skipped | failed
+    sha256: Optional[str]
+    bytes_transferred: int
+    path: Optional[str]
+    seconds: float
+    error: Optional[str]
+
+
+@dataclass
+class FetchReport:
+    timestamp_utc: str
+    all_ok: bool
+    changed: List[str]
+    datasets: List[FetchResult]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp_utc": self.timestamp_utc,
+            "all_ok": self.all_ok,
+            "changed": self.changed,
+            "datasets": [asdict(d) for d in self.datasets],
+        }
+
+
+def _utc_now() -> str:
+    return dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _materialise(sha256: str, dest: Path) -> None:
+    """Copy a mirrored object to its registry path atomically."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".fetch-tmp")
+    shutil.copyfile(object_path(sha256), tmp)
+    os.replace(tmp, dest)
+
+
+async def fetch_dataset(
+    key: str,
+    meta: Dict[str, Any],
+    url: Optional[str],
+    entry: Dict[str, Any],
+    force: bool = False,
+    timeout: float = TIMEOUT,
+) -> FetchResult:
+    """
+    Bring one registry entry up to date. `entry` is its mirror index record and
+    is updated in place when a new object lands.
+    """
+    started = time.perf_counter()
+    dest = ROOT / meta["path"]
+
+    def result(status: str, transferred: int = 0, error: Optional[str] = None) -> FetchResult:
+        return FetchResult(
+            dataset_key=key,
+            url=url,
+            status=status,
+            sha256=entry.get("sha256"),
+            bytes_transferred=transferred,
+            path=str(dest),
+            seconds=round(time.perf_counter() - started, 3),
+            error=error,
+        )
+
+    if not url:
+        return result("skipped", error="No url configured")
+
+    PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+    part = PARTIAL_DIR / f"{key}.part"
+    part_meta_path = PARTIAL_DIR / f"{key}.part.json"
+    part_meta: Dict[str, Any] = {}
+    if part.exists() and part_meta_path.exists():
+        part_meta = json.loads(part_meta_path.read_text(encoding="utf-8"))
+        if part_meta.get("url") != url:
+            part_meta = {}
+    offset = part.stat().st_size if part_meta else 0
+
+    have_object = bool(entry.get("sha256")) and object_path(entry["sha256"]).exists()
+
+    headers: Dict[str, str] = {}
+    if offset and (part_meta.get("etag") or part_meta.get("last_modified")):
+        # Resuming: only accept the remainder of the same representation
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = part_meta.get("etag") or part_meta["last_modified"]
+    elif have_object and not force and entry.get("url") == url:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    current = url
+    for _ in range(MAX_REDIRECTS + 1):
+        resp = await http_get(current, headers, timeout)
+        if resp.status in (301, 302, 303, 307, 308) and "location" in resp.headers:
+            await resp.close()
+            current = urljoin(current, resp.headers["location"])
+            continue
+        break
+    else:
+        return result("failed", error=f"Too many redirects from {url}")
+
+    try:
+        if resp.status == 304:
+            if not dest.exists() or entry.get("materialised_sha256") != entry["sha256"]:
+                await asyncio.to_thread(_materialise, entry["sha256"], dest)
+                entry["materialised_sha256"] = entry["sha256"]
+            return result("unchanged")
+
+        if resp.status == 206:
+            content_range = resp.headers.get("content-range", "")
+            start = int(content_range.split()[1].split("-")[0]) if content_range else -1
+            if start != offset:
+                raise FetchError(f"Server resumed at byte {start}, expected {offset}")
+            hasher = await asyncio.to_thread(sha256_file, part)
+            mode = "ab"
+            status = "resumed"
+        elif resp.status == 200:
+            hasher = hashlib.sha256()
+            offset = 0
+            mode = "wb"
+            status = "downloaded"
+            part_meta = {
+                "url": url,
+                "etag": resp.headers.get("etag"),
+                "last_modified": resp.headers.get("last-modified"),
+            }
+            part_meta_path.write_text(json.dumps(part_meta), encoding="utf-8")
+        else:
+            raise FetchError(f"HTTP {resp.status} {resp.reason} from {current}")
+
+        transferred = 0
+        with part.open(mode) as f:
+            async for chunk in resp.iter_body():
+                f.write(chunk)
+                hasher.update(chunk)
+                transferred += len(chunk)
+    except (FetchError, OSError, asyncio.TimeoutError) as exc:
+        return result("failed", error=str(exc))
+    finally:
+        await resp.close()
+
+    sha256 = hasher.hexdigest()
+    expected = meta.get("sha256")
+    if expected and expected.lower() != sha256:
+        part.unlink(missing_ok=True)
+        part_meta_path.unlink(missing_ok=True)
+        return result(
+            "failed", transferred, error=f"Checksum mismatch: expected {expected}, got {sha256}"
+        )
+
+    obj = object_path(sha256)
+    obj.parent.mkdir(parents=True, exist_ok=True)
+    if obj.exists():
+        part.unlink()
+    else:
+        os.replace(part, obj)
+    part_meta_path.unlink(missing_ok=True)
+
+    validators = {"etag": part_meta.get("etag"), "last_modified": part_meta.get("last_modified")}
+    if sha256 == entry.get("materialised_sha256") and dest.exists():
+        # Server ignored our validators but the bytes are identical
+        entry.update(url=url, **validators)
+        return result("unchanged", transferred)
+
+    entry.update(
+        {
+            "url": url,
+            **validators,
+            "sha256": sha256,
+            "size": obj.stat().st_size,
+            "fetched_utc": _utc_now(),
+        }
+    )
+
+    await asyncio.to_thread(_materialise, sha256, dest)
+    entry["materialised_sha256"] = sha256
+    return result(status, transferred)
+
+
+# -------------------------------------------------------
+# Fetch all datasets
+# -------------------------------------------------------
+
+async def fetch_all(
+    registry_path: Path | None = None,
+    only: Optional[List[str]] = None,
+    base_url: Optional[str] = None,
+    force: bool = False,
+    concurrency: int = 4,
+    timeout: float = TIMEOUT,
+) -> FetchReport:
+    registry = load_registry(registry_path or REGISTRY_PATH)
+    base_url = base_url or os.environ.get(BASE_URL_ENV)
+    index = load_index()
+    before = json.dumps(index, sort_keys=True)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run_one(key: str, meta: Dict[str, Any]) -> FetchResult:
+        async with sem:
+            entry = index.setdefault(key, {})
+            try:
+                return await fetch_dataset(key, meta, resolve_url(meta, base_url), entry, force, timeout)
+            except (FetchError, OSError, asyncio.TimeoutError) as exc:
+                return FetchResult(
+                    dataset_key=key, url=resolve_url(meta, base_url), status="failed",
+                    sha256=entry.get("sha256"), bytes_transferred=0,
+                    path=str(ROOT / meta["path"]), seconds=0.0, error=str(exc) or type(exc).__name__,
+                )
+
+    keys = [k for k in registry if not only or k in only]
+    results = list(await asyncio.gather(*(run_one(k, registry[k]) for k in keys)))
+
+    index = {k: v for k, v in index.items() if v}
+    if json.dumps(index, sort_keys=True) != before:
+        save_index(index)
+
+    return FetchReport(
+        timestamp_utc=_utc_now(),
+        all_ok=all(r.status != "failed" for r in results),
+        changed=[r.dataset_key for r in results if r.status in ("downloaded", "resumed")],
+        datasets=results,
+    )
+
+
+def save_report(report: FetchReport) -> None:
+    DIAG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with DIAG_FILE.open("w", encoding="utf-8") as f:
+        json.dump(report.to_dict(), f, indent=2)
+    print(f"[FETCH] Report written to {DIAG_FILE}")
+
+
+# -------------------------------------------------------
+# CLI entrypoint
+# -------------------------------------------------------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Refresh raw datasets from upstream.")
+    parser.add_argument("datasets", nargs="*", help="Registry keys to fetch (default: all)")
+    parser.add_argument("--base-url", help=f"Mirror base URL (default: ${BASE_URL_ENV})")
+    parser.add_argument("--registry", type=Path, help="Alternative datasets.yaml")
+    parser.add_argument("--force", action="store_true", help="Ignore ETag/Last-Modified")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT,
+                        help=f"Seconds any network read may stall (default {TIMEOUT:g})")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = asyncio.run(
+        fetch_all(
+            registry_path=args.registry,
+            only=args.datasets or None,
+            base_url=args.base_url,
+            force=args.force,
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+        )
+    )
+    save_report(report)
+    print("=== Fetch Summary ===")
+    for r in report.datasets:
+        extra = f" | {r.error}" if r.error else ""
+        print(f"[{r.dataset_key}] {r.status} | {r.bytes_transferred} bytes | {r.seconds}s{extra}")
+    return 0 if report.all_ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
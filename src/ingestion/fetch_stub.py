@@ -0,0 +1,238 @@
+"""
+JTIS – fetcher stub server
+Local HTTP server for exercising src/ingestion/fetch.py without the network.
+
+- Serves in-memory files with a strong ETag (sha256 of the body)
+- Answers If-None-Match with 304, and Range (with or without a matching
+  If-Range) with 206 and a Content-Range; a stale If-Range gets the full 200
+- Paths listed in `stall` send their headers and half the body, then hang
+  until the server stops
+
+`--check` runs the fetcher against the stub in a temporary mirror and
+asserts the 200 → 304 round trip, a Range/If-Range resume, a full re-download
+when the representation changed under a partial download, a checksum mismatch
+and a stalled body hitting the read timeout. It touches nothing under data/.
+
+Run with: python src/ingestion/fetch_stub.py --check
+          python src/ingestion/fetch_stub.py --serve DIR [--port 8765]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+# -------------------------------------------------------
+# Server
+# -------------------------------------------------------
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, files: Dict[str, bytes], port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.files = files
+        self.stall: Set[str] = set()
+        self.requests: List[Tuple[str, Dict[str, str]]] = []
+        self.stopping = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:
+        path = self.path.lstrip("/")
+        self.server.requests.append((path, {k.lower(): v for k, v in self.headers.items()}))
+        body = self.server.files.get(path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = self.server.etag(body)
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        rng = self.headers.get("Range", "")
+        if rng.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+            start = int(rng[len("bytes="):].split("-")[0])
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - start))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+
+        if path in self.server.stall:
+            self.wfile.write(body[start:start + (len(body) - start) // 2])
+            self.wfile.flush()
+            self.server.stopping.wait()
+            return
+        self.wfile.write(body[start:])
+
+
+@contextlib.contextmanager
+def serve(files: Dict[str, bytes], port: int = 0) -> Iterator[StubServer]:
+    server = StubServer(files, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+# -------------------------------------------------------
+# Check
+# -------------------------------------------------------
+
+@contextlib.contextmanager
+def _mirror(tmp: Path) -> Iterator[None]:
+    """Point the fetcher's mirror at `tmp` for the duration."""
+    from src.ingestion import fetch
+
+    names = ("MIRROR_DIR", "OBJECTS_DIR", "PARTIAL_DIR", "INDEX_PATH")
+    saved = {n: getattr(fetch, n) for n in names}
+    fetch.MIRROR_DIR = tmp / "mirror"
+    fetch.OBJECTS_DIR = fetch.MIRROR_DIR / "objects"
+    fetch.PARTIAL_DIR = fetch.MIRROR_DIR / "partial"
+    fetch.INDEX_PATH = fetch.MIRROR_DIR / "index.json"
+    try:
+        yield
+    finally:
+        for n, v in saved.items():
+            setattr(fetch, n, v)
+
+
+def check() -> int:
+    import json
+
+    from src.ingestion import fetch
+
+    body = bytes(range(256)) * 4096  # 1 MiB
+    files = {"data.bin": body, "stall.bin": body}
+    failures: List[str] = []
+
+    def expect(label: str, ok: bool, detail: object = "") -> None:
+        print(f"[FETCH_STUB] {'ok  ' if ok else 'FAIL'} {label}" + (f": {detail}" if not ok else ""))
+        if not ok:
+            failures.append(label)
+
+    with tempfile.TemporaryDirectory() as tmpdir, serve(files) as server, _mirror(Path(tmpdir)):
+        tmp = Path(tmpdir)
+        dest = tmp / "raw" / "data.bin"
+        meta = {"path": str(dest)}
+        url = server.base_url + "data.bin"
+        entry: Dict[str, Any] = {}
+
+        def run():
+            return asyncio.run(fetch.fetch_dataset("data", meta, url, entry, timeout=5.0))
+
+        r = run()
+        expect("200 download", r.status == "downloaded" and dest.read_bytes() == body, r)
+
+        mtime = dest.stat().st_mtime_ns
+        r = run()
+        sent = server.requests[-1][1]
+        expect("304 unchanged", r.status == "unchanged" and r.bytes_transferred == 0
+               and "if-none-match" in sent and dest.stat().st_mtime_ns == mtime, r)
+
+        # Interrupted first download of the current representation: resumed
+        # with If-Range
+        entry.clear()
+        dest.unlink()
+        half = len(body) // 2
+        fetch.PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+        (fetch.PARTIAL_DIR / "data.part").write_bytes(body[:half])
+        (fetch.PARTIAL_DIR / "data.part.json").write_text(
+            json.dumps({"url": url, "etag": server.etag(body), "last_modified": None})
+        )
+        r = run()
+        sent = server.requests[-1][1]
+        expect("206 resume", r.status == "resumed" and r.bytes_transferred == len(body) - half
+               and dest.read_bytes() == body and sent.get("range") == f"bytes={half}-"
+               and sent.get("if-range") == server.etag(body), r)
+
+        # Upstream changed under a partial download: the stale If-Range gets a full 200
+        files["data.bin"] = new = body[::-1]
+        (fetch.PARTIAL_DIR / "data.part").write_bytes(body[:half])
+        (fetch.PARTIAL_DIR / "data.part.json").write_text(
+            json.dumps({"url": url, "etag": server.etag(body), "last_modified": None})
+        )
+        r = run()
+        expect("If-Range mismatch → full 200", r.status == "downloaded" and r.bytes_transferred == len(new)
+               and dest.read_bytes() == new, r)
+
+        # A registry checksum the bytes do not match: nothing lands
+        entry.clear()
+        r = asyncio.run(fetch.fetch_dataset("bad", {"path": str(tmp / "raw" / "bad.bin"), "sha256": "0" * 64},
+                                            url, entry, force=True, timeout=5.0))
+        expect("checksum mismatch", r.status == "failed" and "Checksum mismatch" in (r.error or "")
+               and not (tmp / "raw" / "bad.bin").exists(), r)
+
+        server.stall.add("stall.bin")
+        entry.clear()
+        r = asyncio.run(fetch.fetch_dataset("stall", {"path": str(tmp / "raw" / "stall.bin")},
+                                            server.base_url + "stall.bin", entry, timeout=0.5))
+        expect("stalled body times out", r.status == "failed" and "No data" in (r.error or ""), r)
+
+    print(f"[FETCH_STUB] {'All checks passed' if not failures else f'{len(failures)} check(s) failed'}")
+    return 1 if failures else 0
+
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stub HTTP server for the dataset fetcher.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--check", action="store_true", help="Run the fetcher checks against the stub")
+    mode.add_argument("--serve", type=Path, metavar="DIR", help="Serve the files in DIR")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return check()
+    files = {p.name: p.read_bytes() for p in args.serve.iterdir() if p.is_file()}
+    with serve(files, args.port) as server:
+        print(f"[FETCH_STUB] Serving {len(files)} files on {server.base_url} (Ctrl-C to stop)")
+        with contextlib.suppress(KeyboardInterrupt):
+            server.stopping.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -47,8 +47,7 @@ def load_dft_fuel(path: str | Path) -> pd.DataFrame:
         df["fuel_ktoe"] = df[numeric_cols].sum(axis=1)
 
         # Keep only LAD code + year + fuel_ktoe
-        cleaned = df[[lad_code_col, "fuel_ktoe"]].copy()
-        cleaned = cleaned.rename(columns={lad_code_col: "lad_code"})
+        cleaned = df[[lad_code_col, "fuel_ktoe"]].rename(columns={lad_code_col: "lad_code"})
 
         cleaned["year"] = int(year)
 
@@ -0,0 +1,391 @@
+"""
+JTIS – data lineage
+Which raw rows fed each LA–year of the base table, recorded stage by stage.
+
+- Each stage that reshapes rows saves one record to data/processed/lineage/
+  <stage>.npz: fingerprints (sha256, size) of the files it read and wrote,
+  the sheet layout of raw inputs, the aggregation it applied, the keys of its
+  output rows and, per input, a CSR row map from each output row to the input
+  rows that fed it (indptr plus int32 row ids). No data values are copied and
+  the arrays are stored zlib-compressed
+- Row ids are 0-based data rows of the table as read, after the header; in a
+  sheet without blank rows the spreadsheet row is skiprows + 2 + id
+- Ingest stages record the raw file and, for DfT, which rows of the
+  concatenated table came from which sheet; canonical stages map their rows
+  to processed (DESNZ, DfT) or raw (ONS, IMD) rows; compose maps each base row
+  to its row in every canonical table
+- trace(lad_code, year) walks the records back from the base table and marks
+  a source stale when a file it went through has changed since, or no longer
+  matches what the stage before wrote
+
+    python src/lineage.py E06000001 2019 [--values] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+LINEAGE_DIR = ROOT / "data" / "processed" / "lineage"
+FINGERPRINTS_FILE = LINEAGE_DIR / "fingerprints.json"
+
+# Sources of the base table and the stage that reads each one's raw file
+SOURCES = ("desnz", "dft", "ons", "imd")
+
+
+def _rel(path: Path) -> str:
+    path = Path(path)
+    try:
+        return path.resolve().relative_to(ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+# -------------------------------------------------------
+# File fingerprints
+# -------------------------------------------------------
+
+def _read_fingerprints() -> Dict[str, Any]:
+    try:
+        return json.loads(FINGERPRINTS_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def fingerprint(path: Path) -> Dict[str, Any]:
+    """{path, sha256, size} of a file. Hashes are cached by (size, mtime), so a
+    file is hashed once per change however many stages fingerprint it.
+
+    Stages run in parallel worker processes (shards, nations), so the cache is
+    re-read right before it is written and replaced atomically: a reader never
+    sees a truncated file, and a lost concurrent update only costs a re-hash."""
+    from src.ingestion.fetch import sha256_file
+
+    path = Path(path)
+    st = path.stat()
+    rel = _rel(path)
+    hit = _read_fingerprints().get(rel)
+    if hit is None or hit["size"] != st.st_size or hit["mtime_ns"] != st.st_mtime_ns:
+        hit = {"sha256": sha256_file(path).hexdigest(), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        cache = _read_fingerprints()
+        cache[rel] = hit
+        LINEAGE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = FINGERPRINTS_FILE.with_name(f"{FINGERPRINTS_FILE.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, FINGERPRINTS_FILE)
+    return {"path": rel, "sha256": hit["sha256"], "size": hit["size"]}
+
+
+def sheet_ranges(sheets: Sequence[Any], skiprows: int = 0) -> List[Dict[str, Any]]:
+    """Row ranges of consecutive runs of equal sheet labels (one per row of a
+    table concatenated from several sheets)."""
+    labels = np.asarray(sheets, dtype=object)
+    if not len(labels):
+        return []
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    stops = np.r_[starts[1:], len(labels)]
+    return [
+        {"sheet": str(labels[a]), "start": int(a), "stop": int(b), "skiprows": skiprows}
+        for a, b in zip(starts, stops)
+    ]
+
+
+# -------------------------------------------------------
+# Row maps
+# -------------------------------------------------------
+
+def _key(values: Any) -> np.ndarray:
+    """Key column as int64 (years) or str (codes), so tables read from
+    different files compare equal."""
+    a = np.asarray(values)
+    if a.dtype.kind in "iub":
+        return a.astype(np.int64)
+    if a.dtype.kind == "f":
+        return np.where(np.isfinite(a), a, -1).astype(np.int64)
+    return a.astype(str)
+
+
+def _index(keys: Sequence[Any]):
+    import pandas as pd
+
+    cols = [_key(k) for k in keys]
+    return pd.Index(cols[0]) if len(cols) == 1 else pd.MultiIndex.from_arrays(cols)
+
+
+@dataclass(frozen=True)
+class RowMap:
+    """Output row i was fed by input rows indices[indptr[i]:indptr[i + 1]]."""
+
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def rows(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    @classmethod
+    def from_keys(
+        cls,
+        in_keys: Sequence[Any],
+        out_keys: Sequence[Any],
+        rows: Optional[np.ndarray] = None,
+    ) -> "RowMap":
+        """Map each output row to the input rows sharing its key. Output keys
+        must be unique; `rows` is the input row id behind each key row
+        (default 0..n-1, or e.g. repeated ids for a melted wide table). Input
+        rows matching no output row (filtered out upstream) are dropped."""
+        target = _index(out_keys).get_indexer(_index(in_keys))
+        ids = np.arange(len(target)) if rows is None else np.asarray(rows)
+        keep = target >= 0
+        target, ids = target[keep], ids[keep]
+        order = np.argsort(target, kind="stable")
+        counts = np.bincount(target, minlength=len(out_keys[0]))
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(indptr, ids[order].astype(np.int32))
+
+    @classmethod
+    def lookup(cls, in_keys: Sequence[Any], out_keys: Sequence[Any]) -> "RowMap":
+        """Map each output row to the one input row with its key (input keys
+        unique, as in a join); output rows without a match map to nothing."""
+        hit = _index(in_keys).get_indexer(_index(out_keys))
+        indptr = np.concatenate([[0], np.cumsum(hit >= 0)]).astype(np.int64)
+        return cls(indptr, hit[hit >= 0].astype(np.int32))
+
+
+def runs(ids: np.ndarray) -> List[List[int]]:
+    """Sorted ids as inclusive [first, last] runs of consecutive values."""
+    ids = np.unique(ids)
+    if not len(ids):
+        return []
+    breaks = np.flatnonzero(np.diff(ids) != 1)
+    starts = np.r_[ids[0], ids[breaks + 1]]
+    ends = np.r_[ids[breaks], ids[-1]]
+    return [[int(a), int(b)] for a, b in zip(starts, ends)]
+
+
+# -------------------------------------------------------
+# Stage records
+# -------------------------------------------------------
+
+@dataclass
+class Record:
+    stage: str
+    meta: Dict[str, Any]
+    keys: Dict[str, np.ndarray] = field(default_factory=dict)
+    maps: Dict[str, RowMap] = field(default_factory=dict)
+
+    @staticmethod
+    def path_for(stage: str) -> Path:
+        return LINEAGE_DIR / f"{stage}.npz"
+
+    def save(self) -> Path:
+        arrays: Dict[str, np.ndarray] = {"meta": np.array(json.dumps(self.meta, default=str))}
+        for name, values in self.keys.items():
+            arrays[f"key.{name}"] = _key(values)
+        for name, m in self.maps.items():
+            arrays[f"map.{name}.indptr"] = m.indptr
+            arrays[f"map.{name}.indices"] = m.indices
+        path = self.path_for(self.stage)
+        LINEAGE_DIR.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, **arrays)
+        n_ids = sum(len(m.indices) for m in self.maps.values())
+        print(f"[LINEAGE] {self.stage}: {n_ids} row ids → {_rel(path)}")
+        return path
+
+    @classmethod
+    def load(cls, stage: str) -> "Record":
+        path = cls.path_for(stage)
+        if not path.exists():
+            raise FileNotFoundError(f"[LINEAGE] No lineage for stage {stage!r}; run it first ({path})")
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            keys = {k[4:]: z[k] for k in z.files if k.startswith("key.")}
+            names = {k.split(".")[1] for k in z.files if k.startswith("map.")}
+            maps = {n: RowMap(z[f"map.{n}.indptr"], z[f"map.{n}.indices"]) for n in names}
+        return cls(stage, meta, keys, maps)
+
+    def find(self, **key: Any) -> Optional[int]:
+        """Position of the output row with these key values, if any."""
+        hit = np.ones(len(next(iter(self.keys.values()))), dtype=bool)
+        for name, value in key.items():
+            hit &= self.keys[name] == _key([value])[0]
+        pos = np.flatnonzero(hit)
+        return int(pos[0]) if len(pos) else None
+
+
+# -------------------------------------------------------
+# Queries
+# -------------------------------------------------------
+
+def _stale(read: Optional[Mapping[str, Any]], written: Optional[Mapping[str, Any]]) -> bool:
+    return bool(read and written and read.get("sha256") != written.get("sha256"))
+
+
+def _changed(recorded: Optional[Mapping[str, Any]]) -> bool:
+    """The file has changed on disk since the record was made."""
+    if not recorded or not (ROOT / recorded["path"]).exists():
+        return False
+    return _stale(recorded, fingerprint(ROOT / recorded["path"]))
+
+
+def _raw_values(source: Mapping[str, Any], sheet: Mapping[str, Any], local: np.ndarray, columns: List[str]):
+    import pandas as pd
+
+    path = ROOT / source["path"]
+    if sheet.get("sheet") is None:
+        wanted = set((local + 1).tolist())
+        df = pd.read_csv(path, skiprows=lambda i: i > 0 and i not in wanted)
+    else:
+        df = pd.read_excel(path, sheet_name=sheet["sheet"], skiprows=sheet.get("skiprows", 0)).iloc[local]
+    df.columns = [str(c).strip() for c in df.columns]
+    keep = [c for c in df.columns if c in columns or "code" in c.lower() or "name" in c.lower()]
+    return json.loads(df[keep or list(df.columns)].to_json(orient="records"))
+
+
+def _input(rec: Record, row: int) -> tuple:
+    """The source description (meta) and input row ids behind output row
+    `row`. A stage with one source per nation (IMD) keeps a row map per
+    nation; the row's LAD is in exactly one of them."""
+    for src in rec.meta.get("nations", {}).values():
+        ids = rec.maps[src["map"]].rows(row)
+        if len(ids):
+            return src, ids
+    if "input" in rec.maps:
+        return rec.meta, rec.maps["input"].rows(row)
+    return rec.meta, np.zeros(0, dtype=np.int32)
+
+
+def _raw_rows(meta: Mapping[str, Any], ids: np.ndarray, columns: List[str], values: bool) -> Dict[str, Any]:
+    """Raw file, sheets and row runs behind row ids of the table a stage
+    (its record meta, or one nation's source in it) read."""
+    out: Dict[str, Any] = {}
+    if "upstream" in meta:
+        origin = Record.load(meta["upstream"]).meta
+        out["stale"] = _stale(meta.get("input"), origin.get("output"))
+        meta = origin
+    if "source" not in meta:
+        return {**out, "file": None, "sha256": None, "sheets": []}
+    source = meta["source"]
+    out["stale"] = out.get("stale", False) or _changed(source)
+    out["file"] = source["path"]
+    out["sha256"] = source["sha256"]
+    out["sheets"] = []
+    for sheet in meta["sheets"]:
+        local = ids[(ids >= sheet["start"]) & (ids < sheet["stop"])] - sheet["start"]
+        if not len(local):
+            continue
+        first = sheet.get("skiprows", 0) + 2
+        entry = {
+            "sheet": sheet["sheet"],
+            "data_rows": runs(local),
+            "file_rows": [[a + first, b + first] for a, b in runs(local)],
+        }
+        if values:
+            entry["values"] = _raw_values(source, sheet, np.sort(local), columns)
+        out["sheets"].append(entry)
+    return out
+
+
+def trace(lad_code: str, year: int, values: bool = False) -> Dict[str, Any]:
+    """Every raw row behind the base-table row (lad_code, year), per source.
+    With `values`, the raw rows are read back from the source files."""
+    base = Record.load("compose")
+    i = base.find(lad_code=lad_code, year=year)
+    if i is None:
+        raise KeyError(f"[LINEAGE] {lad_code} {year} is not in the base table")
+
+    result: Dict[str, Any] = {"lad_code": lad_code, "year": int(year), "sources": {}}
+    for src in SOURCES:
+        if src not in base.maps:
+            continue
+        rows = base.maps[src].rows(i)
+        if not len(rows):
+            result["sources"][src] = {
+                "measures": base.meta["measures"].get(src, []),
+                "canonical_row": None,
+                "note": "not reported by the source; imputed (see jtis_imputed_cells.csv)",
+            }
+            continue
+        rec = Record.load(f"{src}_canonical")
+        row = int(rows[0])
+        meta, ids = _input(rec, row)
+        columns = [c.format(year=year) for c in meta.get("columns", [])]
+        entry: Dict[str, Any] = {
+            "measures": base.meta["measures"].get(src, []),
+            "canonical": base.meta["inputs"][src]["path"],
+            "canonical_row": row,
+            "stale": _stale(base.meta["inputs"][src], rec.meta.get("output"))
+            or _changed(base.meta["inputs"][src]),
+            "aggregation": meta.get("aggregation"),
+            "columns": columns,
+        }
+        if "index" in meta:
+            entry["index"] = meta["index"]
+        raw = _raw_rows(meta, ids, columns, values)
+        entry["stale"] = raw.pop("stale", False) or entry["stale"]
+        entry.update(raw)
+        entry["n_rows"] = int(len(ids))
+        result["sources"][src] = entry
+    return result
+
+
+def _print(result: Dict[str, Any]) -> None:
+    print(f"{result['lad_code']} {result['year']}")
+    for src, e in result["sources"].items():
+        if e["canonical_row"] is None:
+            print(f"\n  {src}: {e['note']}")
+            continue
+        flag = "  [STALE: re-run the pipeline]" if e["stale"] else ""
+        print(f"\n  {src}: {e['canonical']} row {e['canonical_row']}{flag}")
+        print(f"    measures:    {', '.join(e['measures'])}")
+        print(f"    aggregation: {e['aggregation']}")
+        if e["columns"]:
+            print(f"    columns:     {', '.join(e['columns'])}")
+        if e["file"] is None:
+            print("    raw file:    none recorded for this LAD")
+            continue
+        index = f"{e['index']}, " if "index" in e else ""
+        print(f"    raw file:    {e['file']} ({index}sha256 {e['sha256'][:12]}…), rows: {e['n_rows']}")
+        for s in e["sheets"]:
+            label = "csv" if s["sheet"] is None else f"sheet {s['sheet']}"
+            spans = ", ".join(f"{a}" if a == b else f"{a}–{b}" for a, b in s["file_rows"])
+            print(f"      {label}: rows {spans}")
+            for v in s.get("values", []):
+                print(f"        {v}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Trace a base-table LA–year back to its raw rows")
+    parser.add_argument("lad_code")
+    parser.add_argument("year", type=int)
+    parser.add_argument("--values", action="store_true", help="Read the raw rows back from the source files")
+    parser.add_argument("--json", action="store_true", help="Print the trace as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        result = trace(args.lad_code, args.year, values=args.values)
+    except (KeyError, FileNotFoundError) as exc:
+        print(exc.args[0] if exc.args else exc, file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+    else:
+        _print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+"""
+JTIS – copy-on-write execution mode
+Harmonisation and scoring take ownership of the frames they are given instead
+of defensively deep-copying them.
+
+- pandas copy-on-write is switched on when this module is imported (always on
+  from pandas 3; set JTAP_COPY_ON_WRITE=0 to opt out on pandas 2)
+- owned(df) returns a frame a function may add or overwrite columns on
+  without touching the caller's frame: a shallow copy under copy-on-write,
+  a deep copy otherwise
+- Peak-RSS helpers for src/pipeline/memcheck.py
+"""
+
+from __future__ import annotations
+
+import os
+import resource
+import sys
+
+import pandas as pd
+
+
+COW_ENV = "JTAP_COPY_ON_WRITE"
+_PANDAS_MAJOR = int(pd.__version__.split(".")[0])
+
+
+def copy_on_write_enabled() -> bool:
+    if _PANDAS_MAJOR >= 3:
+        return True
+    return pd.options.mode.copy_on_write is True
+
+
+def enable_copy_on_write() -> None:
+    if _PANDAS_MAJOR < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def owned(df: pd.DataFrame) -> pd.DataFrame:
+    """A frame the caller may modify without affecting `df`."""
+    return df.copy(deep=not copy_on_write_enabled())
+
+
+if os.environ.get(COW_ENV, "1") != "0":
+    enable_copy_on_write()
+
+
+# -------------------------------------------------------
+# Resident memory
+# -------------------------------------------------------
+
+def _proc_status_kb(field: str) -> int | None:
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb() -> float:
+    kb = _proc_status_kb("VmRSS")
+    return kb / 1024.0 if kb is not None else peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    kb = _proc_status_kb("VmHWM")
+    if kb is None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        kb = maxrss // 1024 if sys.platform == "darwin" else maxrss
+    return kb / 1024.0
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak-RSS high-water mark (Linux only). Returns False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
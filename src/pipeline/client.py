@@ -0,0 +1,118 @@
+"""
+JTIS – daemon client
+Thin client for the warm pipeline daemon (src/pipeline/daemon.py).
+
+Imports nothing beyond the standard library, so a request costs an interpreter
+start plus one local socket round trip; the daemon already has pandas loaded and
+the canonical tables parsed.
+
+    python src/pipeline/client.py run score snapshot
+    python src/pipeline/client.py run --downstream compose
+    python src/pipeline/client.py status | invalidate | shutdown
+    python src/pipeline/client.py --spawn run score   # start the daemon if needed
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[2]
+RUNTIME_DIR = ROOT / ".jtap"
+SOCKET_PATH = RUNTIME_DIR / "daemon.sock"
+LOG_PATH = RUNTIME_DIR / "daemon.log"
+
+
+class DaemonUnavailable(ConnectionError):
+    pass
+
+
+def request(payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Send one JSON request and return the JSON reply."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(SOCKET_PATH))
+    except (FileNotFoundError, ConnectionRefusedError) as exc:
+        sock.close()
+        raise DaemonUnavailable(f"No daemon listening on {SOCKET_PATH}") from exc
+
+    with sock:
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    if not buf:
+        raise DaemonUnavailable("Daemon closed the connection without replying")
+    return json.loads(buf)
+
+
+def spawn_daemon(wait: float = 30.0) -> None:
+    """Start the daemon in the background and wait until it answers."""
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    with LOG_PATH.open("ab") as log:
+        subprocess.Popen(
+            [sys.executable, str(ROOT / "src" / "pipeline" / "daemon.py")],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True,
+            cwd=str(ROOT),
+        )
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            request({"cmd": "status"}, timeout=1.0)
+            return
+        except DaemonUnavailable:
+            time.sleep(0.05)
+    raise DaemonUnavailable(f"Daemon did not come up within {wait}s; see {LOG_PATH}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Talk to the JTIS pipeline daemon.")
+    parser.add_argument("--spawn", action="store_true", help="Start the daemon if it is not running")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="Run stages in the daemon")
+    run.add_argument("stages", nargs="+")
+    run.add_argument("--downstream", action="store_true", help="Also run dependent stages")
+    sub.add_parser("status")
+    sub.add_parser("invalidate", help="Drop the daemon's table cache")
+    sub.add_parser("shutdown")
+    args = parser.parse_args(argv)
+
+    payload: Dict[str, Any] = {"cmd": args.cmd}
+    if args.cmd == "run":
+        payload.update(stages=args.stages, downstream=args.downstream)
+
+    try:
+        reply = request(payload)
+    except DaemonUnavailable as exc:
+        if not args.spawn or args.cmd == "shutdown":
+            print(f"[CLIENT] {exc}. Start it with: python src/pipeline/daemon.py", file=sys.stderr)
+            return 2
+        spawn_daemon()
+        reply = request(payload)
+
+    if reply.get("output"):
+        sys.stdout.write(reply["output"])
+    for r in reply.get("results", []):
+        status = "ok" if r["ok"] else f"FAILED {r['error']}"
+        print(f"[CLIENT] {r['name']:<16} {r['seconds']:6.2f}s  {status}")
+    for key in ("status", "error"):
+        if key in reply:
+            print(json.dumps(reply[key], indent=2) if key == "status" else f"[CLIENT] {reply[key]}")
+    return 0 if reply.get("ok") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
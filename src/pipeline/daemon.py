@@ -0,0 +1,216 @@
+"""
+JTIS – warm pipeline daemon
+Keeps one interpreter alive with pandas, numpy, yaml, openpyxl and the stage
+modules imported, and parsed tables held in a shared TableCache, then executes
+stage requests from src/pipeline/client.py over a local Unix socket.
+
+- Requests are newline-delimited JSON: run / status / invalidate / shutdown
+- Stage runs are serialised (they write shared files) and execute off the
+  event loop, so status requests are answered while a run is in progress
+- Stage output printed during a run is captured and returned to the client:
+  sys.stdout is replaced once by a router that sends writes from the thread
+  running the stages to that run's buffer and everything else (the event
+  loop, other threads) to the daemon's own stdout
+- src/ modules edited since the last run are reloaded before the next one
+
+Run with: python src/pipeline/daemon.py  (or client.py --spawn)
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.pipeline.client import RUNTIME_DIR, SOCKET_PATH, DaemonUnavailable, request  # noqa: E402
+from src.pipeline.stages import STAGES, TableCache, downstream, run_stages  # noqa: E402
+from src.pipeline.watch import reload_changed  # noqa: E402
+
+SRC_DIR = ROOT / "src"
+
+
+def _src_state() -> Dict[Path, int]:
+    return {p: p.stat().st_mtime_ns for p in SRC_DIR.rglob("*.py")}
+
+
+class ThreadStdout:
+    """sys.stdout stand-in: writes from a thread inside capture() go to its
+    buffer, all other writes to the wrapped stream."""
+
+    def __init__(self, stream: Any) -> None:
+        self._stream = stream
+        self._local = threading.local()
+
+    @classmethod
+    def install(cls) -> "ThreadStdout":
+        if not isinstance(sys.stdout, cls):
+            sys.stdout = cls(sys.stdout)
+        return sys.stdout
+
+    def write(self, s: str) -> int:
+        return (getattr(self._local, "buf", None) or self._stream).write(s)
+
+    def flush(self) -> None:
+        if getattr(self._local, "buf", None) is None:
+            self._stream.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+    @contextlib.contextmanager
+    def capture(self):
+        buf = io.StringIO()
+        self._local.buf = buf
+        try:
+            yield buf
+        finally:
+            self._local.buf = None
+
+
+class PipelineDaemon:
+    def __init__(self) -> None:
+        self.cache = TableCache()
+        self.started = time.time()
+        self.runs = 0
+        self._lock = asyncio.Lock()
+        self._src = _src_state()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stdout = ThreadStdout.install()
+
+    # ----------------------------
+    # Warm-up
+    # ----------------------------
+    def warm(self) -> None:
+        """Import heavy dependencies and every stage module once."""
+        import importlib
+
+        import numpy  # noqa: F401
+        import openpyxl  # noqa: F401
+        import pandas  # noqa: F401
+        import yaml  # noqa: F401
+
+        for stage in STAGES:
+            for mod in stage.modules:
+                try:
+                    importlib.import_module(mod)
+                except Exception as exc:
+                    print(f"[DAEMON] Could not preload {mod}: {exc!r}")
+
+    # ----------------------------
+    # Commands
+    # ----------------------------
+    def _run_blocking(self, names: List[str]) -> Dict[str, Any]:
+        current = _src_state()
+        edited = [p for p, m in current.items() if self._src.get(p) != m]
+        self._src = current
+        reloaded = reload_changed(edited, names) if edited else []
+
+        # Runs are serialised by self._lock; capture() only sees this thread
+        with self._stdout.capture() as buf:
+            results = run_stages(names, self.cache)
+        self.runs += 1
+        return {
+            "ok": all(r.ok for r in results),
+            "reloaded": reloaded,
+            "output": buf.getvalue(),
+            "results": [r.__dict__ for r in results],
+        }
+
+    async def handle_request(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = req.get("cmd")
+        if cmd == "status":
+            return {
+                "ok": True,
+                "status": {
+                    "pid": os.getpid(),
+                    "uptime_s": round(time.time() - self.started, 1),
+                    "runs": self.runs,
+                    "busy": self._lock.locked(),
+                    "cached_tables": len(self.cache),
+                    "cache_hits": self.cache.hits,
+                    "cache_misses": self.cache.misses,
+                },
+            }
+        if cmd == "invalidate":
+            self.cache.invalidate()
+            return {"ok": True}
+        if cmd == "shutdown":
+            asyncio.get_running_loop().call_soon(self._server.close)
+            return {"ok": True}
+        if cmd == "run":
+            try:
+                names = list(req.get("stages") or [])
+                if req.get("downstream"):
+                    names = downstream(names)
+                else:
+                    downstream(names)  # validates names
+            except KeyError as exc:
+                return {"ok": False, "error": str(exc)}
+            async with self._lock:
+                return await asyncio.to_thread(self._run_blocking, names)
+        return {"ok": False, "error": f"Unknown command: {cmd!r}"}
+
+    async def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await reader.readline()
+            try:
+                reply = await self.handle_request(json.loads(line))
+            except json.JSONDecodeError as exc:
+                reply = {"ok": False, "error": f"Bad request: {exc}"}
+            writer.write(json.dumps(reply, default=str).encode("utf-8") + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # ----------------------------
+    # Serve
+    # ----------------------------
+    async def serve(self) -> None:
+        RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+        try:
+            request({"cmd": "status"}, timeout=1.0)
+            raise SystemExit(f"[DAEMON] Already running on {SOCKET_PATH}")
+        except DaemonUnavailable:
+            SOCKET_PATH.unlink(missing_ok=True)  # stale socket from a dead daemon
+
+        self._server = await asyncio.start_unix_server(self._on_client, path=str(SOCKET_PATH))
+        print(f"[DAEMON] Listening on {SOCKET_PATH} (pid {os.getpid()})", flush=True)
+        try:
+            async with self._server:
+                await self._server.wait_closed()
+        finally:
+            SOCKET_PATH.unlink(missing_ok=True)
+            print("[DAEMON] Stopped.", flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Warm JTIS pipeline daemon.")
+    parser.add_argument("--no-warm", action="store_true", help="Skip preloading modules")
+    args = parser.parse_args(argv)
+
+    daemon = PipelineDaemon()
+    if not args.no_warm:
+        t0 = time.perf_counter()
+        daemon.warm()
+        print(f"[DAEMON] Warmed up in {time.perf_counter() - t0:.2f}s", flush=True)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
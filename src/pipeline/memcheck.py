@@ -0,0 +1,260 @@
+"""
+JTIS – memory regression check
+Runs the in-memory harmonisation and scoring steps on synthetic inputs scaled
+up from the real LAD panel and records, per step, how far resident memory
+rises above its starting point.
+
+- A step's working copy is the larger of its inputs and its output; a step
+  whose peak exceeds `budget` working copies fails the check
+- Peak RSS comes from /proc/self/status (VmHWM), reset before every step, so
+  this is Linux-only; freed heap is returned to the OS between steps
+- Results go to outputs/diagnostics/memcheck_report.json; exit code 1 when a
+  step is over budget
+- --areas-per-lad N adds the small-area apportioning step
+  (src/harmonisation/small_areas.py) and scores the small-area panel; about
+  115 per LAD is the LSOA panel at scale 1
+
+Run with: python src/pipeline/memcheck.py --scale 100 [--areas-per-lad 115]
+"""
+
+from __future__ import annotations
+
+import argparse
+import ctypes
+import ctypes.util
+import datetime as dt
+import gc
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# pyarrow (pandas string columns) otherwise allocates from its own pool, which
+# keeps freed memory and hides it from RSS; must be set before pyarrow loads
+os.environ.setdefault("ARROW_DEFAULT_MEMORY_POOL", "system")
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.memory import copy_on_write_enabled, peak_rss_mb, reset_peak_rss, rss_mb  # noqa: E402
+
+DIAG_FILE = ROOT / "outputs" / "diagnostics" / "memcheck_report.json"
+
+BASE_LADS = 289
+YEARS = range(2011, 2024)
+
+
+# -------------------------------------------------------
+# Synthetic inputs
+# -------------------------------------------------------
+
+def synthetic_inputs(scale: int = 100, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """Canonical-shaped DESNZ/DfT/ONS/IMD tables for BASE_LADS × scale LADs
+    (plus ~10% rows under K codes, outside config/nations.yaml, for the
+    nations filter to drop)."""
+    rng = np.random.default_rng(seed)
+    n_eng = BASE_LADS * scale
+    n_all = n_eng + n_eng // 10
+    codes = np.array(
+        [f"E{6000000 + i:08d}" for i in range(n_eng)]
+        + [f"K{6000000 + i:08d}" for i in range(n_all - n_eng)],
+        dtype=object,
+    )
+    names = np.array([f"Area {i}" for i in range(n_all)], dtype=object)
+
+    lad = np.repeat(codes, len(YEARS))
+    name = np.repeat(names, len(YEARS))
+    year = np.tile(np.array(list(YEARS), dtype=np.int64), n_all)
+    n = lad.size
+
+    pop = rng.uniform(30_000, 1_000_000, n)
+    emissions = rng.uniform(100, 5_000, n)
+    fuel = rng.uniform(20, 800, n)
+    personal = fuel * rng.uniform(0.5, 0.8, n)
+
+    desnz = pd.DataFrame({
+        "lad_code": lad,
+        "lad_name": name,
+        "year": year,
+        "country": np.where(np.char.startswith(lad.astype(str), "E"), "England", "United Kingdom"),
+        "country_code": np.where(np.char.startswith(lad.astype(str), "E"), "E92000001", "K02000001"),
+        "region": "Synthetic",
+        "region_code": "E12000000",
+        "total_emissions_scope_ktco2": emissions,
+        "territorial_emissions_ktco2e": emissions * rng.uniform(1.0, 1.3, n),
+        "mid_year_population_thousands": pop / 1000.0,
+        "area_km2": np.repeat(rng.uniform(10, 2_000, n_all), len(YEARS)),
+    })
+    dft = pd.DataFrame({
+        "lad_code": lad,
+        "lad_name": name,
+        "year": year,
+        "total_fuel_ktoe": fuel,
+        "personal_transport_ktoe": personal,
+        "freight_transport_ktoe": fuel - personal,
+        "bioenergy_ktoe": fuel * rng.uniform(0.02, 0.06, n),
+    })
+    ons = pd.DataFrame({"lad_code": lad, "lad_name": name, "year": year, "population": pop.round()})
+    imd = pd.DataFrame({
+        "lad_code": codes,
+        "lad_name": names,
+        "imd_rank_avg": rng.uniform(1, 32_844, n_all),
+        "deprivation_pct": rng.uniform(0, 1, n_all),
+        "deprived_share": rng.uniform(0, 0.5, n_all),
+    })
+    return {"desnz": desnz, "dft": dft, "ons": ons, "imd": imd}
+
+
+def synthetic_small_areas(base: pd.DataFrame, per_lad: int, seed: int = 0) -> pd.DataFrame:
+    """A small-area table (see small_areas.build) with `per_lad` areas per
+    LAD of the base table, estimates for every other year."""
+    rng = np.random.default_rng(seed)
+    lads = pd.unique(base["lad_code"].astype(str))
+    years = np.array(list(YEARS)[::2], dtype=np.int64)
+    n_areas = len(lads) * per_lad
+    area = np.repeat(np.array([f"{c}-{k:03d}" for c in lads for k in range(per_lad)], dtype=object), len(years))
+    n = area.size
+    return pd.DataFrame({
+        "area_code": area,
+        "lad_code": np.repeat(np.repeat(lads, per_lad), len(years)),
+        "year": np.tile(years, n_areas),
+        "population": rng.uniform(1_000, 3_000, n),
+        "imd_rank_avg": np.repeat(rng.uniform(1, 32_844, n_areas), len(years)),
+        "deprivation_pct": np.repeat(rng.uniform(0, 1, n_areas), len(years)),
+        "deprived_share": np.repeat(rng.uniform(0, 1, n_areas) < 0.1, len(years)).astype(float),
+    })
+
+
+# -------------------------------------------------------
+# Measurement
+# -------------------------------------------------------
+
+def frame_mb(df: pd.DataFrame) -> float:
+    return float(df.memory_usage(index=True, deep=True).sum()) / 2**20
+
+
+def _release_heap() -> None:
+    gc.collect()
+    libc_name = ctypes.util.find_library("c")
+    if libc_name:
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def measure(
+    name: str,
+    fn: Callable[[], pd.DataFrame],
+    inputs: List[pd.DataFrame],
+    budget: float,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    in_mb = sum(frame_mb(df) for df in inputs)
+    _release_heap()
+    if not reset_peak_rss():
+        raise OSError("Peak-RSS reset needs Linux /proc/self/clear_refs")
+    start = rss_mb()
+    out = fn()
+    peak = peak_rss_mb() - start
+    out_mb = frame_mb(out)
+    working = max(in_mb, out_mb)
+    copies = peak / working if working else float("nan")
+    row = {
+        "step": name,
+        "rows": int(len(out)),
+        "input_mb": round(in_mb, 1),
+        "output_mb": round(out_mb, 1),
+        "peak_extra_mb": round(peak, 1),
+        "working_copies": round(copies, 2),
+        "ok": bool(copies <= budget),
+    }
+    return out, row
+
+
+def run_checks(scale: int = 100, budget: float = 2.0, areas_per_lad: int = 0) -> Dict[str, Any]:
+    from src.agents.composer_agent import compose_frames
+    from src.harmonisation.harmonise import harmonise_all
+    from src.harmonisation.lad_codes import LadDictionary
+    from src.scoring.jti_scoring import compute_derived_metrics, compute_scores
+
+    inputs = synthetic_inputs(scale)
+    input_mb = sum(frame_mb(df) for df in inputs.values())
+    print(f"[MEMCHECK] Synthetic inputs at {scale}× scale: {input_mb:.1f} MB")
+
+    steps: List[Dict[str, Any]] = []
+
+    lad = LadDictionary()
+    base, row = measure("compose", lambda: compose_frames(**inputs, lad=lad)[0], list(inputs.values()), budget)
+    steps.append(row)
+    if areas_per_lad > 0:
+        from src.harmonisation.small_areas import apportion, load_config
+
+        areas = synthetic_small_areas(base, areas_per_lad)
+        measures = load_config().apportion
+        base, row = measure("apportion", lambda: apportion(base, areas, measures, lad)[0], [base, areas], budget)
+        steps.append(row)
+        del areas
+    derived, row = measure("derived_metrics", lambda: compute_derived_metrics(base), [base], budget)
+    steps.append(row)
+    del base
+    _, row = measure("scores", lambda: compute_scores(derived)[0], [derived], budget)
+    steps.append(row)
+    del derived
+
+    renamed = {
+        "df_emissions": inputs["desnz"].rename(columns={"total_emissions_scope_ktco2": "total_emissions_ktco2e"}),
+        "df_fuel": inputs["dft"].rename(columns={"total_fuel_ktoe": "fuel_ktoe"}),
+        "df_population": inputs["ons"],
+        "df_imd": inputs["imd"].rename(columns={"imd_rank_avg": "imd_mean_rank"}),
+    }
+    _, row = measure("harmonise_all", lambda: harmonise_all(**renamed), list(renamed.values()), budget)
+    steps.append(row)
+
+    return {
+        "timestamp_utc": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "scale": scale,
+        "areas_per_lad": areas_per_lad,
+        "budget_working_copies": budget,
+        "copy_on_write": copy_on_write_enabled(),
+        "pandas": pd.__version__,
+        "input_mb": round(input_mb, 1),
+        "all_ok": all(s["ok"] for s in steps),
+        "steps": steps,
+    }
+
+
+# -------------------------------------------------------
+# CLI entrypoint
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Peak-memory regression check on synthetic inputs.")
+    parser.add_argument("--scale", type=int, default=100, help="Multiple of the real LAD count")
+    parser.add_argument("--budget", type=float, default=2.0, help="Max peak, in working copies")
+    parser.add_argument("--areas-per-lad", type=int, default=0, help="Also apportion to this many small areas per LAD")
+    args = parser.parse_args(argv)
+
+    report = run_checks(scale=args.scale, budget=args.budget, areas_per_lad=args.areas_per_lad)
+
+    DIAG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with DIAG_FILE.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"[MEMCHECK] copy-on-write={report['copy_on_write']}  budget={args.budget} working copies")
+    for s in report["steps"]:
+        status = "ok" if s["ok"] else "OVER BUDGET"
+        print(
+            f"[MEMCHECK] {s['step']:<16} in {s['input_mb']:7.1f} MB  out {s['output_mb']:7.1f} MB  "
+            f"peak +{s['peak_extra_mb']:8.1f} MB  ({s['working_copies']:.2f}×)  {status}"
+        )
+    print(f"[MEMCHECK] Report written to {DIAG_FILE}")
+    return 0 if report["all_ok"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
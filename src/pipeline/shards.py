@@ -0,0 +1,308 @@
+"""
+JTIS – sharded execution
+Run harmonisation and scoring as parallel shards of whole LADs grouped by
+region (or country), with the same outputs as the serial stages.
+
+- A shard is every LAD with one value of `by` (region_code or country_code)
+  in the LAD dimension; rows of LADs the dimension does not know yet form
+  one "unassigned" shard
+- Harmonisation: each canonical builder runs per shard in a worker process
+  (every builder groups within a LAD), and the shard outputs are
+  concatenated and sorted the way the serial builder sorts them; lineage is
+  recorded against the full input as before. Deprivation is split by nation
+  already (nations.py) and runs through its adapters
+- Compose and the anomaly checks run once on the merged canonical tables
+- Scoring, phase 1: per shard, the derived metrics (all row- or LAD-local),
+  the per-LAD trends and the partial normalisation statistics of every
+  strategy (normalise.fit_stats); phase 2: the merged statistics (exact
+  global min/max, merged sorted rows, pooled moments) are sent back and each
+  shard is scored against them, so the scores equal the serial path; spatial
+  metrics run on the merged table
+- --check also runs the serial path and compares every output
+
+Run with: python src/pipeline/shards.py --workers 4 [--by country_code] [--check]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation.lad_codes import LadDictionary  # noqa: E402
+
+SHARD_KEYS = ("region_code", "country_code")
+UNASSIGNED = "unassigned"
+
+
+@dataclass(frozen=True)
+class Source:
+    module: str
+    load: str
+    build: Tuple[str, ...]  # builders, one output table each
+    sort: Tuple[Tuple[str, ...], ...]  # serial sort order of each output
+    write: str
+    lad_col: str
+    finish: Optional[str] = None  # "module:function" applied to the first combined output
+
+
+SOURCES: Dict[str, Source] = {
+    "desnz": Source(
+        "src.harmonisation.desnz_canonical", "load_desnz_processed",
+        ("build_la_year_canonical",), (("lad_code", "year"),),
+        "write_canonical_table", "Local Authority Code",
+    ),
+    "dft": Source(
+        "src.harmonisation.dft_canonical", "load_dft_processed",
+        ("build_la_year_canonical", "build_vehicle_canonical"),
+        (("lad_code", "year"), ("lad_code", "year", "vehicle", "road")),
+        "write_canonical_table", "lad_code",
+    ),
+    "ons": Source(
+        "src.harmonisation.ons_canonical", "load_ons_raw",
+        ("build_la_year_canonical",), (("lad_code", "year"),),
+        "write_canonical", "ladcode23", "src.harmonisation.nations:population",
+    ),
+}
+
+# Deprivation is already split by nation (src/harmonisation/nations.py)
+NATION_SOURCES = ("imd",)
+
+
+def _init_worker() -> None:
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+
+class _Inline(Executor):
+    """workers <= 1: run each task in this process."""
+
+    def submit(self, fn, *args, **kwargs):
+        from concurrent.futures import Future
+
+        fut: Future = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as exc:
+            fut.set_exception(exc)
+        return fut
+
+
+def _pool(workers: int) -> Executor:
+    return ProcessPoolExecutor(workers, initializer=_init_worker) if workers > 1 else _Inline()
+
+
+# -------------------------------------------------------
+# Shards
+# -------------------------------------------------------
+
+def shard_labels(codes: pd.Series, lad: LadDictionary, by: str = "region_code") -> np.ndarray:
+    """The shard of each row's LAD code (UNASSIGNED where unknown)."""
+    if by not in SHARD_KEYS:
+        raise ValueError(f"[SHARDS] Shard key must be one of {SHARD_KEYS}")
+    attr = lad.dim()[by].astype(object).to_numpy()
+    ids = lad.codes.get_indexer(pd.Series(codes).astype(str))
+    labels = np.full(len(ids), None, dtype=object)
+    labels[ids >= 0] = attr[ids[ids >= 0]]
+    return np.where(pd.isna(labels), UNASSIGNED, labels.astype(str)).astype(object)
+
+
+def split(df: pd.DataFrame, labels: np.ndarray) -> Dict[str, pd.DataFrame]:
+    """Row subsets by shard, in original row order."""
+    names, inverse = np.unique(labels.astype(str), return_inverse=True)
+    return {str(name): df.iloc[np.flatnonzero(inverse == k)] for k, name in enumerate(names)}
+
+
+def _lad_column(module: Any, df: pd.DataFrame, name: str) -> str:
+    if name in df.columns:
+        return name
+    return module.find_column(df, name)
+
+
+# -------------------------------------------------------
+# Harmonisation
+# -------------------------------------------------------
+
+def _build_shard(module: str, builders: Sequence[str], df: pd.DataFrame) -> List[pd.DataFrame]:
+    m = importlib.import_module(module)
+    return [getattr(m, b)(df) for b in builders]
+
+
+def _combine(parts: List[pd.DataFrame], sort: Sequence[str]) -> pd.DataFrame:
+    return pd.concat(parts, ignore_index=True).sort_values(list(sort)).reset_index(drop=True)
+
+
+def harmonise_sharded(
+    names: Sequence[str],
+    lad: LadDictionary,
+    workers: int = 4,
+    by: str = "region_code",
+    check: bool = False,
+) -> Dict[str, dict]:
+    """Build, write and record the canonical tables of `names`, all shards of
+    all sources in one pool."""
+    report: Dict[str, dict] = {}
+    if any(n in NATION_SOURCES for n in names):
+        from src.harmonisation import imd_canonical, nations
+
+        imd, ranks = nations.deprivation(workers=workers)
+        imd_canonical.write_canonical(imd)
+        imd_canonical.write_small_areas(ranks)
+        imd_canonical.record_lineage(ranks, imd)
+        report["imd"] = {"shards": {n: int(len(r)) for n, r in ranks.items()}}
+    names = [n for n in names if n not in NATION_SOURCES]
+
+    inputs, futures = {}, {}
+    with _pool(workers) as pool:
+        for name in names:
+            src = SOURCES[name]
+            m = importlib.import_module(src.module)
+            df = getattr(m, src.load)()
+            inputs[name] = df
+            shards = split(df, shard_labels(df[_lad_column(m, df, src.lad_col)], lad, by))
+            futures[name] = {
+                label: pool.submit(_build_shard, src.module, src.build, part) for label, part in shards.items()
+            }
+        results = {name: {label: f.result() for label, f in fs.items()} for name, fs in futures.items()}
+
+    for name in names:
+        src = SOURCES[name]
+        m = importlib.import_module(src.module)
+        parts = list(results[name].values())
+        outputs = [_combine([p[k] for p in parts], src.sort[k]) for k in range(len(src.build))]
+        entry: Dict[str, Any] = {"shards": {label: len(p[0]) for label, p in results[name].items()}}
+        if check:
+            serial = _build_shard(src.module, src.build, inputs[name])
+            entry["identical"] = all(_same(a, b) for a, b in zip(outputs, serial))
+        if src.finish:
+            module, _, func = src.finish.partition(":")
+            outputs[0] = getattr(importlib.import_module(module), func)(outputs[0])
+        getattr(m, src.write)(*outputs)
+        m.record_lineage(inputs[name], outputs[0])
+        report[name] = entry
+        print(f"[SHARDS] {name}: {len(parts)} shards → {len(outputs[0])} rows"
+              + (f" (identical to serial: {entry['identical']})" if check else ""))
+    return report
+
+
+# -------------------------------------------------------
+# Scoring
+# -------------------------------------------------------
+
+def _metrics_shard(df: pd.DataFrame, base_year: int) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    from src.scoring import jti_scoring, trends
+
+    registry = jti_scoring.load_registry()
+    df = jti_scoring.compute_derived_metrics(df, registry, base_year)
+    stats = registry.fit_stats(jti_scoring.indicator_metrics(df, registry), years=df["year"].to_numpy())
+    return df, trends.compute_lad_trends(df, base_year=base_year), stats
+
+
+def _score_shard(df: pd.DataFrame, stats: dict) -> pd.DataFrame:
+    from src.scoring import jti_scoring
+
+    return jti_scoring.compute_scores(df, stats=stats)[0]
+
+
+def score_sharded(
+    df: pd.DataFrame,
+    lad: LadDictionary,
+    workers: int = 4,
+    by: str = "region_code",
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Derived metrics, scores and per-LAD trends of an encoded base table,
+    each as the serial path returns it (sorted by its panel key and year).
+    Small areas go with the shard of their LAD."""
+    from src.scoring.indicators import load_registry
+    from src.scoring.trends import panel_key
+
+    registry = load_registry()
+    shards = split(df, shard_labels(df["lad_code"], lad, by))
+    base_year = int(df["year"].min())
+    with _pool(workers) as pool:
+        phase1 = [f.result() for f in [pool.submit(_metrics_shard, part, base_year) for part in shards.values()]]
+        stats = registry.merge_stats([p[2] for p in phase1])
+        scored = [f.result() for f in [pool.submit(_score_shard, p[0], stats) for p in phase1]]
+
+    key = panel_key(df)
+    order = [key, "year"]
+    metrics_df = pd.concat([p[0] for p in phase1], ignore_index=True).sort_values(order).reset_index(drop=True)
+    scored_df = pd.concat(scored, ignore_index=True).sort_values(order).reset_index(drop=True)
+    trends_df = pd.concat([p[1] for p in phase1], ignore_index=True).sort_values(key).reset_index(drop=True)
+    return metrics_df, scored_df, trends_df
+
+
+def check_scoring(df: pd.DataFrame, lad: LadDictionary, workers: int, by: str) -> bool:
+    from src.scoring import jti_scoring, trends
+
+    t0 = time.perf_counter()
+    sharded = score_sharded(df, lad, workers, by)
+    t1 = time.perf_counter()
+    metrics = jti_scoring.compute_derived_metrics(df)
+    serial = (metrics, jti_scoring.compute_scores(metrics)[0], trends.compute_lad_trends(metrics))
+    t2 = time.perf_counter()
+    same = all(_same(a, b) for a, b in zip(sharded, serial))
+    print(f"[SHARDS] scoring: sharded {t1 - t0:.2f}s, serial {t2 - t1:.2f}s, identical to serial: {same}")
+    return same
+
+
+def _same(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Equal frames; floats to 1e-12 (pooled z-score moments round differently)."""
+    try:
+        pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-12, atol=1e-12)
+    except AssertionError as exc:
+        print(f"[SHARDS] Mismatch: {exc}")
+        return False
+    return True
+
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run harmonisation and scoring as parallel region shards.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--by", choices=SHARD_KEYS, default="region_code")
+    sources = list(SOURCES) + list(NATION_SOURCES)
+    parser.add_argument("--sources", nargs="+", choices=sources, default=sources)
+    parser.add_argument("--skip-harmonise", action="store_true", help="Score the existing base table only")
+    parser.add_argument("--check", action="store_true", help="Also run the serial path and compare")
+    args = parser.parse_args(argv)
+
+    lad = LadDictionary.load()
+    ok = True
+    if not args.skip_harmonise:
+        report = harmonise_sharded(args.sources, lad, args.workers, args.by, args.check)
+        ok = all(r.get("identical", True) for r in report.values())
+
+        from src.agents import composer_agent
+        from src.scoring import anomalies
+
+        composer_agent.compose()
+        anomalies.main()
+
+    from src.scoring import jti_scoring
+
+    if args.check:
+        lad = LadDictionary.load()
+        df = lad.encode(pd.read_csv(jti_scoring.BASE_FILE), update=True)
+        ok = check_scoring(df, lad, args.workers, args.by) and ok
+    jti_scoring.main(workers=args.workers, by=args.by)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,387 @@
+"""
+JTIS – pipeline stage graph
+Declares every pipeline stage with the files it reads and writes, so callers
+(watch mode, the daemon, the CLI) can work out which stages a change affects
+and run just that downstream subgraph in-process.
+
+Stages read their inputs through a TableCache: a parsed table is kept in
+memory keyed by its path and file state (mtime, size) and is re-parsed only
+when the file on disk changes. Stage modules are imported lazily.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from src.memory import owned
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+# -------------------------------------------------------
+# Table cache
+# -------------------------------------------------------
+
+def _file_state(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class TableCache:
+    """Parsed tables keyed by (path, mtime_ns, size)."""
+
+    def __init__(self) -> None:
+        self._tables: Dict[Path, Tuple[Optional[Tuple[int, int]], pd.DataFrame]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: Path, load: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Return the cached table for `path`, calling `load` if the file changed."""
+        path = Path(path)
+        state = _file_state(path)
+        cached = self._tables.get(path)
+        if cached is not None and state is not None and cached[0] == state:
+            self.hits += 1
+        else:
+            self.misses += 1
+            cached = (state, load())
+            self._tables[path] = cached
+        # Stages may add or overwrite columns on what they are given; under
+        # copy-on-write that costs nothing until a column is actually written
+        return owned(cached[1])
+
+    def reader(self, load: Callable[[Path], pd.DataFrame] = pd.read_csv) -> Callable[[Path], pd.DataFrame]:
+        return lambda path: self.get(path, lambda: load(path))
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        if path is None:
+            self._tables.clear()
+        else:
+            self._tables.pop(Path(path), None)
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+
+# -------------------------------------------------------
+# Stage runners
+# -------------------------------------------------------
+
+def _scout(cache: TableCache) -> None:
+    from src.agents.scout_agent import ScoutAgent
+
+    agent = ScoutAgent()
+    agent.save(agent.run())
+
+
+def _desnz_ingest(cache: TableCache) -> None:
+    from src.ingestion import desnz_ingest as m
+
+    cfg = m.get_desnz_config(m.load_datasets_config())
+    df = cache.get(ROOT / cfg["path"], lambda: m.read_desnz_raw(cfg))
+    m.record_lineage(cfg, df, m.write_desnz_processed(df))
+
+
+def _desnz_canonical(cache: TableCache) -> None:
+    from src.harmonisation import desnz_canonical as m
+
+    df = cache.get(m.RAW_PROCESSED_FILE, m.load_desnz_processed)
+    canonical = m.build_la_year_canonical(df)
+    m.write_canonical_table(canonical)
+    m.record_lineage(df, canonical)
+
+
+def _dft_ingest(cache: TableCache) -> None:
+    from src.ingestion import dft_ingest as m
+
+    cfg = m.get_dft_config(m.load_datasets_config())
+    df = cache.get(ROOT / cfg["path"], lambda: m.read_dft_raw(cfg))
+    m.record_lineage(cfg, df, m.write_dft_processed(df))
+
+
+def _dft_canonical(cache: TableCache) -> None:
+    from src.harmonisation import dft_canonical as m
+
+    df = cache.get(m.RAW_PROCESSED_FILE, m.load_dft_processed)
+    canonical = m.build_la_year_canonical(df)
+    m.write_canonical_table(canonical, m.build_vehicle_canonical(df))
+    m.record_lineage(df, canonical)
+
+
+def _ons_canonical(cache: TableCache) -> None:
+    from src.harmonisation import ons_canonical as m
+
+    from src.harmonisation import nations
+
+    df = cache.get(m.RAW_FILE, m.load_ons_raw)
+    canonical = nations.population(m.build_la_year_canonical(df))
+    m.write_canonical(canonical)
+    m.record_lineage(df, canonical)
+
+
+def _imd_canonical(cache: TableCache) -> None:
+    from src.harmonisation import imd_canonical as m
+    from src.harmonisation import nations
+
+    # One worker per nation; each reads its own deprivation workbook
+    imd, ranks = nations.deprivation()
+    m.write_canonical(imd)
+    m.write_small_areas(ranks)
+    m.record_lineage(ranks, imd)
+
+
+def _small_areas(cache: TableCache) -> None:
+    from src.harmonisation import small_areas as m
+
+    m.main()
+
+
+def _compose(cache: TableCache) -> None:
+    from src.agents import composer_agent as m
+
+    m.compose(loader=cache.reader(m.load_dataset))
+
+
+def _anomalies(cache: TableCache) -> None:
+    from src.scoring import anomalies as m
+
+    m.main(cache.get(m.BASE_FILE, lambda: pd.read_csv(m.BASE_FILE)))
+
+
+def _score(cache: TableCache) -> None:
+    from src.scoring import jti_scoring as m
+
+    m.main(cache.get(m.BASE_FILE, lambda: pd.read_csv(m.BASE_FILE)))
+
+
+def _profiles(cache: TableCache) -> None:
+    from src.analysis import profiles as m
+
+    m.main([])
+
+
+def _snapshot(cache: TableCache) -> None:
+    from src.analysis import jtis_snapshot_2023 as m
+
+    m.main()
+
+
+# -------------------------------------------------------
+# Stage graph
+# -------------------------------------------------------
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    inputs: Tuple[str, ...]   # globs relative to ROOT
+    outputs: Tuple[str, ...]
+    run: Callable[[TableCache], None]
+    modules: Tuple[str, ...] = ()
+
+    def reads(self, rel_path: str) -> bool:
+        return any(fnmatch.fnmatch(rel_path, pat) for pat in self.inputs)
+
+
+CANON = "data/processed/canonical"
+STAR = "data/processed/star"
+LINEAGE = "data/processed/lineage"
+
+# Listed in a valid execution order
+STAGES: List[Stage] = [
+    Stage(
+        "scout",
+        ("data/raw/*", "config/datasets.yaml", "config/validation_schemas/*.yaml",
+         "src/agents/scout_agent.py", "src/harmonisation/columns.py"),
+        ("outputs/diagnostics/scout_report.json", "outputs/diagnostics/scout_fingerprints.json"),
+        _scout,
+        ("src.harmonisation.columns", "src.agents.scout_agent"),
+    ),
+    Stage(
+        "desnz_ingest",
+        ("data/raw/desnz_ghg_emissions.csv", "config/datasets.yaml", "src/ingestion/desnz_ingest.py"),
+        ("data/processed/desnz_ghg_emissions_processed.csv", f"{LINEAGE}/desnz_ingest.npz"),
+        _desnz_ingest,
+        ("src.ingestion.desnz_ingest",),
+    ),
+    Stage(
+        "desnz_canonical",
+        ("data/processed/desnz_ghg_emissions_processed.csv", "src/harmonisation/desnz_canonical.py"),
+        (f"{CANON}/desnz_la_year.csv", f"{LINEAGE}/desnz_canonical.npz"),
+        _desnz_canonical,
+        ("src.harmonisation.desnz_canonical",),
+    ),
+    Stage(
+        "dft_ingest",
+        ("data/raw/dft_fuel_consumption.xlsx", "config/datasets.yaml", "src/ingestion/dft_ingest.py"),
+        ("data/processed/dft_fuel_consumption_processed.csv", f"{LINEAGE}/dft_ingest.npz"),
+        _dft_ingest,
+        ("src.ingestion.dft_ingest",),
+    ),
+    Stage(
+        "dft_canonical",
+        ("data/processed/dft_fuel_consumption_processed.csv", "src/harmonisation/dft_canonical.py",
+         "src/harmonisation/columns.py", "config/validation_schemas/dft_fuel_consumption.yaml"),
+        (f"{CANON}/dft_la_year.csv", f"{CANON}/dft_vehicle_la_year.csv", f"{LINEAGE}/dft_canonical.npz"),
+        _dft_canonical,
+        ("src.harmonisation.columns", "src.harmonisation.dft_canonical"),
+    ),
+    Stage(
+        "ons_canonical",
+        ("data/raw/ons_population.xlsx", "src/harmonisation/ons_canonical.py", "src/harmonisation/nations.py",
+         "config/nations.yaml"),
+        (f"{CANON}/ons_la_year.csv", f"{LINEAGE}/ons_canonical.npz"),
+        _ons_canonical,
+        ("src.harmonisation.ons_canonical", "src.harmonisation.nations"),
+    ),
+    Stage(
+        "imd_canonical",
+        ("data/raw/imd_2019.xlsx", "data/raw/wimd_*", "data/raw/simd_*", "data/raw/nimdm_*",
+         f"{CANON}/ons_la_year.csv", f"{CANON}/desnz_la_year.csv", "src/harmonisation/imd_canonical.py", "src/harmonisation/nations.py",
+         "config/nations.yaml"),
+        (f"{CANON}/imd_la.csv", f"{CANON}/imd_small_area.csv", f"{LINEAGE}/imd_canonical.npz"),
+        _imd_canonical,
+        ("src.harmonisation.imd_canonical", "src.harmonisation.nations"),
+    ),
+    Stage(
+        "small_areas",
+        ("data/raw/sape/*", "data/raw/lsoa_msoa_lookup.csv", f"{CANON}/imd_small_area.csv",
+         "src/harmonisation/small_areas.py", "config/granularity.yaml"),
+        (f"{CANON}/small_area_year.csv",),
+        _small_areas,
+        ("src.harmonisation.small_areas",),
+    ),
+    Stage(
+        "compose",
+        (f"{CANON}/desnz_la_year.csv", f"{CANON}/dft_la_year.csv", f"{CANON}/dft_vehicle_la_year.csv",
+         f"{CANON}/ons_la_year.csv", f"{CANON}/imd_la.csv", "src/agents/composer_agent.py",
+         "src/harmonisation/lad_codes.py", "src/harmonisation/star.py", "src/harmonisation/impute.py",
+         "config/imputation.yaml", "config/nations.yaml", f"{CANON}/small_area_year.csv",
+         "src/harmonisation/small_areas.py", "config/granularity.yaml"),
+        (f"{CANON}/jtis_base_la_year.csv", f"{CANON}/jtis_imputed_cells.csv", f"{STAR}/dim_lad.csv",
+         f"{STAR}/fact_*.parquet",
+         f"{LINEAGE}/compose.npz"),
+        _compose,
+        ("src.agents.composer_agent", "src.harmonisation.small_areas"),
+    ),
+    Stage(
+        "anomalies",
+        (f"{CANON}/jtis_base_la_year.csv", "config/anomalies.yaml", "config/indicators.yaml",
+         "src/scoring/anomalies.py", "src/scoring/indicators.py", "src/scoring/trends.py"),
+        (f"{CANON}/jtis_base_checked_la_year.csv", "outputs/diagnostics/anomaly_flags.csv",
+         "outputs/diagnostics/anomaly_report.json"),
+        _anomalies,
+        ("src.scoring.anomalies",),
+    ),
+    Stage(
+        "score",
+        (f"{CANON}/jtis_base_checked_la_year.csv", f"{STAR}/dim_lad.csv", "config/indicators.yaml",
+         "src/scoring/*.py", "src/storage/*.py", "src/analysis/release_diff.py",
+         "src/harmonisation/lad_codes.py", "data/raw/lad_boundaries.*"),
+        (f"{CANON}/jtis_scored_la_year.csv", f"{CANON}/jtis_trends_lad.csv"),
+        _score,
+        ("src.scoring.jti_scoring", "src.analysis.release_diff", "src.storage.feature_store"),
+    ),
+    Stage(
+        "snapshot",
+        (f"{CANON}/jtis_scored_la_year.csv", f"{STAR}/dim_lad.csv", "config/indicators.yaml",
+         "src/analysis/jtis_snapshot_2023.py", "src/harmonisation/lad_codes.py"),
+        ("outputs/jtis_2023_ranked.csv",),
+        _snapshot,
+        ("src.analysis.jtis_snapshot_2023",),
+    ),
+    Stage(
+        "profiles",
+        (f"{CANON}/jtis_scored_la_year.csv", f"{CANON}/jtis_trends_lad.csv", f"{STAR}/dim_lad.csv",
+         "config/indicators.yaml", "src/analysis/profiles.py", "src/harmonisation/lad_codes.py"),
+        ("outputs/reports/bundle.json", "outputs/reports/index.html", "outputs/reports/lads/*.html",
+         "outputs/reports/regions/*.html"),
+        _profiles,
+        ("src.analysis.profiles",),
+    ),
+]
+
+STAGE_BY_NAME: Dict[str, Stage] = {s.name: s for s in STAGES}
+
+
+def _rel(path: Path) -> str:
+    path = Path(path)
+    try:
+        return path.resolve().relative_to(ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def depends_on(stage: Stage, upstream: Stage) -> bool:
+    return any(stage.reads(out) for out in upstream.outputs)
+
+
+def downstream(names: Iterable[str]) -> List[str]:
+    """The given stages plus everything that consumes their outputs, in run order."""
+    selected = set(names)
+    unknown = selected - set(STAGE_BY_NAME)
+    if unknown:
+        raise KeyError(f"Unknown stages: {sorted(unknown)}")
+    for stage in STAGES:
+        if any(depends_on(stage, STAGE_BY_NAME[n]) for n in list(selected)):
+            selected.add(stage.name)
+    return [s.name for s in STAGES if s.name in selected]
+
+
+def upstream(names: Iterable[str]) -> List[str]:
+    """The given stages plus everything whose outputs they read, in run order."""
+    selected = set(names)
+    unknown = selected - set(STAGE_BY_NAME)
+    if unknown:
+        raise KeyError(f"Unknown stages: {sorted(unknown)}")
+    for stage in reversed(STAGES):
+        if any(depends_on(STAGE_BY_NAME[n], stage) for n in list(selected)):
+            selected.add(stage.name)
+    return [s.name for s in STAGES if s.name in selected]
+
+
+def affected_by(paths: Iterable[Path]) -> List[str]:
+    """Stages (and their downstream) that read any of the changed paths."""
+    rels = [_rel(p) for p in paths]
+    direct = [s.name for s in STAGES if any(s.reads(r) for r in rels)]
+    return downstream(direct)
+
+
+@dataclass
+class StageRun:
+    name: str
+    seconds: float
+    ok: bool
+    error: Optional[str] = None
+
+
+def run_stages(names: Sequence[str], cache: Optional[TableCache] = None) -> List[StageRun]:
+    """Run stages in graph order; stages downstream of a failure are skipped."""
+    cache = cache if cache is not None else TableCache()
+    wanted = set(names)
+    failed: List[Stage] = []
+    results: List[StageRun] = []
+    for stage in STAGES:
+        if stage.name not in wanted:
+            continue
+        blocked = [f.name for f in failed if depends_on(stage, f)]
+        if blocked:
+            results.append(StageRun(stage.name, 0.0, False, f"skipped: upstream {blocked} failed"))
+            failed.append(stage)
+            continue
+        t0 = time.perf_counter()
+        try:
+            stage.run(cache)
+            results.append(StageRun(stage.name, time.perf_counter() - t0, True))
+        except Exception as exc:
+            results.append(StageRun(stage.name, time.perf_counter() - t0, False, repr(exc)))
+            failed.append(stage)
+    return results
@@ -0,0 +1,273 @@
+"""
+JTIS – watch mode
+Re-runs only the pipeline stages affected by a change under data/raw,
+config/ or src/.
+
+- Uses Linux inotify (through ctypes, no extra dependency) and falls back to
+  mtime polling elsewhere or with --poll
+- Debounces bursts of events (editor saves, multi-file drops) into one run
+- Maps changed paths to stages via src/pipeline/stages.py and executes the
+  downstream subgraph in this process, keeping parsed tables warm in a
+  TableCache between runs; edited modules under src/ are reloaded first
+
+Run with: python src/pipeline/watch.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import ctypes
+import ctypes.util
+import importlib
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.pipeline.stages import (  # noqa: E402
+    STAGE_BY_NAME,
+    TableCache,
+    affected_by,
+    run_stages,
+)
+
+WATCH_ROOTS = [ROOT / "data" / "raw", ROOT / "config", ROOT / "src"]
+
+IGNORED_SUFFIXES = (".pyc", ".swp", ".tmp", ".fetch-tmp", "~")
+IGNORED_PARTS = ("__pycache__", ".git")
+
+
+def _ignored(path: Path) -> bool:
+    return (
+        path.name.startswith((".#", "~$"))
+        or path.name.endswith(IGNORED_SUFFIXES)
+        or any(part in IGNORED_PARTS for part in path.parts)
+    )
+
+
+# -------------------------------------------------------
+# Watchers
+# -------------------------------------------------------
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, roots: Iterable[Path]):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, Path] = {}
+        for root in roots:
+            self._add_tree(Path(root))
+
+    def _add_tree(self, root: Path) -> None:
+        if not root.is_dir():
+            return
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in IGNORED_PARTS]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {dirpath}")
+            self._dirs[wd] = Path(dirpath)
+
+    def poll(self, timeout: Optional[float]) -> Set[Path]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: Set[Path] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size: offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(WATCH_ROOTS)
+                    continue
+                base = self._dirs.get(wd)
+                if base is None:
+                    continue
+                path = base / os.fsdecode(name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._add_tree(path)
+                    continue
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, roots: Iterable[Path], interval: float = 1.0):
+        self.roots = [Path(r) for r in roots]
+        self.interval = interval
+        self._state = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        state = {}
+        for root in self.roots:
+            if not root.is_dir():
+                continue
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d not in IGNORED_PARTS]
+                for fn in filenames:
+                    p = Path(dirpath) / fn
+                    try:
+                        st = p.stat()
+                    except FileNotFoundError:
+                        continue
+                    state[p] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def poll(self, timeout: Optional[float]) -> Set[Path]:
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        new = self._scan()
+        old = self._state
+        self._state = new
+        return {p for p in set(old) | set(new) if old.get(p) != new.get(p)}
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(roots: Iterable[Path], polling: bool = False, interval: float = 1.0):
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as exc:
+            print(f"[WATCH] inotify unavailable ({exc}); falling back to polling")
+    return PollingWatcher(roots, interval)
+
+
+# -------------------------------------------------------
+# Reload + run
+# -------------------------------------------------------
+
+def _module_name(path: Path) -> Optional[str]:
+    try:
+        rel = path.resolve().relative_to(ROOT)
+    except ValueError:
+        return None
+    if rel.suffix != ".py" or rel.parts[0] != "src":
+        return None
+    parts = list(rel.with_suffix("").parts)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def reload_changed(paths: Iterable[Path], stages: List[str]) -> List[str]:
+    """Reload edited src modules, then the modules of the stages about to run."""
+    names = [n for n in (_module_name(p) for p in paths) if n]
+    if names:
+        names += [m for s in stages for m in STAGE_BY_NAME[s].modules]
+    reloaded = []
+    for name in dict.fromkeys(names):
+        mod = sys.modules.get(name)
+        if mod is not None:
+            importlib.reload(mod)
+            reloaded.append(name)
+    return reloaded
+
+
+def handle_changes(changed: Set[Path], cache: TableCache) -> None:
+    stages = affected_by(changed)
+    rels = sorted(str(p.relative_to(ROOT)) if p.is_relative_to(ROOT) else str(p) for p in changed)
+    print(f"[WATCH] Changed: {', '.join(rels)}")
+    if not stages:
+        print("[WATCH] No stage reads these paths.")
+        return
+
+    reloaded = reload_changed(changed, stages)
+    if reloaded:
+        print(f"[WATCH] Reloaded: {', '.join(reloaded)}")
+    print(f"[WATCH] Running: {' → '.join(stages)}")
+
+    t0 = time.perf_counter()
+    results = run_stages(stages, cache)
+    for r in results:
+        status = "ok" if r.ok else f"FAILED {r.error}"
+        print(f"[WATCH]   {r.name:<16} {r.seconds:6.2f}s  {status}")
+    print(
+        f"[WATCH] Done in {time.perf_counter() - t0:.2f}s "
+        f"(cache hits {cache.hits}, misses {cache.misses})"
+    )
+
+
+def watch(
+    debounce: float = 0.5,
+    polling: bool = False,
+    interval: float = 1.0,
+    initial: Optional[List[str]] = None,
+) -> None:
+    cache = TableCache()
+    watcher = make_watcher(WATCH_ROOTS, polling=polling, interval=interval)
+    kind = type(watcher).__name__
+    print(f"[WATCH] {kind} on: {', '.join(str(r.relative_to(ROOT)) for r in WATCH_ROOTS)}")
+
+    if initial:
+        for r in run_stages(initial, cache):
+            print(f"[WATCH]   {r.name:<16} {r.seconds:6.2f}s  {'ok' if r.ok else r.error}")
+
+    try:
+        while True:
+            changed = watcher.poll(None)
+            if not changed:
+                continue
+            # Debounce: keep collecting until the tree has been quiet for `debounce`
+            while True:
+                more = watcher.poll(debounce)
+                if not more:
+                    break
+                changed |= more
+            changed = {p for p in changed if not _ignored(p)}
+            if changed:
+                handle_changes(changed, cache)
+    except KeyboardInterrupt:
+        print("\n[WATCH] Stopped.")
+    finally:
+        watcher.close()
+
+
+# -------------------------------------------------------
+# CLI entrypoint
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-run affected pipeline stages on change.")
+    parser.add_argument("--debounce", type=float, default=0.5, help="Quiet period in seconds")
+    parser.add_argument("--poll", action="store_true", help="Force the polling watcher")
+    parser.add_argument("--interval", type=float, default=1.0, help="Polling interval")
+    parser.add_argument("--initial", nargs="*", help="Stages to run once before watching")
+    args = parser.parse_args(argv)
+    watch(debounce=args.debounce, polling=args.poll, interval=args.interval, initial=args.initial)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,269 @@
+"""
+JTIS – anomaly checks
+Screen the base table for implausible values before they reach scoring.
+
+- Checks (config/anomalies.yaml) run on a (columns × LA–years) stack, so each
+  check scans all its columns in one pass; columns are base measures or
+  registry metrics:
+    robust_z  |x − median| / (1.4826 · MAD) over the panel
+    yoy_jump  x_t / x_(t−1) within a LAD beyond a per-column factor; the step
+              back after a one-year spike is not flagged a second time
+- Flagged cells go to outputs/diagnostics/anomaly_flags.csv and a summary to
+  anomaly_report.json
+- A check's action can also quarantine the measure behind a flagged cell or
+  impute it by interpolation within the LAD; the screened table
+  (jtis_base_checked_la_year.csv) is what the score stage reads
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.scoring import trends  # noqa: E402
+from src.scoring.indicators import IndicatorRegistry, load_registry  # noqa: E402
+
+CONFIG_FILE = ROOT / "config" / "anomalies.yaml"
+CANONICAL_DIR = ROOT / "data" / "processed" / "canonical"
+BASE_FILE = CANONICAL_DIR / "jtis_base_la_year.csv"
+CHECKED_FILE = CANONICAL_DIR / "jtis_base_checked_la_year.csv"
+DIAG_DIR = ROOT / "outputs" / "diagnostics"
+FLAGS_FILE = DIAG_DIR / "anomaly_flags.csv"
+REPORT_FILE = DIAG_DIR / "anomaly_report.json"
+
+ACTIONS = ("flag", "quarantine", "impute")
+MAD_SCALE = 1.4826  # MAD → standard deviation under normality
+
+
+@dataclass(frozen=True)
+class Check:
+    name: str
+    columns: Mapping[str, float]  # column → threshold
+    action: str = "flag"
+
+
+def load_checks(path: Path = CONFIG_FILE) -> List[Check]:
+    with Path(path).open("r", encoding="utf-8") as f:
+        doc = yaml.safe_load(f) or {}
+    checks = []
+    for name, spec in (doc.get("checks") or {}).items():
+        if name not in STATISTICS:
+            raise ValueError(f"[ANOMALIES] Unknown check {name!r}; expected one of {list(STATISTICS)}")
+        action = spec.get("action", "flag")
+        if action not in ACTIONS:
+            raise ValueError(f"[ANOMALIES] {name}: action must be one of {ACTIONS}")
+        checks.append(Check(name, {c: float(t) for c, t in (spec.get("columns") or {}).items()}, action))
+    return checks
+
+
+# -------------------------------------------------------
+# Statistics and flags, shape (k, n)
+# -------------------------------------------------------
+
+def robust_z(panel: trends.Panel, x: np.ndarray) -> np.ndarray:
+    """Distance from the column median in scaled MADs (NaN where MAD is 0)."""
+    with np.errstate(invalid="ignore"):
+        med = np.nanmedian(x, axis=-1, keepdims=True)
+        mad = np.nanmedian(np.abs(x - med), axis=-1, keepdims=True) * MAD_SCALE
+        return np.abs(x - med) / np.where(mad > 0, mad, np.nan)
+
+
+def yoy_ratio(panel: trends.Panel, x: np.ndarray) -> np.ndarray:
+    """x_t / x_(t−1) within each LAD (NaN in a LAD's first year)."""
+    return trends.yoy_pct(panel, x) + 1.0
+
+
+def _lag(panel: trends.Panel, v: np.ndarray, fill) -> np.ndarray:
+    prev = panel.prev
+    return np.where(prev >= 0, v[..., np.maximum(prev, 0)], fill)
+
+
+def _robust_z_flags(panel: trends.Panel, stat: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    return stat > limit
+
+
+def _yoy_jump_flags(panel: trends.Panel, stat: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        jump = (stat > limit) | (stat < 1.0 / limit)
+    # After a one-year spike the value jumps back the other way; only the
+    # spike itself is the anomaly
+    back = _lag(panel, jump, False) & ((stat > 1.0) != (_lag(panel, stat, np.nan) > 1.0))
+    return jump & ~back
+
+
+STATISTICS = {
+    "robust_z": (robust_z, _robust_z_flags),
+    "yoy_jump": (yoy_ratio, _yoy_jump_flags),
+}
+
+
+# -------------------------------------------------------
+# Quarantine and imputation
+# -------------------------------------------------------
+
+def measure_behind(registry: IndicatorRegistry, column: str) -> str:
+    """The base measure a column is built on: itself, or a metric's first
+    input followed back through other metrics."""
+    while column in registry.metrics:
+        column = registry.metrics[column].inputs[0]
+    return column
+
+
+def interpolate(panel: trends.Panel, v: np.ndarray) -> np.ndarray:
+    """Fill NaNs linearly in year between the nearest valid values of the
+    same LAD, carrying the nearest one at either end."""
+    n = panel.n
+    idx = np.arange(n)
+    valid = ~np.isnan(v)
+    end = np.r_[panel.starts[1:], n][np.searchsorted(panel.starts, panel.start)] - 1
+
+    before = np.maximum.accumulate(np.where(valid, idx, -1))
+    before = np.where(before >= panel.start, before, -1)
+    after = np.minimum.accumulate(np.where(valid, idx, n)[::-1])[::-1]
+    after = np.where(after <= end, after, n)
+
+    has_b, has_a = before >= 0, after < n
+    vb = np.where(has_b, v[np.clip(before, 0, n - 1)], np.nan)
+    va = np.where(has_a, v[np.clip(after, 0, n - 1)], np.nan)
+    yb = panel.year[np.clip(before, 0, n - 1)]
+    ya = panel.year[np.clip(after, 0, n - 1)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(has_b & has_a & (ya > yb), (panel.year - yb) / (ya - yb), 0.0)
+    out = np.where(has_b & has_a, vb + w * (va - vb), np.where(has_b, vb, va))
+    return np.where(valid, v, out)
+
+
+# -------------------------------------------------------
+# Screening
+# -------------------------------------------------------
+
+def screen(
+    df: pd.DataFrame,
+    checks: Optional[List[Check]] = None,
+    registry: Optional[IndicatorRegistry] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """Run the checks on a base table. Returns the screened table (sorted by
+    LAD and year), one row per flagged cell, and a summary."""
+    t0 = time.perf_counter()
+    checks = load_checks() if checks is None else checks
+    registry = registry or load_registry()
+
+    key = trends.panel_key(df)
+    df = df.sort_values([key, "year"], kind="stable").reset_index(drop=True)
+    panel = trends.Panel.from_frame(df, key)
+
+    plan = registry.plan()
+    base = {
+        c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)
+        for c in dict.fromkeys(registry.base_columns(plan) + [c for ch in checks for c in ch.columns])
+        if c in df.columns
+    }
+    values = {**base, **registry.compute_metrics(base, panel, plan)}
+    unknown = sorted({c for ch in checks for c in ch.columns} - set(values))
+    if unknown:
+        raise KeyError(f"[ANOMALIES] Unknown check columns: {unknown}")
+
+    flags = []
+    blank: Dict[str, np.ndarray] = {}
+    fill: Dict[str, np.ndarray] = {}
+    summary: Dict[str, Dict[str, int]] = {}
+    for check in checks:
+        cols = list(check.columns)
+        if not cols:
+            continue
+        stat_fn, flag_fn = STATISTICS[check.name]
+        x = np.stack([values[c] for c in cols])
+        stat = stat_fn(panel, x)
+        limit = np.array([check.columns[c] for c in cols])[:, None]
+        hit = flag_fn(panel, stat, limit)
+        summary[check.name] = {c: int(n) for c, n in zip(cols, hit.sum(axis=-1))}
+
+        k, rows = np.nonzero(hit)
+        measures = [measure_behind(registry, c) for c in cols]
+        flags.append(pd.DataFrame({
+            "lad_code": df["lad_code"].to_numpy()[rows] if "lad_code" in df.columns else df[key].to_numpy()[rows],
+            "year": df["year"].to_numpy()[rows],
+            "column": np.asarray(cols, dtype=object)[k],
+            "check": check.name,
+            "value": x[k, rows],
+            "statistic": stat[k, rows],
+            "threshold": limit[k, 0],
+            "action": check.action,
+            "measure": np.asarray(measures, dtype=object)[k],
+        }))
+        if check.action == "flag":
+            continue
+        for j, m in enumerate(measures):
+            if m not in base:
+                continue
+            blank[m] = blank.get(m, np.zeros(panel.n, dtype=bool)) | hit[j]
+            if check.action == "impute":
+                fill[m] = fill.get(m, np.zeros(panel.n, dtype=bool)) | hit[j]
+
+    changed = {}
+    for m, mask in blank.items():
+        v = np.where(mask, np.nan, base[m])
+        if m in fill:
+            v = np.where(fill[m], interpolate(panel, v), v)
+        changed[m] = v
+    flags_df = pd.concat(flags, ignore_index=True) if flags else pd.DataFrame(
+        columns=["lad_code", "year", "column", "check", "value", "statistic", "threshold", "action", "measure"]
+    )
+
+    report = {
+        "rows": int(panel.n),
+        "flagged_cells": int(len(flags_df)),
+        "flagged_la_years": int(flags_df[["lad_code", "year"]].drop_duplicates().shape[0]),
+        "checks": summary,
+        "quarantined": {m: int(mask.sum()) for m, mask in blank.items()},
+        "imputed": {m: int((mask & ~np.isnan(changed[m])).sum()) for m, mask in fill.items()},
+        "seconds": round(time.perf_counter() - t0, 4),
+    }
+    return df.assign(**changed), flags_df, report
+
+
+def main(df: pd.DataFrame | None = None) -> int:
+    """Screen the base table (read from BASE_FILE unless passed in)."""
+    if df is None:
+        if not BASE_FILE.exists():
+            raise FileNotFoundError(
+                f"Base JTIS table not found: {BASE_FILE}. "
+                "Run src/agents/composer_agent.py first."
+            )
+        print(f"[ANOMALIES] Loading base table from: {BASE_FILE}")
+        df = pd.read_csv(BASE_FILE)
+
+    checked, flags, report = screen(df)
+    print(
+        f"[ANOMALIES] {report['flagged_cells']} flagged cells in "
+        f"{report['flagged_la_years']} LA–years ({report['seconds']:.3f}s)"
+    )
+    for name, counts in report["checks"].items():
+        hits = {c: n for c, n in counts.items() if n}
+        if hits:
+            print(f"[ANOMALIES]   {name}: {hits}")
+
+    print(f"[ANOMALIES] Writing screened base table to: {CHECKED_FILE}")
+    checked.to_csv(CHECKED_FILE, index=False)
+    DIAG_DIR.mkdir(parents=True, exist_ok=True)
+    flags.to_csv(FLAGS_FILE, index=False)
+    with open(REPORT_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[ANOMALIES] Flags → {FLAGS_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,324 @@
+"""
+JTIS – indicator registry
+The metrics, indicators and component weights of the JTI, declared in
+config/indicators.yaml and evaluated on arrays.
+
+- Metrics name their formula and inputs (base columns or other metrics);
+  the registry resolves them into one dependency-ordered plan, so every
+  metric the indicators (or the output list) need is computed exactly once
+- Each indicator picks its normalisation strategy, parameters and scope
+  (panel-wide or per year; see normalise.py); indicators sharing all three
+  are normalised together as one (k, n) array, and component scores and
+  jti_score come from one weight matrix
+- Arrays may carry extra leading axes (batches of perturbed panels), as in
+  trends.py
+"""
+
+from __future__ import annotations
+
+import inspect
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+from src.scoring import trends
+from src.scoring.normalise import NORMALISERS, SCOPES, apply_stats, fit_stats, merge_stats, normalise
+
+ROOT = Path(__file__).resolve().parents[2]
+INDICATORS_FILE = ROOT / "config" / "indicators.yaml"
+
+# Formulas whose denominator is implied
+DENOMINATORS = {"per_capita": "population", "density": "area_km2"}
+DIRECTIONS = ("higher", "lower")
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    formula: str
+    inputs: Tuple[str, ...]
+    scale: float = 1.0
+    window: int = trends.TREND_WINDOW
+    output: bool = False
+    snapshot: bool = False
+
+    @property
+    def requires(self) -> Tuple[str, ...]:
+        if self.formula in DENOMINATORS:
+            return self.inputs + (DENOMINATORS[self.formula],)
+        return self.inputs
+
+
+@dataclass(frozen=True)
+class Indicator:
+    name: str
+    metric: str
+    component: str
+    weight: float = 1.0
+    normalisation: str = "min_max"
+    direction: str = "higher"
+    scope: str = "panel"
+    params: Mapping[str, Any] = field(default_factory=dict)
+
+    @property
+    def strategy(self) -> Tuple[Any, ...]:
+        return (self.normalisation, self.scope, tuple(sorted(self.params.items())))
+
+    @classmethod
+    def from_spec(cls, name: str, spec: Mapping[str, Any]) -> "Indicator":
+        """`normalisation` is a method name or {method, scope, **params}."""
+        spec = dict(spec)
+        norm = spec.pop("normalisation", "min_max")
+        if isinstance(norm, Mapping):
+            norm = dict(norm)
+            spec["scope"] = norm.pop("scope", "panel")
+            spec["params"] = norm
+            norm = norm.pop("method", "min_max")
+        return cls(name=name, normalisation=norm, **spec)
+
+
+# -------------------------------------------------------
+# Formulas
+# -------------------------------------------------------
+
+def _ratio(num: np.ndarray, den: np.ndarray, scale: float) -> np.ndarray:
+    den = np.where(den == 0, np.nan, den)
+    return num * scale / den
+
+
+FORMULAS: Dict[str, Callable[[Metric, List[np.ndarray], trends.Panel], np.ndarray]] = {
+    "per_capita": lambda m, x, panel: _ratio(x[0], x[1], m.scale),
+    "density": lambda m, x, panel: _ratio(x[0], x[1], m.scale),
+    "ratio": lambda m, x, panel: _ratio(x[0], x[1], m.scale),
+    "yoy": lambda m, x, panel: trends.yoy_pct(panel, x[0]),
+    "trend": lambda m, x, panel: trends.rolling_trend(panel, x[0], window=m.window),
+    "abs": lambda m, x, panel: np.abs(x[0]),
+}
+
+
+# -------------------------------------------------------
+# Registry
+# -------------------------------------------------------
+
+class IndicatorRegistry:
+    def __init__(
+        self,
+        metrics: Sequence[Metric],
+        indicators: Sequence[Indicator],
+        components: Mapping[str, float],
+    ):
+        self.metrics: Dict[str, Metric] = {m.name: m for m in metrics}
+        self.indicators: Dict[str, Indicator] = {i.name: i for i in indicators}
+        self.components: Dict[str, float] = dict(components)
+        self._validate()
+
+    @classmethod
+    def from_yaml(cls, path: Path = INDICATORS_FILE) -> "IndicatorRegistry":
+        with Path(path).open("r", encoding="utf-8") as f:
+            doc = yaml.safe_load(f) or {}
+        metrics = [
+            Metric(name=name, **{**spec, "inputs": tuple(spec.get("inputs", ()))})
+            for name, spec in (doc.get("metrics") or {}).items()
+        ]
+        indicators = [Indicator.from_spec(name, spec) for name, spec in (doc.get("indicators") or {}).items()]
+        return cls(metrics, indicators, doc.get("components") or {})
+
+    def _validate(self) -> None:
+        for m in self.metrics.values():
+            if m.formula not in FORMULAS:
+                raise ValueError(f"[INDICATORS] {m.name}: unknown formula {m.formula!r}")
+            arity = 2 if m.formula == "ratio" else 1
+            if len(m.inputs) != arity:
+                raise ValueError(f"[INDICATORS] {m.name}: {m.formula} takes {arity} input(s)")
+        for i in self.indicators.values():
+            if i.metric not in self.metrics:
+                raise ValueError(f"[INDICATORS] {i.name}: unknown metric {i.metric!r}")
+            if i.component not in self.components:
+                raise ValueError(f"[INDICATORS] {i.name}: unknown component {i.component!r}")
+            if i.normalisation not in NORMALISERS:
+                raise ValueError(f"[INDICATORS] {i.name}: unknown normalisation {i.normalisation!r}")
+            try:
+                inspect.signature(NORMALISERS[i.normalisation]).bind(None, **i.params)
+            except TypeError as exc:
+                raise ValueError(f"[INDICATORS] {i.name}: {i.normalisation} parameters: {exc}") from None
+            if i.scope not in SCOPES:
+                raise ValueError(f"[INDICATORS] {i.name}: scope must be one of {SCOPES}")
+            if i.direction not in DIRECTIONS:
+                raise ValueError(f"[INDICATORS] {i.name}: direction must be one of {DIRECTIONS}")
+        for c in self.components:
+            if not sum(i.weight for i in self.indicators.values() if i.component == c) > 0:
+                raise ValueError(f"[INDICATORS] Component {c!r} has no weighted indicators")
+        self.plan()  # raises on cycles
+
+    @property
+    def component_weights(self) -> Dict[str, float]:
+        return dict(self.components)
+
+    @property
+    def trend_series(self) -> Dict[str, str]:
+        """{name: input column} of the trend metrics, named without their
+        _trend_pct suffix (the per-LAD trend columns, trends.compute_lad_trends)."""
+        return {
+            m.name.removesuffix("_trend_pct"): m.inputs[0]
+            for m in self.metrics.values()
+            if m.formula == "trend"
+        }
+
+    @property
+    def snapshot_metrics(self) -> List[str]:
+        return [m.name for m in self.metrics.values() if m.snapshot]
+
+    # ----------------------------
+    # Dependency resolution
+    # ----------------------------
+    def plan(self, indicators: Optional[Sequence[str]] = None, outputs: bool = True) -> List[Metric]:
+        """Metrics needed by `indicators` (default: all) and, with `outputs`,
+        the output and snapshot metrics, each once, dependencies first."""
+        names = self.indicators if indicators is None else indicators
+        wanted = [self.indicators[n].metric for n in names]
+        if outputs:
+            wanted += [m.name for m in self.metrics.values() if m.output or m.snapshot]
+
+        order: List[Metric] = []
+        state: Dict[str, str] = {}
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "active":
+                raise ValueError(f"[INDICATORS] Metric cycle: {' → '.join(path + (name,))}")
+            state[name] = "active"
+            for dep in self.metrics[name].requires:
+                if dep in self.metrics:
+                    visit(dep, path + (name,))
+            state[name] = "done"
+            order.append(self.metrics[name])
+
+        wanted_set = set(wanted)
+        for name in self.metrics:  # declaration order where dependencies allow
+            if name in wanted_set:
+                visit(name, ())
+        return order
+
+    def base_columns(self, plan: Optional[Sequence[Metric]] = None) -> List[str]:
+        """Base-table columns the plan reads."""
+        plan = self.plan() if plan is None else plan
+        cols = [c for m in plan for c in m.requires if c not in self.metrics]
+        return list(dict.fromkeys(cols))
+
+    # ----------------------------
+    # Evaluation
+    # ----------------------------
+    def compute_metrics(
+        self,
+        columns: Mapping[str, np.ndarray],
+        panel: trends.Panel,
+        plan: Optional[Sequence[Metric]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Metric arrays from base-column arrays (float, shape (..., n))."""
+        plan = self.plan() if plan is None else plan
+        missing = [c for c in self.base_columns(plan) if c not in columns]
+        if missing:
+            raise KeyError(f"[INDICATORS] Base table is missing columns: {missing}")
+        values: Dict[str, np.ndarray] = dict(columns)
+        out: Dict[str, np.ndarray] = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for m in plan:
+                out[m.name] = values[m.name] = FORMULAS[m.formula](
+                    m, [values[c] for c in m.requires], panel
+                )
+        return out
+
+    def _stack(
+        self, metrics: Mapping[str, np.ndarray], indicators: Optional[Sequence[str]]
+    ) -> Tuple[List[Indicator], np.ndarray, Dict[Tuple[Any, ...], List[int]]]:
+        inds = [self.indicators[n] for n in (self.indicators if indicators is None else indicators)]
+        x = np.stack(
+            np.broadcast_arrays(*[np.asarray(metrics[i.metric], dtype=float) for i in inds]), axis=-2
+        )
+        groups: Dict[Tuple[Any, ...], List[int]] = {}
+        for k, i in enumerate(inds):
+            groups.setdefault(i.strategy, []).append(k)
+        return inds, x, groups
+
+    def fit_stats(
+        self,
+        metrics: Mapping[str, np.ndarray],
+        indicators: Optional[Sequence[str]] = None,
+        years: Optional[np.ndarray] = None,
+    ) -> Dict[Tuple[Any, ...], dict]:
+        """Partial normalisation statistics of one shard, per strategy (see
+        normalise.fit_stats); merge shards with merge_stats."""
+        inds, x, groups = self._stack(metrics, indicators)
+        return {
+            strategy: fit_stats(x[..., rows, :], inds[rows[0]].normalisation, inds[rows[0]].scope, years)
+            for strategy, rows in groups.items()
+        }
+
+    def merge_stats(self, parts: Sequence[Mapping[Tuple[Any, ...], dict]]) -> Dict[Tuple[Any, ...], dict]:
+        return {
+            strategy: merge_stats([p[strategy] for p in parts], strategy[0], strategy[1])
+            for strategy in parts[0]
+        }
+
+    def compute_scores(
+        self,
+        metrics: Mapping[str, np.ndarray],
+        indicators: Optional[Sequence[str]] = None,
+        years: Optional[np.ndarray] = None,
+        stats: Optional[Mapping[Tuple[Any, ...], dict]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Normalised indicators, component scores and jti_score. `years`
+        (one per row) is needed by indicators normalised per year; `stats`
+        (merged fit_stats) normalises against a whole panel of which
+        `metrics` is one shard."""
+        inds, x, groups = self._stack(metrics, indicators)
+
+        # One normalisation call per strategy over all its indicators
+        norm = np.empty_like(x)
+        for strategy, rows in groups.items():
+            first = inds[rows[0]]
+            if stats is None:
+                norm[..., rows, :] = normalise(
+                    x[..., rows, :], first.normalisation, first.scope, years, **first.params
+                )
+            else:
+                norm[..., rows, :] = apply_stats(
+                    x[..., rows, :], stats[strategy], first.normalisation, first.scope, years, **first.params
+                )
+        out = {i.name: norm[..., k, :] for k, i in enumerate(inds)}
+
+        # Weighted mean per component: (k, c) weights, NaN where any
+        # weighted indicator is NaN
+        lower = np.array([i.direction == "lower" for i in inds])[:, None]
+        adj = np.where(lower, 1.0 - norm, norm)
+        comps = list(self.components)
+        w = np.zeros((len(inds), len(comps)))
+        for k, i in enumerate(inds):
+            w[k, comps.index(i.component)] = i.weight
+        w = w / w.sum(axis=0, keepdims=True)
+        nan = np.isnan(adj)
+        scores = np.einsum("...kn,kc->...cn", np.where(nan, 0.0, adj), w)
+        scores[np.einsum("...kn,kc->...cn", nan.astype(float), (w > 0).astype(float)) > 0] = np.nan
+
+        for c, col in enumerate(comps):
+            out[col] = scores[..., c, :]
+        out["jti_score"] = sum(weight * out[col] for col, weight in self.components.items())
+        return out
+
+
+_CACHE: Dict[Path, Tuple[int, IndicatorRegistry]] = {}
+
+
+def load_registry(path: Path = INDICATORS_FILE) -> IndicatorRegistry:
+    """The registry in `path`, re-read only when the file changes."""
+    path = Path(path)
+    mtime = path.stat().st_mtime_ns
+    cached = _CACHE.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, IndicatorRegistry.from_yaml(path))
+        _CACHE[path] = cached
+    return cached[1]
@@ -2,171 +2,165 @@ from __future__ import annotations
 
 from pathlib import Path
 import json
+import sys
 
 import numpy as np
 import pandas as pd
 
 
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.harmonisation.lad_codes import LadDictionary  # noqa: E402
+from src.scoring import spatial, trends  # noqa: E402
+from src.scoring.indicators import IndicatorRegistry, load_registry  # noqa: E402
+from src.storage.results_store import ResultsStore  # noqa: E402
+
 CANONICAL_DIR = ROOT / "data" / "processed" / "canonical"
 
-BASE_FILE = CANONICAL_DIR / "jtis_base_la_year.csv"
+# The base table after the anomaly checks (src/scoring/anomalies.py)
+BASE_FILE = CANONICAL_DIR / "jtis_base_checked_la_year.csv"
 OUT_FILE = CANONICAL_DIR / "jtis_scored_la_year.csv"
+TRENDS_FILE = CANONICAL_DIR / "jtis_trends_lad.csv"
 DIAG_FILE = ROOT / "outputs" / "diagnostics" / "scoring_report.json"
 
 
-def min_max_normalise(series: pd.Series) -> pd.Series:
-    """0–1 min-max normalisation; returns 0.5 if constant."""
-    s = series.astype(float)
-    s_min = s.min(skipna=True)
-    s_max = s.max(skipna=True)
-    if pd.isna(s_min) or pd.isna(s_max) or s_max == s_min:
-        return pd.Series(0.5, index=s.index)
-    return (s - s_min) / (s_max - s_min)
+def _panel_arrays(df: pd.DataFrame, cols: list[str]) -> dict[str, np.ndarray]:
+    """Float arrays of the given columns (non-numeric values as NaN)."""
+    return {c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float) for c in cols}
 
 
-def compute_derived_metrics(df: pd.DataFrame) -> pd.DataFrame:
+def compute_derived_metrics(
+    df: pd.DataFrame, registry: IndicatorRegistry | None = None, base_year: int | None = None
+) -> pd.DataFrame:
     """
-    Compute per-capita, ratios, densities, and YoY changes.
-    Assumes df has:
-      - total_emissions_scope_ktco2
-      - total_fuel_ktoe
-      - personal_transport_ktoe
-      - freight_transport_ktoe
-      - bioenergy_ktoe
-      - area_km2
-      - population (ONS)
+    Add the registry's metrics (per-capita, ratios, densities, YoY changes,
+    rolling trends) in dependency order. df is the base table keyed by lad_id
+    (see src/harmonisation/lad_codes.py), or by area_id on a small-area panel,
+    with the base columns the metrics read; a shard of the panel passes the
+    panel's first year as base_year.
     """
-    df = df.copy()
-
-    # Ensure numeric
-    numeric_cols = [
-        "total_emissions_scope_ktco2",
-        "territorial_emissions_ktco2e",
-        "total_fuel_ktoe",
-        "personal_transport_ktoe",
-        "freight_transport_ktoe",
-        "bioenergy_ktoe",
-        "area_km2",
-        "population",
-    ]
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    # ---- Per-capita metrics ----
-    pop = df["population"].replace({0: np.nan})
-
-    df["emissions_pc_tco2"] = df["total_emissions_scope_ktco2"] * 1000.0 / pop
-    df["fuel_pc_ktoe_per_1000"] = df["total_fuel_ktoe"] * 1000.0 / pop
-    df["personal_pc_ktoe_per_1000"] = df["personal_transport_ktoe"] * 1000.0 / pop
-    df["freight_pc_ktoe_per_1000"] = df["freight_transport_ktoe"] * 1000.0 / pop
-
-    # ---- Transport mix ratios ----
-    fuel = df["total_fuel_ktoe"].replace({0: np.nan})
-    df["freight_share"] = df["freight_transport_ktoe"] / fuel
-    df["personal_share"] = df["personal_transport_ktoe"] / fuel
-    df["bioenergy_share"] = df["bioenergy_ktoe"] / fuel
-
-    # ---- Spatial intensity ----
-    area = df["area_km2"].replace({0: np.nan})
-    df["emissions_density_tco2_per_km2"] = (
-        df["total_emissions_scope_ktco2"] * 1000.0 / area
-    )
-
-    # ---- Year-on-year changes per LAD ----
-    df = df.sort_values(["lad_code", "year"]).reset_index(drop=True)
-
-    df["emissions_yoy_pct"] = (
-        df.groupby("lad_code")["total_emissions_scope_ktco2"].pct_change()
-    )
-    df["fuel_yoy_pct"] = (
-        df.groupby("lad_code")["total_fuel_ktoe"].pct_change()
-    )
-    df["population_yoy_pct"] = (
-        df.groupby("lad_code")["population"].pct_change()
-    )
-
-    return df
-
-
-def compute_scores(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    registry = registry or load_registry()
+
+    # Sorting first gives this function its own frame (one copy, before the
+    # derived columns are added) and the order the per-LAD steps rely on
+    df = df.sort_values([trends.panel_key(df), "year"]).reset_index(drop=True)
+
+    plan = registry.plan()
+    inputs = _panel_arrays(df, [c for c in registry.base_columns(plan) if c in df.columns])
+    metrics = registry.compute_metrics(inputs, trends.Panel.from_frame(df, base_year=base_year), plan)
+
+    # Ensure numeric (inputs read as text are replaced by their parsed values)
+    coerced = {c: v for c, v in inputs.items() if not pd.api.types.is_numeric_dtype(df[c])}
+    return df.assign(**coerced, **metrics)
+
+
+def indicator_metrics(df: pd.DataFrame, registry: IndicatorRegistry) -> dict[str, np.ndarray]:
+    return _panel_arrays(df, list(dict.fromkeys(i.metric for i in registry.indicators.values())))
+
+
+def compute_scores(
+    df: pd.DataFrame, registry: IndicatorRegistry | None = None, stats: dict | None = None
+) -> tuple[pd.DataFrame, dict]:
     """
-    Compute normalised metrics and composite JTIS scores.
-    Returns updated df and a diagnostics dict.
+    Compute normalised indicators, component scores and the composite JTI
+    (weights in config/indicators.yaml). Returns updated df and a
+    diagnostics dict. `stats` are merged normalisation statistics when df is
+    one shard of the panel (see src/pipeline/shards.py).
     """
-    df = df.copy()
-
-    # ---- Normalised emissions metrics ----
-    df["norm_emissions_pc"] = min_max_normalise(df["emissions_pc_tco2"])
-    df["norm_emissions_density"] = min_max_normalise(
-        df["emissions_density_tco2_per_km2"]
-    )
-    df["norm_emissions_yoy"] = min_max_normalise(df["emissions_yoy_pct"])
-
-    # ---- Normalised transport metrics ----
-    df["norm_fuel_pc"] = min_max_normalise(df["fuel_pc_ktoe_per_1000"])
-    df["norm_freight_share"] = min_max_normalise(df["freight_share"])
-    df["norm_bioenergy_share"] = min_max_normalise(df["bioenergy_share"])
-
-    # ---- Normalised structural metric ----
-    df["population_yoy_abs"] = df["population_yoy_pct"].abs()
-    df["norm_population_yoy_abs"] = min_max_normalise(df["population_yoy_abs"])
-
-    # ---- Component scores ----
-    df["emissions_score"] = (
-        df["norm_emissions_pc"]
-        + df["norm_emissions_density"]
-        + df["norm_emissions_yoy"]
-    ) / 3.0
-
-    df["transport_score"] = (
-        df["norm_fuel_pc"]
-        + df["norm_freight_share"]
-        + (1.0 - df["norm_bioenergy_share"])
-    ) / 3.0
-
-    df["structural_score"] = df["norm_population_yoy_abs"]
-
-    # ---- Composite JTI score ----
-    df["jti_score"] = (
-        0.5 * df["emissions_score"]
-        + 0.4 * df["transport_score"]
-        + 0.1 * df["structural_score"]
-    )
-
-    diagnostics = {
+    registry = registry or load_registry()
+    metrics = indicator_metrics(df, registry)
+    df = df.assign(**registry.compute_scores(metrics, years=df["year"].to_numpy(), stats=stats))
+    return df, score_diagnostics(df)
+
+
+def score_diagnostics(df: pd.DataFrame) -> dict:
+    return {
         "rows": int(df.shape[0]),
         "cols": int(df.shape[1]),
         "years": {
             "min": int(df["year"].min()),
             "max": int(df["year"].max()),
         },
-        "lads": int(df["lad_code"].nunique()),
+        "lads": int(df["lad_id"].nunique()),
+        **({"areas": int(df["area_id"].nunique())} if "area_id" in df.columns else {}),
     }
 
-    return df, diagnostics
-
 
-def main() -> int:
-    if not BASE_FILE.exists():
-        raise FileNotFoundError(
-            f"Base JTIS table not found: {BASE_FILE}. "
-            "Run src/agents/composer_agent.py first."
-        )
-
-    print(f"[JTI_SCORING] Loading base table from: {BASE_FILE}")
-    df = pd.read_csv(BASE_FILE)
-
-    print("[JTI_SCORING] Computing derived metrics...")
-    df = compute_derived_metrics(df)
-
-    print("[JTI_SCORING] Computing scores...")
-    scored_df, diagnostics = compute_scores(df)
+def main(df: pd.DataFrame | None = None, workers: int = 0, by: str = "region_code") -> int:
+    """Score the base table (read from BASE_FILE unless passed in); with
+    workers > 1, as parallel shards by `by` (see src/pipeline/shards.py)."""
+    if df is None:
+        if not BASE_FILE.exists():
+            raise FileNotFoundError(
+                f"Base JTIS table not found: {BASE_FILE}. "
+                "Run src/agents/composer_agent.py and src/scoring/anomalies.py first."
+            )
+
+        print(f"[JTI_SCORING] Loading base table from: {BASE_FILE}")
+        df = pd.read_csv(BASE_FILE)
+
+    # Key by the shared lad_id dictionary (base tables written before it
+    # existed carry names, which seed the dimension table)
+    lad = LadDictionary.load()
+    df = lad.encode(df, update=True)
+    if lad.changed:
+        lad.save()
+
+    if workers > 1:
+        from src.pipeline.shards import score_sharded
+
+        print(f"[JTI_SCORING] Computing metrics and scores in {by} shards on {workers} workers...")
+        df, scored_df, trends_df = score_sharded(df, lad, workers=workers, by=by)
+        diagnostics = score_diagnostics(scored_df)
+    else:
+        print("[JTI_SCORING] Computing derived metrics...")
+        df = compute_derived_metrics(df)
+
+        print("[JTI_SCORING] Computing scores...")
+        scored_df, diagnostics = compute_scores(df)
+        trends_df = trends.compute_lad_trends(df)
+
+    if "area_id" in scored_df.columns:
+        print("[JTI_SCORING] Small-area panel: LAD spatial weights do not apply, skipping spatial metrics")
+    elif spatial.boundary_file() is not None:
+        print("[JTI_SCORING] Adding spatial lags and local Moran's I...")
+        scored_df = spatial.add_spatial_metrics(scored_df, spatial.load_or_build_weights())
+
+    print(f"[JTI_SCORING] Writing per-unit trends to: {TRENDS_FILE}")
+    trends_df.to_csv(TRENDS_FILE, index=False)
 
     print(f"[JTI_SCORING] Writing scored table to: {OUT_FILE}")
     scored_df.to_csv(OUT_FILE, index=False)
 
+    store = ResultsStore()
+    # The weights travel with the release, so later diffs attribute its
+    # jti_score with the weights it was actually scored with
+    meta = {"base_file": str(BASE_FILE), "component_weights": load_registry().component_weights}
+    release = store.write(scored_df, "scored", meta=meta)
+    diagnostics["release"] = release
+    print(f"[JTI_SCORING] Stored release {release} in: {store.root}")
+
+    from src.storage.feature_store import FeatureStore
+
+    FeatureStore(store).write(df, release)
+    print(f"[JTI_SCORING] Materialised features of release {release}")
+
+    previous = store.latest_release("scored", before=release)
+    if previous is not None:
+        from src.analysis.release_diff import diff_releases, same_unit, write_report
+
+        if not same_unit(store, previous, release):
+            print(f"[JTI_SCORING] Release {previous} is a panel of another unit (LAD / small area); no release diff")
+        else:
+            report = diff_releases(store, previous, release)
+            write_report(report)
+            print(
+                f"[JTI_SCORING] Release diff vs {previous}: "
+                f"{report['changed_rows']} changed LA–years"
+            )
+
     DIAG_FILE.parent.mkdir(parents=True, exist_ok=True)
     with open(DIAG_FILE, "w") as f:
         json.dump(diagnostics, f, indent=2)
@@ -0,0 +1,327 @@
+"""
+JTIS – normalisation strategies
+Map an indicator's metric onto 0–1 before it enters a component score.
+
+- Every strategy works along the last axis and accepts extra leading axes
+  (indicators, Monte Carlo or bootstrap draws), so one call normalises a
+  whole stack; NaNs are ignored and stay NaN
+- A row with no spread (constant or all NaN) becomes 0.5 throughout
+- Winsorising and percentile rank sort each row once: both quantile bounds
+  and all ranks come from that single sort, never from repeated quantile calls
+- scope "year" normalises within each year by laying the rows out on a
+  NaN-padded (year, slot) grid, so all years go through the same call
+- Sharded runs split each strategy into fit_stats → merge_stats →
+  apply_stats: every shard fits partial statistics on its rows, the merged
+  statistics are those of the whole panel (exact min/max, merged sorted rows for quantiles and ranks,
+  pooled moments for z-scores) and each shard is normalised against them
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+
+SCOPES = ("panel", "year")
+
+
+def _flat(valid_spread: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """0.5 for rows without spread, `out` elsewhere."""
+    return np.where(valid_spread, out, 0.5)
+
+
+def _sorted(x: np.ndarray):
+    """Row-wise sort (NaNs last) and count of valid values, shape (..., 1)."""
+    return np.sort(x, axis=-1), (~np.isnan(x)).sum(axis=-1, keepdims=True)
+
+
+def _quantile(s: np.ndarray, n: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated quantile of each sorted row (numpy's default
+    method), read off the sort; NaN for empty rows."""
+    h = np.maximum(n - 1, 0) * q
+    lo = np.floor(h).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    a = np.take_along_axis(s, lo, axis=-1)
+    b = np.take_along_axis(s, hi, axis=-1)
+    return np.where(n > 0, a + (b - a) * (h - lo), np.nan)
+
+
+# -------------------------------------------------------
+# Strategies
+# -------------------------------------------------------
+
+def min_max(x: np.ndarray) -> np.ndarray:
+    """(x - min) / (max - min)."""
+    with np.errstate(invalid="ignore"):
+        valid = ~np.isnan(x).all(axis=-1, keepdims=True)
+        filled = np.where(valid, x, 0.0)
+        lo = np.nanmin(filled, axis=-1, keepdims=True)
+        hi = np.nanmax(filled, axis=-1, keepdims=True)
+        ok = valid & (hi > lo)
+        return _flat(ok, (x - lo) / np.where(ok, hi - lo, 1.0))
+
+
+def winsor_min_max(x: np.ndarray, lower: float = 0.01, upper: float = 0.99) -> np.ndarray:
+    """Min-max between the `lower` and `upper` quantiles, values beyond them
+    clipped, so a few extreme LA–years cannot compress everyone else."""
+    if not 0.0 <= lower < upper <= 1.0:
+        raise ValueError("winsor_min_max needs 0 <= lower < upper <= 1")
+    s, n = _sorted(x)
+    return _winsor_apply(x, s, n, lower, upper)
+
+
+def _winsor_apply(x: np.ndarray, s: np.ndarray, n: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    lo = _quantile(s, n, lower)
+    hi = _quantile(s, n, upper)
+    with np.errstate(invalid="ignore"):
+        ok = hi > lo
+        return _flat(ok, (np.clip(x, lo, hi) - lo) / np.where(ok, hi - lo, 1.0))
+
+
+def percentile_rank(x: np.ndarray) -> np.ndarray:
+    """Rank / (n - 1) with ties sharing their average rank."""
+    order = np.argsort(x, axis=-1, kind="stable")
+    s = np.take_along_axis(x, order, axis=-1)
+    n = (~np.isnan(x)).sum(axis=-1, keepdims=True)
+
+    # Tie runs in the sorted row: first and last position of each value
+    pos = np.broadcast_to(np.arange(x.shape[-1]), x.shape)
+    new_run = np.ones(x.shape, dtype=bool)
+    new_run[..., 1:] = s[..., 1:] != s[..., :-1]
+    end_run = np.ones(x.shape, dtype=bool)
+    end_run[..., :-1] = new_run[..., 1:]
+    first = np.maximum.accumulate(np.where(new_run, pos, 0), axis=-1)
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(end_run, pos, x.shape[-1]), -1), axis=-1), -1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ranked = np.where(np.isnan(s), np.nan, (first + last) / 2.0 / np.maximum(n - 1, 1))
+    out = np.empty_like(ranked)
+    np.put_along_axis(out, order, ranked, axis=-1)
+    return _flat(n > 1, out)
+
+
+def z_score(x: np.ndarray, clip: float = 3.0) -> np.ndarray:
+    """Standard score clipped to ±clip, mapped linearly onto 0–1."""
+    if clip <= 0:
+        raise ValueError("z_score needs clip > 0")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valid = ~np.isnan(x).all(axis=-1, keepdims=True)
+        filled = np.where(valid, x, 0.0)
+        mean = np.nanmean(filled, axis=-1, keepdims=True)
+        std = np.nanstd(filled, axis=-1, keepdims=True)
+        ok = valid & (std > 0)
+        z = np.clip((x - mean) / np.where(ok, std, 1.0), -clip, clip)
+        return _flat(ok, (z + clip) / (2.0 * clip))
+
+
+NORMALISERS: Dict[str, Callable[..., np.ndarray]] = {
+    "min_max": min_max,
+    "winsor_min_max": winsor_min_max,
+    "percentile_rank": percentile_rank,
+    "z_score": z_score,
+}
+
+
+# -------------------------------------------------------
+# Scope
+# -------------------------------------------------------
+
+def by_group(fn: Callable[..., np.ndarray], x: np.ndarray, groups: np.ndarray, **params) -> np.ndarray:
+    """Apply `fn` within each group of the last axis (groups: (n,) labels)."""
+    order = np.argsort(groups, kind="stable")
+    labels, gi, counts = np.unique(groups[order], return_inverse=True, return_counts=True)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    slot = np.arange(len(order)) - starts[gi]
+
+    grid = np.full(x.shape[:-1] + (len(labels), int(counts.max(initial=0))), np.nan)
+    grid[..., gi, slot] = x[..., order]
+    res = fn(grid, **params)
+    out = np.empty_like(x, dtype=float)
+    out[..., order] = res[..., gi, slot]
+    return out
+
+
+def normalise(
+    x: np.ndarray,
+    method: str = "min_max",
+    scope: str = "panel",
+    years: Optional[np.ndarray] = None,
+    **params,
+) -> np.ndarray:
+    fn = NORMALISERS[method]
+    if scope == "panel":
+        return fn(np.asarray(x, dtype=float), **params)
+    if scope == "year":
+        if years is None:
+            raise ValueError("Per-year normalisation needs the year of each row")
+        return by_group(fn, np.asarray(x, dtype=float), np.asarray(years), **params)
+    raise ValueError(f"Unknown normalisation scope {scope!r}; expected one of {SCOPES}")
+
+
+# -------------------------------------------------------
+# Sharded form: fit_stats per shard → merge_stats → apply_stats
+# -------------------------------------------------------
+# Statistics are dicts of (..., 1) arrays, or (..., m) sorted rows (NaNs
+# last) for the order-statistic strategies; scope "year" keys them by year.
+
+def _count(x: np.ndarray) -> np.ndarray:
+    return (~np.isnan(x)).sum(axis=-1, keepdims=True)
+
+
+def _fit_min_max(x: np.ndarray, **params) -> dict:
+    n = _count(x)
+    if x.shape[-1] == 0:
+        return {"n": n, "lo": np.zeros(n.shape), "hi": np.zeros(n.shape)}
+    with np.errstate(invalid="ignore"):
+        filled = np.where(n > 0, x, 0.0)
+        return {"n": n, "lo": np.nanmin(filled, axis=-1, keepdims=True), "hi": np.nanmax(filled, axis=-1, keepdims=True)}
+
+
+def _fit_sorted(x: np.ndarray, **params) -> dict:
+    s, n = _sorted(x)
+    return {"n": n, "sorted": s[..., : int(n.max(initial=0))]}
+
+
+def _fit_z_score(x: np.ndarray, **params) -> dict:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        n = _count(x)
+        mean = np.where(n > 0, np.nansum(x, axis=-1, keepdims=True) / np.maximum(n, 1), 0.0)
+        m2 = np.nansum((x - mean) ** 2, axis=-1, keepdims=True)
+        return {"n": n, "mean": mean, "m2": m2}
+
+
+def _merge_min_max(a: dict, b: dict) -> dict:
+    # A shard without values carries lo = hi = 0 and must not count
+    lo = np.where(a["n"] == 0, b["lo"], np.where(b["n"] == 0, a["lo"], np.minimum(a["lo"], b["lo"])))
+    hi = np.where(a["n"] == 0, b["hi"], np.where(b["n"] == 0, a["hi"], np.maximum(a["hi"], b["hi"])))
+    return {"n": a["n"] + b["n"], "lo": lo, "hi": hi}
+
+
+def _merge_sorted(a: dict, b: dict) -> dict:
+    s = np.sort(np.concatenate([a["sorted"], b["sorted"]], axis=-1), axis=-1)
+    n = a["n"] + b["n"]
+    return {"n": n, "sorted": s[..., : int(n.max(initial=0))]}
+
+
+def _merge_z_score(a: dict, b: dict) -> dict:
+    # Pooled mean and sum of squared deviations (Chan et al.)
+    n = a["n"] + b["n"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(n > 0, b["n"] / np.maximum(n, 1), 0.0)
+        delta = b["mean"] - a["mean"]
+        mean = a["mean"] + delta * w
+        m2 = a["m2"] + b["m2"] + delta ** 2 * a["n"] * w
+    return {"n": n, "mean": mean, "m2": m2}
+
+
+def _apply_min_max(x: np.ndarray, st: dict, **params) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        ok = (st["n"] > 0) & (st["hi"] > st["lo"])
+        return _flat(ok, (x - st["lo"]) / np.where(ok, st["hi"] - st["lo"], 1.0))
+
+
+def _apply_winsor(x: np.ndarray, st: dict, lower: float = 0.01, upper: float = 0.99) -> np.ndarray:
+    if not 0.0 <= lower < upper <= 1.0:
+        raise ValueError("winsor_min_max needs 0 <= lower < upper <= 1")
+    s = st["sorted"] if st["sorted"].shape[-1] else np.full(st["n"].shape, np.nan)
+    return _winsor_apply(x, s, st["n"], lower, upper)
+
+
+def _apply_percentile(x: np.ndarray, st: dict, **params) -> np.ndarray:
+    """Average rank of each value among the merged sorted row: the first and
+    last position of its tie run are searchsorted left / right − 1."""
+    lead = np.broadcast_shapes(x.shape[:-1], st["n"].shape[:-1])
+    x = np.broadcast_to(x, lead + x.shape[-1:])
+    s = np.broadcast_to(st["sorted"], lead + st["sorted"].shape[-1:]).reshape(-1, st["sorted"].shape[-1])
+    n = np.broadcast_to(st["n"], lead + (1,)).reshape(-1)
+    flat = x.reshape(-1, x.shape[-1])
+    out = np.empty(flat.shape)
+    for r in range(flat.shape[0]):
+        row = s[r, : n[r]]
+        first = np.searchsorted(row, flat[r], side="left")
+        last = np.searchsorted(row, flat[r], side="right") - 1
+        out[r] = np.where(np.isnan(flat[r]), np.nan, (first + last) / 2.0 / max(n[r] - 1, 1))
+    return _flat(n.reshape(lead + (1,)) > 1, out.reshape(x.shape))
+
+
+def _apply_z_score(x: np.ndarray, st: dict, clip: float = 3.0) -> np.ndarray:
+    if clip <= 0:
+        raise ValueError("z_score needs clip > 0")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(st["m2"] / np.maximum(st["n"], 1))
+        ok = (st["n"] > 0) & (std > 0)
+        z = np.clip((x - st["mean"]) / np.where(ok, std, 1.0), -clip, clip)
+        return _flat(ok, (z + clip) / (2.0 * clip))
+
+
+SPLIT: Dict[str, tuple] = {
+    "min_max": (_fit_min_max, _merge_min_max, _apply_min_max),
+    "winsor_min_max": (_fit_sorted, _merge_sorted, _apply_winsor),
+    "percentile_rank": (_fit_sorted, _merge_sorted, _apply_percentile),
+    "z_score": (_fit_z_score, _merge_z_score, _apply_z_score),
+}
+
+
+def fit_stats(
+    x: np.ndarray,
+    method: str = "min_max",
+    scope: str = "panel",
+    years: Optional[np.ndarray] = None,
+) -> dict:
+    """Partial statistics of one shard's rows."""
+    fit_fn = SPLIT[method][0]
+    x = np.asarray(x, dtype=float)
+    if scope == "panel":
+        return fit_fn(x)
+    if scope == "year":
+        if years is None:
+            raise ValueError("Per-year normalisation needs the year of each row")
+        years = np.asarray(years)
+        return {int(y): fit_fn(x[..., years == y]) for y in np.unique(years)}
+    raise ValueError(f"Unknown normalisation scope {scope!r}; expected one of {SCOPES}")
+
+
+def merge_stats(parts: Sequence[dict], method: str = "min_max", scope: str = "panel") -> dict:
+    """Statistics of the union of the shards behind `parts`."""
+    merge_fn = SPLIT[method][1]
+
+    def fold(items):
+        out = items[0]
+        for p in items[1:]:
+            out = merge_fn(out, p)
+        return out
+
+    if scope == "year":
+        by_year: Dict[int, list] = {}
+        for p in parts:
+            for y, st in p.items():
+                by_year.setdefault(y, []).append(st)
+        return {y: fold(items) for y, items in sorted(by_year.items())}
+    return fold(list(parts))
+
+
+def apply_stats(
+    x: np.ndarray,
+    stats: dict,
+    method: str = "min_max",
+    scope: str = "panel",
+    years: Optional[np.ndarray] = None,
+    **params,
+) -> np.ndarray:
+    """Normalise `x` against (merged) statistics; with the statistics of x
+    itself this equals normalise(x, ...)."""
+    apply_fn = SPLIT[method][2]
+    x = np.asarray(x, dtype=float)
+    if scope == "panel":
+        return apply_fn(x, stats, **params)
+    if scope == "year":
+        if years is None:
+            raise ValueError("Per-year normalisation needs the year of each row")
+        years = np.asarray(years)
+        out = np.empty_like(x)
+        for y in np.unique(years):
+            mask = years == y
+            out[..., mask] = apply_fn(x[..., mask], stats[int(y)], **params)
+        return out
+    raise ValueError(f"Unknown normalisation scope {scope!r}; expected one of {SCOPES}")
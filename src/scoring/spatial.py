@@ -0,0 +1,349 @@
+"""
+JTIS – spatial neighbourhood metrics
+Adds spatial context (spatial lags and local Moran's I) to the scored panel.
+
+This module:
+- Reads LAD boundaries from data/raw/lad_boundaries.geojson or .shp (no GIS stack needed)
+- Builds a row-standardised sparse weights matrix once per boundary file:
+    queen contiguity (polygons sharing a vertex), islands linked to their nearest LAD,
+    or k-nearest neighbours on polygon centroids
+- Caches the matrix as CSR arrays in data/processed/spatial/
+- Computes, for every year at once, `<col>_splag` (neighbour average) and
+  `<col>_lisa` (local Moran's I) as sparse matrix products
+
+Scoring calls add_spatial_metrics only when a boundary file is present. With a
+cached matrix that step costs a few milliseconds.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+ROOT = Path(__file__).resolve().parents[2]
+RAW_DIR = ROOT / "data" / "raw"
+CACHE_DIR = ROOT / "data" / "processed" / "spatial"
+
+BOUNDARY_FILES = [
+    RAW_DIR / "lad_boundaries.geojson",
+    RAW_DIR / "lad_boundaries.shp",
+]
+
+SPATIAL_COLUMNS = [
+    "jti_score",
+    "emissions_score",
+    "transport_score",
+    "structural_score",
+]
+
+_CODE_FIELD_RE = re.compile(r"^(LAD\d{2}CD|lad_code)$", re.IGNORECASE)
+
+
+# -------------------------------------------------------
+# Boundary readers
+# -------------------------------------------------------
+
+def _pick_code_field(fields: List[str]) -> str:
+    for f in fields:
+        if _CODE_FIELD_RE.match(f):
+            return f
+    raise ValueError(f"No LAD code field (LADyyCD / lad_code) among: {fields}")
+
+
+def read_geojson(path: Path) -> Tuple[List[str], List[List[np.ndarray]]]:
+    """Return LAD codes and, per feature, its rings as (n, 2) arrays."""
+    with path.open("r", encoding="utf-8") as f:
+        doc = json.load(f)
+
+    features = doc.get("features", [])
+    if not features:
+        raise ValueError(f"No features in {path}")
+    code_field = _pick_code_field(list(features[0].get("properties", {})))
+
+    codes, shapes = [], []
+    for feat in features:
+        geom = feat.get("geometry") or {}
+        if geom.get("type") == "Polygon":
+            polys = [geom["coordinates"]]
+        elif geom.get("type") == "MultiPolygon":
+            polys = geom["coordinates"]
+        else:
+            continue
+        rings = [np.asarray(ring, dtype=float)[:, :2] for poly in polys for ring in poly]
+        codes.append(str(feat["properties"][code_field]))
+        shapes.append(rings)
+    return codes, shapes
+
+
+def _read_dbf(path: Path) -> Dict[str, List[str]]:
+    data = path.read_bytes()
+    n_records, header_len, record_len = struct.unpack("<IHH", data[4:12])
+
+    fields = []
+    pos = 32
+    while data[pos] != 0x0D:
+        name = data[pos:pos + 11].split(b"\x00")[0].decode("latin-1")
+        fields.append((name, data[pos + 16]))
+        pos += 32
+
+    out: Dict[str, List[str]] = {name: [] for name, _ in fields}
+    for i in range(n_records):
+        rec = header_len + i * record_len
+        offset = rec + 1  # skip deletion flag
+        for name, length in fields:
+            out[name].append(data[offset:offset + length].decode("latin-1").strip())
+            offset += length
+    return out
+
+
+def read_shapefile(path: Path) -> Tuple[List[str], List[List[np.ndarray]]]:
+    """Minimal Polygon/PolygonZ/PolygonM reader for .shp + .dbf pairs."""
+    attrs = _read_dbf(path.with_suffix(".dbf"))
+    code_field = _pick_code_field(list(attrs))
+
+    data = path.read_bytes()
+    file_len = struct.unpack(">i", data[24:28])[0] * 2
+
+    codes, shapes = [], []
+    pos, rec_idx = 100, 0
+    while pos < file_len:
+        content_len = struct.unpack(">i", data[pos + 4:pos + 8])[0] * 2
+        body = pos + 8
+        shape_type = struct.unpack("<i", data[body:body + 4])[0]
+        if shape_type in (5, 15, 25):
+            n_parts, n_points = struct.unpack("<ii", data[body + 36:body + 44])
+            parts = np.frombuffer(data, dtype="<i4", count=n_parts, offset=body + 44)
+            pts = np.frombuffer(
+                data, dtype="<f8", count=2 * n_points, offset=body + 44 + 4 * n_parts
+            ).reshape(-1, 2)
+            bounds = list(parts) + [n_points]
+            rings = [pts[bounds[j]:bounds[j + 1]] for j in range(n_parts)]
+            codes.append(attrs[code_field][rec_idx])
+            shapes.append(rings)
+        pos = body + content_len
+        rec_idx += 1
+    return codes, shapes
+
+
+def read_boundaries(path: Path) -> Tuple[List[str], List[List[np.ndarray]]]:
+    if path.suffix.lower() in (".geojson", ".json"):
+        return read_geojson(path)
+    if path.suffix.lower() == ".shp":
+        return read_shapefile(path)
+    raise ValueError(f"Unsupported boundary file type: {path}")
+
+
+def boundary_file() -> Optional[Path]:
+    return next((p for p in BOUNDARY_FILES if p.exists()), None)
+
+
+# -------------------------------------------------------
+# Sparse weights
+# -------------------------------------------------------
+
+@dataclass
+class SpatialWeights:
+    """Row-standardised weights in CSR form, rows ordered as `codes`."""
+
+    codes: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+
+    @property
+    def n(self) -> int:
+        return len(self.codes)
+
+    def lag(self, x: np.ndarray) -> np.ndarray:
+        """W @ x for x of shape (n,) or (n, m)."""
+        x = np.asarray(x, dtype=float)
+        prod = self.weights.reshape((-1,) + (1,) * (x.ndim - 1)) * x[self.indices]
+        out = np.zeros_like(x, dtype=float)
+        counts = np.diff(self.indptr)
+        has = counts > 0
+        if prod.shape[0]:
+            out[has] = np.add.reduceat(prod, self.indptr[:-1][has], axis=0)
+        return out
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path, codes=self.codes, indptr=self.indptr, indices=self.indices, weights=self.weights
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "SpatialWeights":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["codes"], z["indptr"], z["indices"], z["weights"])
+
+
+def _centroids(shapes: List[List[np.ndarray]]) -> np.ndarray:
+    out = np.empty((len(shapes), 2))
+    for i, rings in enumerate(shapes):
+        a_sum, cx, cy = 0.0, 0.0, 0.0
+        for r in rings:
+            x, y = r[:, 0], r[:, 1]
+            x1, y1 = np.roll(x, -1), np.roll(y, -1)
+            cross = x * y1 - x1 * y
+            a_sum += cross.sum() / 2.0
+            cx += ((x + x1) * cross).sum() / 6.0
+            cy += ((y + y1) * cross).sum() / 6.0
+        if a_sum:
+            out[i] = (cx / a_sum, cy / a_sum)
+        else:
+            pts = np.vstack(rings)
+            out[i] = pts.mean(axis=0)
+    return out
+
+
+def _knn_pairs(cent: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    rows = np.arange(len(cent)) if rows is None else rows
+    k = min(k, len(cent) - 1)
+    src, dst = [], []
+    for start in range(0, len(rows), 2048):
+        block = rows[start:start + 2048]
+        d = ((cent[block, None, :] - cent[None, :, :]) ** 2).sum(axis=2)
+        d[np.arange(len(block)), block] = np.inf
+        nn = np.argpartition(d, k - 1, axis=1)[:, :k]
+        src.append(np.repeat(block, k))
+        dst.append(nn.ravel())
+    return np.concatenate(src), np.concatenate(dst)
+
+
+def _queen_pairs(shapes: List[List[np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    pts = np.vstack([np.vstack(rings) for rings in shapes])
+    owner = np.repeat(
+        np.arange(len(shapes)), [sum(len(r) for r in rings) for rings in shapes]
+    )
+    # Snap to a grid relative to the extent so shared vertices compare equal
+    extent = float(np.ptp(pts, axis=0).max()) or 1.0
+    snapped = np.round(pts / (extent * 1e-9)).astype(np.int64)
+    _, vertex = np.unique(snapped, axis=0, return_inverse=True)
+
+    vp = np.unique(np.stack([vertex.ravel(), owner], axis=1), axis=0)
+    v, p = vp[:, 0], vp[:, 1]
+    src, dst = [], []
+    d = 1
+    while d < len(v):
+        same = v[d:] == v[:-d]
+        if not same.any():
+            break
+        src.append(p[:-d][same])
+        dst.append(p[d:][same])
+        d += 1
+    if not src:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(src), np.concatenate(dst)
+
+
+def build_weights(
+    codes: List[str], shapes: List[List[np.ndarray]], method: str = "queen", k: int = 6
+) -> SpatialWeights:
+    n = len(codes)
+    cent = _centroids(shapes)
+    if method == "queen":
+        src, dst = _queen_pairs(shapes)
+        islands = np.setdiff1d(np.arange(n), np.concatenate([src, dst]))
+        if len(islands) and n > 1:
+            isrc, idst = _knn_pairs(cent, 1, islands)
+            src, dst = np.concatenate([src, isrc]), np.concatenate([dst, idst])
+    elif method == "knn":
+        src, dst = _knn_pairs(cent, k)
+    else:
+        raise ValueError(f"Unknown weights method: {method!r}")
+
+    # Symmetrise, dedupe, drop self-links
+    pairs = np.unique(
+        np.stack([np.concatenate([src, dst]), np.concatenate([dst, src])], axis=1), axis=0
+    )
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+
+    counts = np.bincount(pairs[:, 0], minlength=n)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    weights = 1.0 / np.repeat(counts, counts)
+    return SpatialWeights(
+        codes=np.asarray(codes, dtype=str),
+        indptr=indptr.astype(np.int64),
+        indices=pairs[:, 1].astype(np.int64),
+        weights=weights,
+    )
+
+
+def load_or_build_weights(
+    path: Optional[Path] = None, method: str = "queen", k: int = 6
+) -> SpatialWeights:
+    """Weights for a boundary file, built once and cached by content hash."""
+    path = path or boundary_file()
+    if path is None:
+        raise FileNotFoundError(f"No LAD boundary file found; looked for {BOUNDARY_FILES}")
+
+    h = hashlib.sha256(path.read_bytes())
+    if path.suffix.lower() == ".shp":
+        h.update(path.with_suffix(".dbf").read_bytes())
+    tag = f"{method}{k if method == 'knn' else ''}"
+    cache = CACHE_DIR / f"weights_{tag}_{h.hexdigest()[:16]}.npz"
+    if cache.exists():
+        return SpatialWeights.load(cache)
+
+    print(f"[SPATIAL] Building {tag} weights from: {path}")
+    codes, shapes = read_boundaries(path)
+    w = build_weights(codes, shapes, method=method, k=k)
+    w.save(cache)
+    print(f"[SPATIAL] Cached {w.n} LADs / {len(w.indices)} links → {cache}")
+    return w
+
+
+# -------------------------------------------------------
+# Panel metrics
+# -------------------------------------------------------
+
+def add_spatial_metrics(
+    df: pd.DataFrame, w: SpatialWeights, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Add `<col>_splag` and `<col>_lisa` for each column, per year.
+
+    Values are laid out as a (LAD × year) matrix in weights order so every year
+    is lagged in one sparse product. Neighbours missing a value are left out of
+    the lag; LADs absent from the boundary file get NaN.
+    """
+    columns = [c for c in (columns or SPATIAL_COLUMNS) if c in df.columns]
+    row = pd.Index(w.codes).get_indexer(df["lad_code"].astype(str))
+    years, col_idx = np.unique(df["year"].to_numpy(), return_inverse=True)
+    known = row >= 0
+
+    out = {}
+    for col in columns:
+        X = np.full((w.n, len(years)), np.nan)
+        X[row[known], col_idx[known]] = pd.to_numeric(df[col], errors="coerce").to_numpy()[known]
+
+        present = ~np.isnan(X)
+        denom = w.lag(present.astype(float))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            lag = w.lag(np.where(present, X, 0.0)) / denom
+
+            count = present.sum(axis=0)
+            mean = np.where(present, X, 0.0).sum(axis=0) / count
+            std = np.sqrt(np.where(present, (X - mean) ** 2, 0.0).sum(axis=0) / count)
+            Z = (X - mean) / np.where(std > 0, std, np.nan)
+            z_present = ~np.isnan(Z)
+            z_lag = w.lag(np.where(z_present, Z, 0.0)) / w.lag(z_present.astype(float))
+            lisa = Z * z_lag
+
+        lag_col = np.full(len(df), np.nan)
+        lisa_col = np.full(len(df), np.nan)
+        lag_col[known] = lag[row[known], col_idx[known]]
+        lisa_col[known] = lisa[row[known], col_idx[known]]
+        out[f"{col}_splag"] = lag_col
+        out[f"{col}_lisa"] = lisa_col
+
+    return df.assign(**out)
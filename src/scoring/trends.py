@@ -0,0 +1,229 @@
+"""
+JTIS – trend engine
+Least-squares trends, CAGR and net-zero projections per LAD.
+
+All LADs are fitted at once: the panel is sorted by (lad_id, year) so each
+LAD is a contiguous segment, and every regression reduces to segment sums of
+x, y, xy and x² (cumulative sums for rolling windows, reduceat for the full
+period). Functions taking an array accept extra leading axes, so the same code
+scores a batch of perturbed panels.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+TREND_WINDOW = 5
+TREND_MIN_PERIODS = 2
+NET_ZERO_TARGET_YEAR = 2050
+
+
+# -------------------------------------------------------
+# Panel layout
+# -------------------------------------------------------
+
+def panel_key(df: pd.DataFrame) -> str:
+    """area_id on a small-area panel (src/harmonisation/small_areas.py), else
+    the integer lad_id when the frame has it, else lad_code."""
+    for key in ("area_id", "lad_id"):
+        if key in df.columns:
+            return key
+    return "lad_code"
+
+
+@dataclass
+class Panel:
+    """Row layout of a panel sorted by (key, year)."""
+
+    year: np.ndarray    # (n,) float, centred on the first year
+    start: np.ndarray   # (n,) index of the first row of each row's segment
+    starts: np.ndarray  # (g,) segment start offsets
+    base_year: int
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, key: Optional[str] = None, base_year: Optional[int] = None) -> "Panel":
+        """`base_year` (default: the first year in df) centres the years; a
+        shard of a panel passes the panel's, so its fits round the same way."""
+        key = key or panel_key(df)
+        keys = df[key].to_numpy()
+        years = df["year"].to_numpy(dtype=np.int64)
+        new_seg = np.ones(len(df), dtype=bool)
+        if len(df):
+            new_seg[1:] = keys[1:] != keys[:-1]
+        if (years[1:][~new_seg[1:]] <= years[:-1][~new_seg[1:]]).any():
+            raise ValueError(f"Panel must be sorted by ({key}, year) without duplicates")
+        starts = np.flatnonzero(new_seg)
+        seg_id = np.cumsum(new_seg) - 1
+        base = base_year if base_year is not None else int(years.min()) if len(years) else 0
+        return cls(
+            year=(years - base).astype(float),
+            start=starts[seg_id],
+            starts=starts,
+            base_year=base,
+        )
+
+    @property
+    def n(self) -> int:
+        return len(self.year)
+
+    @property
+    def prev(self) -> np.ndarray:
+        """Index of the previous row in the same segment, or -1."""
+        idx = np.arange(self.n) - 1
+        idx[np.arange(self.n) == self.start] = -1
+        return idx
+
+    def rolling_sum(self, v: np.ndarray, window: int) -> np.ndarray:
+        """Sum over the last `window` rows of each segment (along the last axis).
+        One shifted add per window row rather than differences of a panel-wide
+        cumsum, so a segment's sums do not depend on the rows before it."""
+        idx = np.arange(self.n)
+        longest = int(np.diff(np.r_[self.starts, self.n]).max(initial=0))
+        out = np.zeros(v.shape[:-1] + (self.n,))
+        for k in range(min(window, longest)):
+            j = idx - k
+            out += np.where(j >= self.start, v[..., np.maximum(j, 0)], 0.0)
+        return out
+
+    def segment_sum(self, v: np.ndarray) -> np.ndarray:
+        """Per-segment totals along the last axis, shape (..., g)."""
+        if not self.n:
+            return np.zeros(v.shape[:-1] + (0,))
+        return np.add.reduceat(v, self.starts, axis=-1)
+
+
+# -------------------------------------------------------
+# Vectorised fits
+# -------------------------------------------------------
+
+def yoy_pct(panel: Panel, y: np.ndarray) -> np.ndarray:
+    """One-step relative change within each segment (like groupby pct_change)."""
+    prev = panel.prev
+    lagged = np.where(prev >= 0, y[..., np.maximum(prev, 0)], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return y / lagged - 1.0
+
+
+def rolling_trend(
+    panel: Panel,
+    y: np.ndarray,
+    window: int = TREND_WINDOW,
+    min_periods: int = TREND_MIN_PERIODS,
+) -> np.ndarray:
+    """
+    Rolling least-squares slope divided by the rolling mean, i.e. the average
+    relative change per year over the trailing window.
+    """
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    x = np.broadcast_to(panel.year, y.shape)
+    yv = np.where(valid, y, 0.0)
+    xv = np.where(valid, x, 0.0)
+
+    n = panel.rolling_sum(valid.astype(float), window)
+    sx = panel.rolling_sum(xv, window)
+    sy = panel.rolling_sum(yv, window)
+    sxy = panel.rolling_sum(xv * yv, window)
+    sxx = panel.rolling_sum(xv * xv, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        rel = slope / (sy / n)
+    return np.where((n >= min_periods) & valid, rel, np.nan)
+
+
+def segment_fit(panel: Panel, y: np.ndarray) -> Dict[str, np.ndarray]:
+    """Full-period OLS per segment: slope, intercept (at base_year) and n."""
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    x = np.broadcast_to(panel.year, y.shape)
+    yv = np.where(valid, y, 0.0)
+    xv = np.where(valid, x, 0.0)
+
+    n = panel.segment_sum(valid.astype(float))
+    sx = panel.segment_sum(xv)
+    sy = panel.segment_sum(yv)
+    sxy = panel.segment_sum(xv * yv)
+    sxx = panel.segment_sum(xv * xv)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+    slope = np.where(n >= 2, slope, np.nan)
+    return {"slope": slope, "intercept": intercept, "n": n}
+
+
+def _first_last(panel: Panel, y: np.ndarray) -> Dict[str, np.ndarray]:
+    """First/last valid value and year per segment (1-D input)."""
+    valid = ~np.isnan(y)
+    seg = np.searchsorted(panel.starts, np.arange(panel.n), side="right") - 1
+    g = len(panel.starts)
+    rows = np.flatnonzero(valid)
+    first = np.full(g, -1)
+    last = np.full(g, -1)
+    # rows are ascending, so reversed assignment leaves the first row per segment
+    first[seg[rows[::-1]]] = rows[::-1]
+    last[seg[rows]] = rows
+    has = first >= 0
+    out = {}
+    for name, idx in (("first", first), ("last", last)):
+        out[f"{name}_value"] = np.where(has, y[np.maximum(idx, 0)], np.nan)
+        out[f"{name}_year"] = np.where(has, panel.year[np.maximum(idx, 0)], np.nan)
+    return out
+
+
+# -------------------------------------------------------
+# Pipeline entry points
+# -------------------------------------------------------
+
+def compute_lad_trends(
+    df: pd.DataFrame,
+    target_year: int = NET_ZERO_TARGET_YEAR,
+    metrics: Optional[Dict[str, str]] = None,
+    base_year: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    One row per LAD (small area on a small-area panel) with, for each trend metric:
+      <name>_slope_per_yr, <name>_cagr, <name>_latest,
+      <name>_projected_<target_year>, <name>_zero_year, <name>_on_track
+    The projection extends the full-period linear trend; zero_year is where it
+    crosses zero (NaN if the trend is flat or rising). `metrics` maps names to
+    columns (default: the trend metrics of the indicator registry).
+    """
+    if metrics is None:
+        from src.scoring.indicators import load_registry
+
+        metrics = load_registry().trend_series
+    key = panel_key(df)
+    df = df.sort_values([key, "year"]).reset_index(drop=True)
+    panel = Panel.from_frame(df, key, base_year)
+    ids = [c for c in dict.fromkeys([key, "area_code", "lad_code"]) if c in df.columns]
+    out = pd.DataFrame({c: df[c].iloc[panel.starts].to_numpy() for c in ids})
+
+    for name, col in metrics.items():
+        if col not in df.columns:
+            continue
+        y = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        fit = segment_fit(panel, y)
+        ends = _first_last(panel, y)
+
+        span = ends["last_year"] - ends["first_year"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cagr = (ends["last_value"] / ends["first_value"]) ** (1.0 / span) - 1.0
+            zero = np.where(fit["slope"] < 0, -fit["intercept"] / fit["slope"], np.nan)
+
+        out[f"{name}_slope_per_yr"] = fit["slope"]
+        out[f"{name}_cagr"] = np.where(span > 0, cagr, np.nan)
+        out[f"{name}_latest"] = ends["last_value"]
+        out[f"{name}_projected_{target_year}"] = np.maximum(
+            fit["intercept"] + fit["slope"] * (target_year - panel.base_year), 0.0
+        )
+        out[f"{name}_zero_year"] = zero + panel.base_year
+        out[f"{name}_on_track"] = out[f"{name}_zero_year"] <= target_year
+
+    return out
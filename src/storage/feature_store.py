@@ -0,0 +1,332 @@
+"""
+JTIS – feature store
+LA–year features (the base measures and the indicator registry's derived
+metrics) materialised once per release and served by LAD code, year and
+feature name.
+
+- Scoring materialises the panel compute_derived_metrics returns as table
+  "features" of the results store, under the scored release's label: one
+  Parquet partition per year, rows sorted by lad_code (then area_code on a
+  small-area panel); materialise() backfills a release from a base table
+- get_features(lad_codes, years, features, as_of) answers from the latest
+  features release known at or before `as_of` (a release label of any
+  table, or an ISO timestamp): "what did we know as of release R". A
+  features release is known from when its scored release was created, so a
+  backfill does not move it to the time it was materialised
+- Each partition is read column-projected; its columns (numpy arrays) and
+  its lad_code index (sorted codes + row offsets) are kept in an in-process
+  LRU cache bounded by bytes and keyed by the partition file's state, so a
+  repeated query is an index lookup and an array take per column
+
+Run with: python src/storage/feature_store.py get E06000001 --years 2022 2023
+          python src/storage/feature_store.py materialise [--release R]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.storage.results_store import ResultsStore  # noqa: E402
+
+TABLE = "features"
+KEY_COLS = ["lad_code", "area_code", "year"]
+CACHE_MB = 256
+
+
+# -------------------------------------------------------
+# LRU cache
+# -------------------------------------------------------
+
+class LRUCache:
+    """Values by key, least recently used evicted first once their total
+    size passes max_bytes."""
+
+    def __init__(self, max_bytes: int = CACHE_MB * 2**20) -> None:
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[1]
+        self._items[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes and len(self._items) > 1:
+            _, (_, n) = self._items.popitem(last=False)
+            self.nbytes -= n
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _nbytes(v: np.ndarray) -> int:
+    """Array size, with the Python strings an object array points to."""
+    return v.nbytes + (sum(len(x) + 49 for x in v.tolist() if isinstance(x, str)) if v.dtype == object else 0)
+
+
+# -------------------------------------------------------
+# Store
+# -------------------------------------------------------
+
+def feature_columns(df: pd.DataFrame) -> List[str]:
+    """The feature columns of a derived-metrics panel: base measures and
+    registry metrics (no ids, scores or normalised indicators)."""
+    from src.harmonisation import star
+    from src.scoring.indicators import load_registry
+
+    registry = load_registry()
+    wanted = list(star.BASE_MEASURES) + list(registry.metrics)
+    return [c for c in dict.fromkeys(wanted) if c in df.columns]
+
+
+class FeatureStore:
+    def __init__(self, store: Optional[ResultsStore] = None, cache_mb: int = CACHE_MB) -> None:
+        self.store = store if store is not None else ResultsStore()
+        self.cache = LRUCache(cache_mb * 2**20)
+        self._catalogue: Tuple[Optional[Tuple[int, int]], Dict[str, Any]] = (None, {"tables": {}})
+
+    # ----------------------------
+    # Write
+    # ----------------------------
+    def write(self, df: pd.DataFrame, release: str, overwrite: bool = False) -> str:
+        """Materialise a derived-metrics panel (see compute_derived_metrics)
+        as the features of `release`."""
+        features = feature_columns(df)
+        keys = [c for c in KEY_COLS if c in df.columns]
+        out = df[keys + features].assign(lad_code=df["lad_code"].astype(str))
+        if "area_code" in out.columns:
+            out = out.assign(area_code=out["area_code"].astype(str))
+        out = out.sort_values(["year", "lad_code"] + (["area_code"] if "area_code" in keys else []), kind="stable")
+        meta: Dict[str, Any] = {"features": features}
+        scored = self._tables().get("scored", {}).get("releases", {}).get(release)
+        if scored is not None:
+            meta["known_utc"] = scored["created_utc"]
+        return self.store.write(out.reset_index(drop=True), TABLE, release=release, overwrite=overwrite, meta=meta)
+
+    def materialise(self, release: Optional[str] = None, base: Optional[pd.DataFrame] = None) -> str:
+        """Compute and write the features of a base table (default: the
+        checked base table) as `release` (default: the latest scored
+        release)."""
+        from src.harmonisation.lad_codes import LadDictionary
+        from src.scoring import jti_scoring
+
+        if base is None:
+            base = pd.read_csv(jti_scoring.BASE_FILE)
+        release = release or self.store.latest_release("scored")
+        if release is None:
+            raise KeyError("[FEATURES] No scored release to attach features to; pass a release label")
+        df = jti_scoring.compute_derived_metrics(LadDictionary.load().encode(base, update=True))
+        return self.write(df, release, overwrite=True)
+
+    # ----------------------------
+    # Releases
+    # ----------------------------
+    def _tables(self) -> Dict[str, Any]:
+        path = self.store.catalogue_path
+        try:
+            st = path.stat()
+            state = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            state = None
+        if state != self._catalogue[0]:
+            self._catalogue = (state, self.store.catalogue())
+        return self._catalogue[1]["tables"]
+
+    @staticmethod
+    def _known(entry: Dict[str, Any]) -> str:
+        """When a features release became known: its scored release's
+        creation time, else its own."""
+        return entry.get("meta", {}).get("known_utc") or entry["created_utc"]
+
+    def releases(self) -> List[str]:
+        """Feature releases, in the order they became known."""
+        rels = self._tables().get(TABLE, {}).get("releases", {})
+        return sorted(rels, key=lambda r: (pd.Timestamp(self._known(rels[r])), r))
+
+    def resolve(self, as_of: Optional[str] = None) -> str:
+        """The features release that answers as of `as_of` (default: latest)."""
+        tables = self._tables()
+        rels = tables.get(TABLE, {}).get("releases", {})
+        if not rels:
+            raise KeyError(f"[FEATURES] No feature releases in {self.store.catalogue_path}; run materialise")
+        if as_of is None:
+            return self.releases()[-1]
+        if as_of in rels:
+            return as_of
+        created = next(
+            (t["releases"][as_of]["created_utc"] for t in tables.values() if as_of in t.get("releases", {})), None
+        )
+        try:
+            cutoff = pd.Timestamp(created or as_of)
+        except ValueError:
+            raise KeyError(f"[FEATURES] {as_of!r} is neither a known release nor a timestamp") from None
+        cutoff = cutoff.tz_localize("UTC") if cutoff.tzinfo is None else cutoff
+        known = [r for r in self.releases() if pd.Timestamp(self._known(rels[r])) <= cutoff]
+        if not known:
+            raise KeyError(f"[FEATURES] No feature release created as of {as_of}")
+        return known[-1]
+
+    def features(self, release: Optional[str] = None) -> List[str]:
+        entry = self._tables()[TABLE]["releases"][self.resolve(release)]
+        return list(entry["meta"].get("features") or [c for c in entry["columns"] if c not in KEY_COLS])
+
+    # ----------------------------
+    # Read
+    # ----------------------------
+    def _tag(self, release: str, year: str) -> Tuple[Tuple, Path]:
+        part = self._tables()[TABLE]["releases"][release]["partitions"][year]
+        path = self.store.root / part["path"]
+        st = path.stat()
+        return (release, year, st.st_mtime_ns, st.st_size), path
+
+    def _columns(self, release: str, year: str, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Column arrays of one partition; only the uncached ones are read."""
+        tag, path = self._tag(release, year)
+        arrays = {c: self.cache.get(tag + (c,)) for c in columns}
+        missing = [c for c, v in arrays.items() if v is None]
+        if missing:
+            frame = pd.read_parquet(path, columns=missing)
+            for c in missing:
+                arrays[c] = frame[c].to_numpy()
+                self.cache.put(tag + (c,), arrays[c], _nbytes(arrays[c]))
+        return arrays
+
+    def _index(self, release: str, year: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted distinct lad_codes of a partition and their row offsets."""
+        tag, _ = self._tag(release, year)
+        index = self.cache.get(tag + ("__index__",))
+        if index is None:
+            codes = self._columns(release, year, ["lad_code"])["lad_code"].astype(str)
+            new = np.r_[True, codes[1:] != codes[:-1]] if len(codes) else np.zeros(0, dtype=bool)
+            index = (codes[new], np.r_[np.flatnonzero(new), len(codes)])
+            self.cache.put(tag + ("__index__",), index, _nbytes(index[0]) + index[1].nbytes)
+        return index
+
+    def get_features(
+        self,
+        lad_codes: Optional[Iterable[str]] = None,
+        years: Optional[Iterable[int]] = None,
+        features: Optional[Sequence[str]] = None,
+        as_of: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Features of the given LADs (all by default) and years (all by
+        default), as known at `as_of`. Rows come in the order of lad_codes,
+        then year; codes the release does not have return no rows. The
+        release is in the result's attrs["release"]."""
+        release = self.resolve(as_of)
+        entry = self._tables()[TABLE]["releases"][release]
+        available = self.features(release)
+        features = list(available if features is None else features)
+        unknown = [f for f in features if f not in available]
+        if unknown:
+            raise KeyError(f"[FEATURES] Unknown features {unknown}; release {release} has {available}")
+        parts = entry["partitions"]
+        keys = sorted(parts, key=int) if years is None else [str(int(y)) for y in years]
+        missing = [k for k in keys if k not in parts]
+        if missing:
+            raise KeyError(f"[FEATURES] Release {release} has no years {missing}")
+
+        columns = ["lad_code"] + [c for c in ("area_code",) if c in entry["columns"]] + features
+        wanted = None if lad_codes is None else np.asarray([str(c) for c in lad_codes], dtype=object)
+        frames = []
+        for year in keys:
+            codes, offsets = self._index(release, year)
+            if wanted is None:
+                rows = np.arange(offsets[-1])
+            else:
+                pos = np.minimum(np.searchsorted(codes, wanted), max(len(codes) - 1, 0))
+                found = codes[pos] == wanted if len(codes) else np.zeros(len(wanted), dtype=bool)
+                lo, n = offsets[pos[found]], np.diff(offsets)[pos[found]]
+                rows = np.repeat(lo - np.cumsum(n) + n, n) + np.arange(int(n.sum()))
+            arrays = self._columns(release, year, columns)
+            frames.append(pd.DataFrame({c: arrays[c][rows] for c in columns}).assign(year=int(year)))
+        out = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns + ["year"])
+        out = out[[c for c in columns if c not in features] + ["year"] + features]
+        if wanted is not None and len(keys) > 1:
+            order = pd.Index(pd.unique(wanted)).get_indexer(out["lad_code"])
+            out = out.iloc[np.lexsort((out["year"].to_numpy(), order))].reset_index(drop=True)
+        out.attrs["release"] = release
+        return out
+
+
+_DEFAULT: Optional[FeatureStore] = None
+
+
+def default_store() -> FeatureStore:
+    """The process-wide store, so its cache outlives a notebook cell."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = FeatureStore()
+    return _DEFAULT
+
+
+def get_features(
+    lad_codes: Optional[Iterable[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    features: Optional[Sequence[str]] = None,
+    as_of: Optional[str] = None,
+) -> pd.DataFrame:
+    """FeatureStore.get_features on the process-wide store."""
+    return default_store().get_features(lad_codes, years, features, as_of)
+
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Materialise or query LA–year features.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("materialise", help="Compute features from the checked base table")
+    p.add_argument("--release", help="Release label (default: latest scored release)")
+    p = sub.add_parser("get", help="Print features")
+    p.add_argument("lad_codes", nargs="*")
+    p.add_argument("--years", nargs="+", type=int)
+    p.add_argument("--features", nargs="+")
+    p.add_argument("--as-of", help="Release label or ISO timestamp")
+    sub.add_parser("releases", help="List feature releases")
+    args = parser.parse_args(argv)
+
+    fs = default_store()
+    if args.command == "materialise":
+        release = fs.materialise(args.release)
+        print(f"[FEATURES] Materialised {len(fs.features(release))} features as release {release}")
+    elif args.command == "releases":
+        for r in fs.releases():
+            print(r)
+    else:
+        df = fs.get_features(args.lad_codes or None, args.years, args.features, args.as_of)
+        print(f"[FEATURES] Release {df.attrs['release']}: {len(df)} rows")
+        print(df.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
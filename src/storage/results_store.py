@@ -0,0 +1,228 @@
+"""
+JTIS – versioned results store
+Keeps every scored release instead of overwriting one CSV.
+
+Layout (under outputs/store/):
+
+    catalogue.json
+    <table>/release=<release>/year=<year>.parquet
+
+Each (release, year) partition is a Parquet file, so readers open only the
+partitions they ask for and only the columns they project. The catalogue
+records, per partition, its row count and min/max/mean/null statistics for the
+score columns; release-level comparisons are answered from those statistics
+without touching any Parquet file, and LAD-level "who moved most" queries read
+just two columns from two partitions.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+ROOT = Path(__file__).resolve().parents[2]
+STORE_DIR = ROOT / "outputs" / "store"
+CATALOGUE_NAME = "catalogue.json"
+
+RELEASE_ENV = "JTAP_RELEASE"
+STAT_COLUMNS = [
+    "jti_score",
+    "emissions_score",
+    "transport_score",
+    "structural_score",
+]
+
+_RELEASE_RE = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+def default_release(taken: Iterable[str] = ()) -> str:
+    """Release label from $JTAP_RELEASE, else a UTC timestamp, suffixed -1,
+    -2, ... when a release in `taken` was labelled in the same second."""
+    if os.environ.get(RELEASE_ENV):
+        return os.environ[RELEASE_ENV]
+    stamp = dt.datetime.now(dt.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    taken = set(taken)
+    release, n = stamp, 0
+    while release in taken:
+        n += 1
+        release = f"{stamp}-{n}"
+    return release
+
+
+def _column_stats(s: pd.Series) -> Dict[str, Optional[float]]:
+    values = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float)
+    valid = values[~np.isnan(values)]
+    if valid.size == 0:
+        return {"min": None, "max": None, "mean": None, "nulls": int(values.size)}
+    return {
+        "min": float(valid.min()),
+        "max": float(valid.max()),
+        "mean": float(valid.mean()),
+        "nulls": int(values.size - valid.size),
+    }
+
+
+class ResultsStore:
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root) if root is not None else STORE_DIR
+        self.catalogue_path = self.root / CATALOGUE_NAME
+
+    # ----------------------------
+    # Catalogue
+    # ----------------------------
+    def catalogue(self) -> Dict[str, Any]:
+        if not self.catalogue_path.exists():
+            return {"tables": {}}
+        with self.catalogue_path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_catalogue(self, cat: Dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.catalogue_path.with_suffix(".json.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(cat, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.catalogue_path)
+
+    def releases(self, table: str) -> List[str]:
+        """Releases of a table, oldest first."""
+        rels = self.catalogue()["tables"].get(table, {}).get("releases", {})
+        return sorted(rels, key=lambda r: (rels[r]["created_utc"], r))
+
+    def latest_release(self, table: str, before: Optional[str] = None) -> Optional[str]:
+        """Most recent release, optionally the one written just before `before`."""
+        rels = self.releases(table)
+        if before is not None:
+            rels = rels[: rels.index(before)] if before in rels else rels
+        return rels[-1] if rels else None
+
+    def partitions(self, table: str, release: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            return self.catalogue()["tables"][table]["releases"][release]["partitions"]
+        except KeyError:
+            raise KeyError(f"No release {release!r} for table {table!r} in {self.catalogue_path}")
+
+    # ----------------------------
+    # Write
+    # ----------------------------
+    def write(
+        self,
+        df: pd.DataFrame,
+        table: str,
+        release: Optional[str] = None,
+        partition_col: str = "year",
+        meta: Optional[Dict[str, Any]] = None,
+        overwrite: bool = False,
+    ) -> str:
+        """Write df as one release of `table`, one Parquet file per year. Returns the release."""
+        cat = self.catalogue()
+        table_entry = cat["tables"].setdefault(table, {"releases": {}})
+        release = release or default_release(table_entry["releases"])
+        if not _RELEASE_RE.match(release):
+            raise ValueError(f"Invalid release label: {release!r}")
+
+        rel_dir = self.root / table / f"release={release}"
+        if release in table_entry["releases"]:
+            if not overwrite:
+                raise ValueError(f"Release {release!r} already exists for table {table!r}")
+            for old in table_entry["releases"].pop(release)["partitions"].values():
+                (self.root / old["path"]).unlink(missing_ok=True)
+        rel_dir.mkdir(parents=True, exist_ok=True)
+
+        stat_cols = [c for c in STAT_COLUMNS if c in df.columns]
+        partitions: Dict[str, Dict[str, Any]] = {}
+        for key, part in df.groupby(partition_col, sort=True):
+            rel_path = Path(table) / f"release={release}" / f"{partition_col}={key}.parquet"
+            part.to_parquet(self.root / rel_path, index=False)
+            partitions[str(key)] = {
+                "path": rel_path.as_posix(),
+                "rows": int(len(part)),
+                "stats": {c: _column_stats(part[c]) for c in stat_cols},
+            }
+
+        table_entry["releases"][release] = {
+            # Microseconds, so releases written within a second still sort in order
+            "created_utc": dt.datetime.now(dt.timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z"),
+            "partition_col": partition_col,
+            "rows": int(len(df)),
+            "columns": [str(c) for c in df.columns],
+            "meta": meta or {},
+            "partitions": partitions,
+        }
+        self._save_catalogue(cat)
+        return release
+
+    # ----------------------------
+    # Read
+    # ----------------------------
+    def read(
+        self,
+        table: str,
+        release: Optional[str] = None,
+        years: Optional[Iterable[int]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """Load selected partitions (all by default) of one release."""
+        release = release or self.latest_release(table)
+        if release is None:
+            raise KeyError(f"Table {table!r} has no releases in {self.catalogue_path}")
+        parts = self.partitions(table, release)
+        keys = list(parts) if years is None else [str(y) for y in years]
+        missing = [k for k in keys if k not in parts]
+        if missing:
+            raise KeyError(f"Release {release!r} of {table!r} has no partitions {missing}")
+        frames = [pd.read_parquet(self.root / parts[k]["path"], columns=columns) for k in keys]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    # ----------------------------
+    # Release comparison
+    # ----------------------------
+    def compare_stats(self, table: str, release_a: str, release_b: str) -> pd.DataFrame:
+        """Per-year shift in score statistics, from the catalogue alone."""
+        parts_a = self.partitions(table, release_a)
+        parts_b = self.partitions(table, release_b)
+        rows = []
+        for key in sorted(set(parts_a) | set(parts_b)):
+            a = parts_a.get(key, {})
+            b = parts_b.get(key, {})
+            row: Dict[str, Any] = {
+                "partition": key,
+                "rows_a": a.get("rows"),
+                "rows_b": b.get("rows"),
+            }
+            for col in sorted(set(a.get("stats", {})) | set(b.get("stats", {}))):
+                sa = a.get("stats", {}).get(col, {})
+                sb = b.get("stats", {}).get(col, {})
+                for stat in ("mean", "min", "max"):
+                    va, vb = sa.get(stat), sb.get(stat)
+                    row[f"{col}_{stat}_delta"] = None if va is None or vb is None else vb - va
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def movers(
+        self,
+        table: str,
+        release_a: str,
+        release_b: str,
+        year: int,
+        column: str = "jti_score",
+        top: int = 10,
+        key: str = "lad_code",
+    ) -> pd.DataFrame:
+        """LADs whose `column` moved most between two releases in one year."""
+        a = self.read(table, release_a, years=[year], columns=[key, column])
+        b = self.read(table, release_b, years=[year], columns=[key, column])
+        merged = a.merge(b, on=key, how="outer", suffixes=("_a", "_b"))
+        merged["delta"] = merged[f"{column}_b"] - merged[f"{column}_a"]
+        merged["abs_delta"] = merged["delta"].abs()
+        merged = merged.sort_values("abs_delta", ascending=False, na_position="last")
+        return merged.head(top).drop(columns="abs_delta").reset_index(drop=True)